@@ -0,0 +1,154 @@
+"""
+Bundles de JS/CSS por grupo de páginas (público, admin, moza, cocina).
+
+Paso de build (requiere rjsmin y rcssmin; Brotli es opcional):
+
+    python activos.py                  # o: flask --app app construir-activos
+
+Concatena los archivos de cada bundle en el orden de BUNDLES, los minifica y
+los escribe en static/build/assets con el hash del contenido en el nombre,
+junto con copias precomprimidas `.gz` y `.br`. El manifest.json resultante lo
+usa el helper `activo()` de las plantillas para resolver la URL; la ruta
+`servir_activo` de app.py entrega la variante comprimida que acepte el navegador.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+DESTINO = os.path.join(STATIC_DIR, 'build', 'assets')
+MANIFEST = os.path.join(DESTINO, 'manifest.json')
+
+# bundle -> archivos de static/ concatenados en ese orden
+BUNDLES = {
+    'public.css': ('css/output.css',),
+    'admin.css': ('css/output.css', 'css/base_admin.css'),
+    'public.js': ('js/base_public.js', 'js/contactanos_logic.js', 'js/carousel_logic.js',
+                  'js/contacto_animations.js', 'js/hero_reserve_animations.js'),
+    'admin.js': ('js/base_admin.js', 'js/admin_platos.js', 'js/admin_usuarios.js'),
+    'moza.js': ('js/base_admin.js', 'js/moza_comandas.js'),
+    'cocina.js': ('js/base_admin.js', 'js/cocina.js'),
+    # Aparte: redeclara platosCarta/menuDelDia de moza_comandas.js y se carga
+    # después de admin.js solo en el detalle de la comanda.
+    'moza_detalle.js': ('js/moza_detalle_comanda.js',),
+}
+
+# (extensión, Content-Encoding) de las copias precomprimidas, en orden de preferencia
+COMPRESIONES = (('.br', 'br'), ('.gz', 'gzip'))
+
+
+def _minificar(nombre, fuentes):
+    from rcssmin import cssmin
+    from rjsmin import jsmin
+
+    if nombre.endswith('.css'):
+        return cssmin('\n'.join(fuentes), keep_bang_comments=True)
+    # El ';' evita que un archivo sin punto y coma final se pegue al siguiente
+    return jsmin('\n;\n'.join(fuentes), keep_bang_comments=True)
+
+
+def _escribir(ruta, datos):
+    """Escritura atómica: otro worker nunca lee un archivo a medio escribir."""
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, 'wb') as f:
+        f.write(datos)
+    os.replace(temporal, ruta)
+
+
+def construir(bundles=BUNDLES, destino=DESTINO, log=print):
+    """Genera todos los bundles y reescribe el manifest. Retorna el manifest."""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        log("ADVERTENCIA: falta el paquete Brotli; solo se generan copias gzip.")
+
+    os.makedirs(destino, exist_ok=True)
+    manifest = {}
+    vigentes = set()
+
+    for nombre, archivos in bundles.items():
+        fuentes = []
+        for archivo in archivos:
+            with open(os.path.join(STATIC_DIR, archivo), encoding='utf-8') as f:
+                fuentes.append(f.read())
+        datos = _minificar(nombre, fuentes).encode('utf-8')
+
+        base, extension = os.path.splitext(nombre)
+        salida = f"{base}.{hashlib.sha256(datos).hexdigest()[:10]}{extension}"
+        ruta = os.path.join(destino, salida)
+        copias = {salida: datos, salida + '.gz': gzip.compress(datos, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            copias[salida + '.br'] = brotli.compress(datos, quality=11)
+        for archivo, contenido in copias.items():
+            if not os.path.exists(os.path.join(destino, archivo)):
+                _escribir(os.path.join(destino, archivo), contenido)
+        vigentes.update(copias)
+
+        manifest[nombre] = os.path.relpath(ruta, STATIC_DIR).replace(os.sep, '/')
+        comprimidas = ', '.join(f"{archivo[len(salida) + 1:]} {len(contenido)}"
+                                for archivo, contenido in copias.items() if archivo != salida)
+        log(f"{nombre}: {sum(map(len, fuentes))} -> {len(datos)} bytes ({comprimidas})")
+
+    # Bundles de builds anteriores
+    for archivo in os.listdir(destino):
+        if archivo != 'manifest.json' and archivo not in vigentes and not archivo.endswith('.tmp'):
+            os.remove(os.path.join(destino, archivo))
+
+    _escribir(os.path.join(destino, 'manifest.json'),
+              json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+class Activos:
+    """
+    Helper `activo('admin.js')` de las plantillas: URL del bundle según el manifest.
+    Si falta el manifest (o con `auto=True`, si alguna fuente es más nueva que el
+    manifest) construye los bundles en ese momento.
+    """
+
+    def __init__(self, url_for, manifest_path=MANIFEST, auto=False):
+        self._url_for = url_for
+        self._manifest_path = manifest_path
+        self._auto = auto
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._manifest = {}
+
+    def _desactualizado(self, mtime):
+        if mtime is None:
+            return True
+        if not self._auto:
+            return False
+        return any(os.path.getmtime(os.path.join(STATIC_DIR, archivo)) > mtime
+                   for archivos in BUNDLES.values() for archivo in archivos)
+
+    def _mtime_manifest(self):
+        try:
+            return os.path.getmtime(self._manifest_path)
+        except OSError:
+            return None
+
+    def _cargar(self):
+        mtime = self._mtime_manifest()
+        if mtime != self._mtime or self._desactualizado(mtime):
+            with self._lock:
+                mtime = self._mtime_manifest()
+                if self._desactualizado(mtime):
+                    construir(destino=os.path.dirname(self._manifest_path))
+                    mtime = self._mtime_manifest()
+                if mtime != self._mtime:
+                    with open(self._manifest_path, encoding='utf-8') as f:
+                        self._manifest = json.load(f)
+                    self._mtime = mtime
+        return self._manifest
+
+    def __call__(self, bundle):
+        return self._url_for('static', filename=self._cargar()[bundle])
+
+
+if __name__ == '__main__':
+    construir()
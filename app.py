@@ -1,20 +1,74 @@
-import uuid
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-import mysql.connector
+import time
+from contextlib import contextmanager
+from flask import (Flask, Response, render_template, request, redirect, url_for, session, flash, jsonify, g,
+                   current_app, send_from_directory, before_render_template, template_rendered)
+from werkzeug.local import LocalProxy
+from werkzeug.security import safe_join
 from mysql.connector import Error
 from config import Config
+from db_pool import ConnectionPool
+from catalogo import TIEMPOS_MENU, CatalogoCache
+from comandas import ClavesComanda, IngestaComanda, normalizar_clave, normalizar_items
+import cocina
+from eventos import BusEventos
+from asignacion import MotorAsignacion, asignar_pendientes, cargar_indice
+from salon import Salon
+from paginacion import limite_desde, paginar
+import contadores
+import transacciones
+import reportes
+import exportacion
+from imagenes import ImagenesResponsive, construir as construir_imagenes
+import activos
+from cache_http import CachePaginas, comprimir_html
+from registro import RegistroDiferido
+import fragmentos
+from cola_formularios import ColaFormularios, DrenadorCola, nuevo_codigo
+import notificaciones
+from notificaciones import DespachadorNotificaciones
+from metricas import ConexionInstrumentada, Metricas
+from sincronizacion import ESTADOS_PEDIDO_ABIERTO, cambios_desde, siguiente_version
+import consultas
 from datetime import datetime, timedelta
+import atexit
 import functools
 import hashlib # Necesario para simular el hashing de contraseñas
 import json
-
-# Inicialización de la Aplicación
-app = Flask(__name__)
-app.config.from_object(Config)
+import mimetypes
+import os
+
+# Rutas, hooks y comandos de la app: create_app() los registra en cada app que construye
+rutas = RegistroDiferido()
+
+def _servicio(nombre):
+    """Proxy al servicio `nombre` de la app activa (ver _crear_servicios)."""
+    return LocalProxy(lambda: current_app.extensions['sumak'][nombre])
+
+# Servicios de la app activa. Cada app de create_app() tiene los suyos, con su config:
+# las vistas los usan con estos nombres y los hilos de fondo reciben los objetos reales.
+db_pool = _servicio('db_pool')
+metricas = _servicio('metricas')
+get_db_connection = _servicio('get_db_connection')
+catalogo = _servicio('catalogo')
+motor_mesas = _servicio('motor_mesas')
+salon = _servicio('salon')
+claves_comanda = _servicio('claves_comanda')
+reintentar = _servicio('reintentar')
+reconciliador = _servicio('reconciliador')
+cache_paginas = _servicio('cache_paginas')
+cola_formularios = _servicio('cola_formularios')
+drenador = _servicio('drenador')
+despachador = _servicio('despachador')
+actualizador_reportes = _servicio('actualizador_reportes')
+eventos = _servicio('eventos')
+eventos_cocina = _servicio('eventos_cocina')
+tiempos_ticket = _servicio('tiempos_ticket')
+activo = _servicio('activo')
+cache_fragmentos = _servicio('cache_fragmentos')
 
 # --- PROCESADOR DE CONTEXTO ---
 # Se ejecuta antes de renderizar CUALQUIER plantilla
-@app.context_processor
+@rutas.context_processor
 def inject_now():
     """Inyecta la variable 'now' (fecha/hora actual) en el contexto de Jinja2."""
     # Retorna un diccionario con las variables a inyectar
@@ -34,21 +88,208 @@ def inferir_tipo_documento(num_doc):
         return 'CE'
     return 'Otro'
 
-def get_db_connection():
-    """Establece y retorna una conexión a la base de datos MySQL."""
-    try:
-        conn = mysql.connector.connect(
-            host=app.config['MYSQL_HOST'],
-            user=app.config['MYSQL_USER'],
-            password=app.config['MYSQL_PASSWORD'],
-            database=app.config['MYSQL_DB'],
-            port=app.config['MYSQL_PORT']
-        )
-        return conn
-    except Error as e:
-        print(f"Error al conectar a MySQL: {e}")
-        # En una aplicación real, se manejaría un error 500
-        return None
+def conexiones_de(pool, medidor):
+    """El `get_db_connection` de una app: conexiones de `pool` medidas en `medidor`."""
+    @contextmanager
+    def get_db_connection():
+        """
+        Presta una conexión del pool MySQL como context manager.
+        La conexión vuelve al pool al salir del bloque `with` (con rollback si quedó
+        una transacción abierta). Los errores de conexión se propagan como `Error`.
+        Cada sentencia queda medida en `metricas` y sumada a `g.sql_stats`.
+        """
+        with pool.connection() as conn:
+            yield ConexionInstrumentada(conn, medidor)
+
+    return get_db_connection
+
+def _crear_servicios(app):
+    """Construye los servicios de `app` con su config y los guarda en `app.extensions['sumak']`."""
+    config = app.config
+
+    # Pool de conexiones: no abre ninguna conexión hasta la primera petición
+    db_pool = ConnectionPool.from_config(config)
+    atexit.register(db_pool.close_all)  # COM_QUIT al salir en vez de dejar los sockets colgados en MySQL
+
+    # Métricas de rutas y SQL, expuestas en /admin/metrics
+    metricas = Metricas(slow_query_ms=config['SQL_SLOW_QUERY_MS'])
+    get_db_connection = conexiones_de(db_pool, metricas)
+
+    # Catálogo (platos, categorías, precios y menú del día) cacheado en memoria;
+    # las rutas de escritura del admin lo invalidan.
+    catalogo = CatalogoCache(get_db_connection, max_age=config['CATALOGO_MAX_AGE'])
+
+    # Ocupación de mesas por reservas confirmadas y pedidos abiertos, para proponer mesa
+    motor_mesas = MotorAsignacion(get_db_connection, timedelta(minutes=config['RESERVA_DURACION_MIN']),
+                                  max_age=config['CATALOGO_MAX_AGE'])
+
+    # Estado del salón (mesas, pedidos abiertos, totales) para la vista de comandas, al día con sync_estado
+    salon = Salon(get_db_connection)
+
+    # Comandas ya registradas, por la clave que envía la tablet: un reenvío no vuelve a escribir
+    claves_comanda = ClavesComanda(ttl=config['COMANDA_CLAVES_TTL'], max_entradas=config['COMANDA_CLAVES_MAX'])
+
+    # Transacciones de escritura que MySQL abortó por deadlock o espera de lock: se repiten enteras
+    reintentar = transacciones.Reintentos(config['TX_INTENTOS'], config['TX_ESPERA'])
+
+    # Reconciliación periódica de los contadores del dashboard (ver contadores.py)
+    reconciliador = contadores.Reconciliador(config['CONTADORES_RECONCILIAR_CADA'])
+
+    # HTML de las páginas públicas para visitantes anónimos (sin sesión ni flash)
+    cache_paginas = CachePaginas(ttl=config['PAGINAS_CACHE_TTL'], max_bytes=config['PAGINAS_CACHE_MAX_BYTES'])
+
+    # Formularios públicos: se anotan en un diario en disco y un hilo los pasa a MySQL
+    cola_formularios = ColaFormularios(config['COLA_DIR'])
+    drenador = DrenadorCola(cola_formularios, get_db_connection, lote=config['COLA_LOTE'],
+                            intervalo=config['COLA_INTERVALO'])
+
+    # Correos salientes: las rutas los dejan en la tabla `notificaciones` y un hilo los envía por SMTP
+    despachador = DespachadorNotificaciones(
+        get_db_connection,
+        {
+            'host': config['SMTP_HOST'],
+            'port': config['SMTP_PORT'],
+            'usuario': config['SMTP_USER'],
+            'password': config['SMTP_PASSWORD'],
+            'starttls': config['SMTP_STARTTLS'],
+        },
+        remitente=config['MAIL_REMITENTE'],
+        buzon=config['MAIL_BUZON'],
+        hilos=config['NOTIF_HILOS'],
+        lote=config['NOTIF_LOTE'],
+        por_minuto=config['NOTIF_POR_MINUTO'],
+        max_intentos=config['NOTIF_MAX_INTENTOS'],
+        # Un solo worker envía, para que NOTIF_POR_MINUTO sea el total y no uno por proceso
+        bloqueo=functools.partial(cola_formularios.bloqueo, 'notificaciones'),
+    )
+
+    # Rollups de /admin/reportes: un hilo los pone al día, las vistas solo los leen
+    actualizador_reportes = reportes.ActualizadorRollups(
+        get_db_connection, intervalo=config['REPORTES_INTERVALO'],
+        bloqueo=functools.partial(cola_formularios.bloqueo, 'rollup'))
+
+    # Eventos en vivo (SSE) de mesas y comandas para las tablets de las mozas
+    eventos = BusEventos(max_eventos=config['EVENTOS_MAX_BUFFER'], heartbeat=config['EVENTOS_HEARTBEAT'])
+    # ... y de comandas nuevas y líneas que cambian de estado para la pantalla de la cocina
+    eventos_cocina = BusEventos(max_eventos=config['EVENTOS_MAX_BUFFER'], heartbeat=config['EVENTOS_HEARTBEAT'])
+    tiempos_ticket = cocina.TiemposTicket()
+
+    # Helper `imagen()` de las plantillas: <picture> con las variantes AVIF/WebP de static/build
+    app.jinja_env.globals['imagen'] = ImagenesResponsive(url_for)
+    # Helper `activo()`: URL del bundle JS/CSS con hash; en debug se reconstruye al cambiar una fuente
+    activo = activos.Activos(url_for, auto=app.debug)
+    app.jinja_env.globals['activo'] = activo
+
+    # Etiqueta {% cache %} para bloques de plantilla que se repiten entre peticiones, y
+    # bytecode de las plantillas en disco para que un worker nuevo no las recompile
+    cache_fragmentos = fragmentos.CacheFragmentos(ttl=config['FRAGMENTOS_TTL'],
+                                                  max_entradas=config['FRAGMENTOS_MAX_ENTRADAS'])
+    fragmentos.configurar(app.jinja_env, cache_fragmentos, config['JINJA_BYTECODE_DIR'])
+    catalogo.al_cambiar(lambda: cache_fragmentos.invalidar('catalogo'))
+
+    app.extensions['sumak'] = {
+        'db_pool': db_pool,
+        'metricas': metricas,
+        'get_db_connection': get_db_connection,
+        'catalogo': catalogo,
+        'motor_mesas': motor_mesas,
+        'salon': salon,
+        'claves_comanda': claves_comanda,
+        'reintentar': reintentar,
+        'reconciliador': reconciliador,
+        'cache_paginas': cache_paginas,
+        'cola_formularios': cola_formularios,
+        'drenador': drenador,
+        'despachador': despachador,
+        'actualizador_reportes': actualizador_reportes,
+        'eventos': eventos,
+        'eventos_cocina': eventos_cocina,
+        'tiempos_ticket': tiempos_ticket,
+        'activo': activo,
+        'cache_fragmentos': cache_fragmentos,
+    }
+
+# -----------------------------------------------------
+# ARCHIVOS ESTÁTICOS GENERADOS (static/build)
+# -----------------------------------------------------
+@rutas.after_request
+def cache_estaticos_generados(response):
+    """Los archivos de static/build llevan el hash del contenido en el nombre: nunca cambian."""
+    if request.path.startswith('/static/build/') and response.status_code == 200:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@rutas.route('/static/build/assets/<path:filename>')
+def servir_activo(filename):
+    """Bundles JS/CSS: entrega la copia precomprimida (brotli o gzip) que acepte el navegador."""
+    mimetype = mimetypes.guess_type(filename)[0]
+    for extension, codificacion in activos.COMPRESIONES:
+        ruta = safe_join(activos.DESTINO, filename + extension)
+        if request.accept_encodings[codificacion] and ruta and os.path.isfile(ruta):
+            response = send_from_directory(activos.DESTINO, filename + extension, mimetype=mimetype)
+            response.headers['Content-Encoding'] = codificacion
+            break
+    else:
+        response = send_from_directory(activos.DESTINO, filename, mimetype=mimetype)
+    response.vary.add('Accept-Encoding')
+    return response
+
+@rutas.command('construir-activos')
+def construir_activos_command():
+    """Genera los bundles JS/CSS minificados y precomprimidos (`flask --app app construir-activos`)."""
+    manifest = activos.construir()
+    print(f"Manifest de activos actualizado ({len(manifest)} bundles).")
+
+@rutas.command('construir-imagenes')
+def construir_imagenes_command():
+    """Genera las variantes responsive de static/images (`flask --app app construir-imagenes`)."""
+    manifest = construir_imagenes()
+    print(f"Manifest de imágenes actualizado ({len(manifest)} imágenes).")
+
+# -----------------------------------------------------
+# INSTRUMENTACIÓN: latencia por ruta, tiempo en MySQL y en plantillas
+# -----------------------------------------------------
+@rutas.before_request
+def iniciar_hilos_de_fondo():
+    """Arranca (una vez por proceso, también tras un fork) los hilos de la cola, del correo, de los reportes y del pool."""
+    db_pool.start_maintenance()
+    drenador.iniciar()
+    despachador.iniciar()
+    actualizador_reportes.iniciar()
+
+@rutas.before_request
+def iniciar_medicion():
+    g.inicio_peticion = time.perf_counter()
+    g.sql_stats = {'consultas': 0, 'segundos': 0.0, 'filas': 0}
+    g.render_segundos = 0.0
+
+@rutas.conectar(before_render_template)
+def _inicio_render(sender, template, context, **extra):
+    g.inicio_render = time.perf_counter()
+
+@rutas.conectar(template_rendered)
+def _fin_render(sender, template, context, **extra):
+    inicio = g.pop('inicio_render', None)
+    if inicio is not None:
+        g.render_segundos = g.get('render_segundos', 0.0) + time.perf_counter() - inicio
+
+@rutas.after_request
+def registrar_medicion(response):
+    inicio = g.get('inicio_peticion')
+    if inicio is not None:
+        stats = g.sql_stats
+        metricas.observar_peticion(
+            request.endpoint or 'desconocida', request.method, time.perf_counter() - inicio,
+            stats['segundos'], g.render_segundos, stats['consultas'])
+        if current_app.debug:
+            response.headers['Server-Timing'] = (
+                f"db;dur={stats['segundos'] * 1000:.1f};desc=\"{stats['consultas']} consultas\", "
+                f"render;dur={g.render_segundos * 1000:.1f}")
+    return response
+
+# gzip del HTML dinámico. Flask corre los after_request en orden inverso al registro:
+# este va antes que registrar_medicion, así la latencia medida incluye la compresión.
+rutas.after_request(comprimir_html)
 
 # -----------------------------------------------------
 # FUNCIÓN DE UTILIDAD: Hashing de Contraseñas (Simulado)
@@ -82,90 +323,102 @@ def require_role(allowed_roles):
     return decorator
 
 
+def pagina_publica(vista):
+    """Como `CachePaginas.publica`, con la caché de páginas de la app activa."""
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        return cache_paginas.servir(vista, *args, **kwargs)
+    return envoltura
+
+
 # -----------------------------------------------------
 # 1. RUTAS PÚBLICAS 🌐
 # -----------------------------------------------------
 
-@app.route('/')
+@rutas.route('/')
+@pagina_publica
 def index():
     """Landing Page: Contiene la sección de Contacto."""
     return render_template('index.html', title='Inicio - Sumak Mikuy')
 
-@app.route('/contactanos', methods=['POST'])
+@rutas.route('/contactanos', methods=['POST'])
 def contactanos():
     """Maneja el formulario de Contacto y simula el envío de correo."""
     name = request.form.get('name')
     email = request.form.get('email')
     message = request.form.get('message')
     
-    # **********************************************
-    # SIMULACIÓN DE ENVÍO DE CORREO
-    # **********************************************
-    print(f"\n--- Nuevo Mensaje de Contacto ---")
-    print(f"De: {name} ({email})")
-    print(f"Mensaje: {message}\n")
-    # **********************************************
+    # El envío (simulado) lo hace el drenador de la cola, fuera de la petición
+    try:
+        cola_formularios.encolar('contacto', {'name': name, 'email': email, 'message': message})
+        drenador.avisar()
+    except OSError as e:
+        flash(f'No se pudo enviar el mensaje: {e}', 'danger')
+        return redirect(url_for('index') + '#contacto')
     
     flash('¡Mensaje enviado con éxito! Te contactaremos pronto.', 'success')
     return redirect(url_for('index') + '#contacto') # Redirigir a la sección de contacto
 
-@app.route('/reservas', methods=['GET', 'POST'])
+@rutas.route('/reservas', methods=['GET', 'POST'])
+@pagina_publica
 def reservas():
     """Vista y gestión del formulario de Reservas."""
     if request.method == 'POST':
-        name = request.form.get('name')
-        email = request.form.get('email')
-        guests = request.form.get('guests')
+        name = (request.form.get('name') or '').strip()
+        email = (request.form.get('email') or '').strip()
+        guests = request.form.get('guests', '').strip()
         date = request.form.get('date')
         time = request.form.get('time')
         notes = request.form.get('notes')
-        
+
+        # El drenador inserta la reserva después de responder: lo que MySQL
+        # rechazaría se valida aquí, antes de entregarle un código al cliente.
+        if not name or not email or len(name) > 100 or len(email) > 100:
+            flash('Indica tu nombre y tu correo (máximo 100 caracteres).', 'danger')
+            return render_template('reservas.html', title='Reservar una Mesa')
+        if not guests.isdigit() or int(guests) < 1:
+            flash('El número de personas debe ser un entero mayor que cero.', 'danger')
+            return render_template('reservas.html', title='Reservar una Mesa')
+        guests = int(guests)
+
         try:
             # Concatenar fecha y hora para el formato DATETIME de MySQL
             reserva_at_str = f"{date} {time}:00"
             datetime.strptime(reserva_at_str, '%Y-%m-%d %H:%M:%S') # Validación de formato
 
-            conn = get_db_connection()
-            if conn:
-                cursor = conn.cursor()
-                # usuario_id es NULL ya que el cliente es anónimo
-                query = """
-                INSERT INTO reservas (name, email, guests, reserva_at, notas, status)
-                VALUES (%s, %s, %s, %s, %s, 'pendiente')
-                """
-                cursor.execute(query, (name, email, guests, reserva_at_str, notes))
-                conn.commit()
-                cursor.close()
-                conn.close()
-                flash('¡Reserva creada con éxito! Espera nuestra confirmación por correo.', 'success')
-                return redirect(url_for('index'))
-            else:
-                flash('Error de conexión a la base de datos.', 'danger')
+            # La reserva entra a la cola y el drenador la inserta como 'pendiente'
+            # (usuario_id NULL: el cliente es anónimo). El recibo evita duplicarla al reintentar.
+            recibo = nuevo_codigo('RS')
+            cola_formularios.encolar('reserva', {
+                'recibo': recibo, 'name': name, 'email': email, 'guests': guests,
+                'reserva_at': reserva_at_str, 'notas': notes,
+            })
+            drenador.avisar()
+            flash(f'¡Reserva recibida! Tu código es **{recibo}**. Espera nuestra confirmación por correo.', 'success')
+            return redirect(url_for('index'))
 
         except ValueError:
             flash('Formato de fecha u hora inválido.', 'danger')
-        except Error as e:
+        except OSError as e:
             flash(f'Error al guardar la reserva: {e}', 'danger')
         
     return render_template('reservas.html', title='Reservar una Mesa')
 
-@app.route('/login', methods=['GET', 'POST'])
+@rutas.route('/login', methods=['GET', 'POST'])
 def login():
-    """Maneja el inicio de sesión para Admin y Moza."""
+    """Maneja el inicio de sesión para Admin, Moza y Cocina."""
     if request.method == 'POST':
         email = request.form.get('email')
         password = request.form.get('password') 
         
-        conn = get_db_connection()
-        if conn:
-            cursor = conn.cursor(dictionary=True)
-            # Buscar usuario por email (Solo Admin y Moza)
-            query = "SELECT id, email, password, rol, nombres FROM usuarios WHERE email = %s AND rol IN (%s, %s)"
-            cursor.execute(query, (email, Config.ROLES['ADMIN'], Config.ROLES['MOZA']))
-            user = cursor.fetchone()
-            cursor.close()
-            conn.close()
-            
+        try:
+            with get_db_connection() as conn:
+                # Buscar usuario por email (Solo Admin, Moza y Cocina)
+                user = consultas.usuario_para_login(
+                    conn, email, (Config.ROLES['ADMIN'], Config.ROLES['MOZA'], Config.ROLES['COCINA']))
+        except Error:
+            flash('Error de conexión a la base de datos.', 'danger')
+        else:
             # Nota: El SQL de ejemplo usa 'hashed_pass', por eso se mantiene la simulación.
             # En un entorno real: user and bcrypt.check_password_hash(user['password'], password)
             if user and user['password'] == password: # Simulación de verificación
@@ -177,15 +430,13 @@ def login():
                 flash(f"Bienvenido, {user['nombres']}. Has iniciado sesión como {user['rol']}.", 'success')
                 
                 # Redirección basada en el rol
-                return redirect(app.config['LOGIN_SUCCESS_REDIRECT'].get(user['rol'], url_for('index')))
+                return redirect(current_app.config['LOGIN_SUCCESS_REDIRECT'].get(user['rol'], url_for('index')))
             else:
                 flash('Credenciales inválidas o usuario no autorizado.', 'danger')
-        else:
-            flash('Error de conexión a la base de datos.', 'danger')
 
     return render_template('login.html', title='Iniciar Sesión')
 
-@app.route('/logout')
+@rutas.route('/logout')
 def logout():
     """Cierra la sesión del usuario."""
     session.clear()
@@ -197,178 +448,289 @@ def logout():
 # 2. RUTAS DE ADMIN (Protegidas) 👑
 # -----------------------------------------------------
 
-@app.route('/admin/dashboard')
+@rutas.route('/admin/dashboard')
 @require_role([Config.ROLES['ADMIN']])
 def admin_dashboard():
     """Dashboard principal del Admin."""
-    conn = get_db_connection()
-    reservas_pendientes = 0
-    platos_totales = 0
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM reservas WHERE status = 'pendiente'")
-        reservas_pendientes = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(*) FROM platos WHERE status = 'disponible'")
-        platos_totales = cursor.fetchone()[0]
-        cursor.close()
-        conn.close()
+    resumen = {}
+    try:
+        with get_db_connection() as conn, conn.cursor(dictionary=True) as cursor:
+            # Los contadores se mantienen en cada escritura; cada cierto tiempo se
+            # recalculan desde las tablas para corregir cualquier deriva.
+            if reconciliador.pendiente():
+                derivas = contadores.reconciliar(cursor)
+                conn.commit()
+                if derivas:
+                    current_app.logger.warning('Contadores del dashboard corregidos: %s', derivas)
+            resumen = contadores.leer(cursor)
+    except Error as e:
+        flash(f'Error al cargar el resumen: {e}', 'danger')
         
     return render_template('admin_dashboard.html', 
                            title='Admin Dashboard', 
-                           reservas_pendientes=reservas_pendientes,
-                           platos_totales=platos_totales)
+                           reservas_pendientes=int(resumen.get('reservas_pendientes', 0)),
+                           platos_totales=int(resumen.get('platos_disponibles', 0)),
+                           pedidos_abiertos=int(resumen.get('pedidos_abiertos', 0)),
+                           mesas_ocupadas=int(resumen.get('mesas_ocupadas', 0)),
+                           mesas_totales=int(resumen.get('mesas_totales', 0)),
+                           ingresos_hoy=resumen.get('ingresos_hoy', 0))
+
+@rutas.command('reconciliar-contadores')
+def reconciliar_contadores_command():
+    """Recalcula los contadores del dashboard (para cron: `flask --app app reconciliar-contadores`)."""
+    with get_db_connection() as conn, conn.cursor(dictionary=True) as cursor:
+        derivas = contadores.reconciliar(cursor)
+        conn.commit()
+    for nombre, (antes, despues) in derivas.items():
+        print(f"{nombre}: {antes} -> {despues}")
+    print(f"Contadores reconciliados ({len(derivas)} corregidos).")
 
 
-@app.route('/admin/reservas')
+ESTADOS_RESERVA = ('pendiente', 'confirmada', 'completada', 'cancelada', 'no_asistio')
+
+def filtros_reservas(args):
+    """Filtros de la lista de reservas (status y rango de fechas) tal como llegan en la query string."""
+    filtros = {}
+    if args.get('status') in ESTADOS_RESERVA:
+        filtros['status'] = args['status']
+    for clave in ('desde', 'hasta'):
+        try:
+            filtros[clave] = datetime.strptime(args.get(clave, ''), '%Y-%m-%d').date()
+        except ValueError:
+            pass
+    return filtros
+
+def pagina_reservas(cursor, filtros, args):
+    """Página de reservas ordenada por (reserva_at, id) descendente; usa idx_status_reserva_at / idx_reserva_at."""
+    where, params = [], []
+    if 'status' in filtros:
+        where.append("r.status = %s")
+        params.append(filtros['status'])
+    if 'desde' in filtros:
+        where.append("r.reserva_at >= %s")
+        params.append(filtros['desde'])
+    if 'hasta' in filtros:
+        where.append("r.reserva_at < %s")
+        params.append(filtros['hasta'] + timedelta(days=1))
+
+    return paginar(cursor, """
+        SELECT 
+            r.id, r.name, r.email, r.guests, r.reserva_at, r.notas, r.status,
+            m.numero_mesa, m.capacidad
+        FROM reservas r
+        LEFT JOIN mesas m ON r.mesa_asignada_id = m.id
+    """, [('r.reserva_at', 'reserva_at'), ('r.id', 'id')],
+        limite=limite_desde(args), despues=args.get('despues'), antes=args.get('antes'),
+        where=where, params=params, descendente=True)
+
+@rutas.route('/admin/reservas')
 @require_role([Config.ROLES['ADMIN']])
 def admin_reservas():
     """Vista para ver, aprobar o cancelar Reservas."""
-    conn = get_db_connection()
+    filtros = filtros_reservas(request.args)
     reservas = []
-    mesas = []
-    if conn:
-        cursor = conn.cursor(dictionary=True)
-        # Consulta para traer todas las reservas, ordenadas por fecha reciente
-        cursor.execute("""
-            SELECT 
-                r.id, r.name, r.email, r.guests, r.reserva_at, r.notas, r.status,
-                m.numero_mesa, m.capacidad
-            FROM reservas r
-            LEFT JOIN mesas m ON r.mesa_asignada_id = m.id
-            ORDER BY r.reserva_at DESC
-        """)
-        reservas = cursor.fetchall()
-        
-        # Obtener mesas disponibles/ocupadas para la asignación
-        cursor.execute("SELECT id, numero_mesa, capacidad FROM mesas WHERE status IN ('disponible', 'ocupada')")
-        mesas = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
+    candidatas = {}
+    try:
+        with get_db_connection() as conn, conn.cursor(dictionary=True) as cursor:
+            version, _ = consultas.version_actual(conn)
+            reservas = pagina_reservas(cursor, filtros, request.args)
+
+        # Para cada pendiente, solo las mesas libres a esa hora que alcanzan (la primera es la sugerida)
+        indice = motor_mesas.get(version)
+        for reserva in reservas:
+            if reserva['status'] == 'pendiente':
+                candidatas[reserva['id']] = indice.candidatas(reserva['guests'], reserva['reserva_at'])
+    except Error as e:
+        flash(f'Error al listar las reservas: {e}', 'danger')
 
-    return render_template('admin_reservas.html', title='Gestión de Reservas', reservas=reservas, mesas=mesas)
+    return render_template('admin_reservas.html', title='Gestión de Reservas', reservas=reservas,
+                           candidatas=candidatas, filtros=filtros, estados=ESTADOS_RESERVA,
+                           filtros_url={clave: str(valor) for clave, valor in filtros.items()},
+                           hoy=datetime.now().date())
 
-@app.route('/admin/reservas/update/<int:reserva_id>', methods=['POST'])
+@rutas.route('/admin/api/reservas')
+@require_role([Config.ROLES['ADMIN']])
+def admin_api_reservas():
+    """Variante JSON de la lista de reservas, con los mismos filtros y cursores."""
+    filtros = filtros_reservas(request.args)
+    try:
+        with get_db_connection() as conn, conn.cursor(dictionary=True) as cursor:
+            pagina = pagina_reservas(cursor, filtros, request.args)
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+
+    for reserva in pagina:
+        reserva['reserva_at'] = reserva['reserva_at'].isoformat()
+    return jsonify({
+        'reservas': pagina.items,
+        'siguiente': pagina.siguiente,
+        'anterior': pagina.anterior,
+    })
+
+@rutas.route('/admin/reservas/update/<int:reserva_id>', methods=['POST'])
 @require_role([Config.ROLES['ADMIN']])
 def update_reserva(reserva_id):
     """Endpoint para aprobar o cancelar una reserva."""
     status = request.form.get('status')
-    mesa_id = request.form.get('mesa_id') 
+    mesa_id = request.form.get('mesa_id', type=int)
+
+    if status == 'confirmada' and not mesa_id:
+        flash('Debe asignar una mesa para confirmar la reserva.', 'danger')
+        return redirect(url_for('admin_reservas'))
+
+    def confirmar(conn, cursor):
+        # La mesa antes que la reserva: dos confirmaciones sobre la misma mesa se
+        # ordenan aquí y la segunda ya ve en el índice la reserva de la primera
+        if consultas.bloquear_mesa(conn, mesa_id) is None:
+            return f'Error: La mesa {mesa_id} no existe.', 'danger'
+        reserva = consultas.bloquear_reserva(conn, reserva_id)
+        if reserva is None:
+            return f'Error: La reserva {reserva_id} no existe.', 'danger'
+
+        # La mesa queda comprometida solo en el horario de la reserva; su
+        # estado físico (ocupada/disponible) lo cambian las comandas.
+        indice = cargar_indice(cursor, motor_mesas.duracion)
+        if not any(mesa['id'] == mesa_id for mesa in indice.candidatas(reserva['guests'], reserva['reserva_at'])):
+            return f'La mesa {mesa_id} no está libre o no alcanza para {reserva["guests"]} personas a esa hora.', 'danger'
+
+        consultas.confirmar_reserva(conn, reserva_id, mesa_id)
+        if reserva['status'] == 'pendiente':
+            contadores.ajustar(cursor, reservas_pendientes=-1)
+        if reserva['status'] != 'confirmada':
+            notificaciones.agregar_reservas(cursor, 'reserva_confirmada', [reserva_id])
+        conn.commit()
+        return f'Reserva {reserva_id} confirmada y mesa {mesa_id} asignada.', 'success'
+
+    def cancelar(conn, cursor):
+        reserva = consultas.bloquear_reserva(conn, reserva_id)
+        if reserva is None:
+            return f'Error: La reserva {reserva_id} no existe.', 'danger'
+        if reserva['status'] != 'cancelada':
+            if reserva['status'] == 'pendiente':
+                contadores.ajustar(cursor, reservas_pendientes=-1)
+            consultas.cancelar_reserva(conn, reserva_id)
+            notificaciones.agregar_reservas(cursor, 'reserva_cancelada', [reserva_id])
+            conn.commit()
+        return f'Reserva {reserva_id} cancelada.', 'info'
 
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            
+    def actualizar():
+        with get_db_connection() as conn, conn.cursor(dictionary=True) as cursor:
             if status == 'confirmada':
-                if not mesa_id:
-                    flash('Debe asignar una mesa para confirmar la reserva.', 'danger')
-                    return redirect(url_for('admin_reservas'))
-                    
-                update_query = "UPDATE reservas SET status = %s, mesa_asignada_id = %s WHERE id = %s"
-                cursor.execute(update_query, (status, mesa_id, reserva_id))
-                
-                # Marcar la mesa como ocupada (lógica simplificada)
-                cursor.execute("UPDATE mesas SET status = 'ocupada' WHERE id = %s", (mesa_id,))
-                
-                flash(f'Reserva {reserva_id} confirmada y mesa {mesa_id} asignada.', 'success')
-                
-            elif status == 'cancelada':
-                # Obtener mesa_id anterior para liberarla
-                cursor.execute("SELECT mesa_asignada_id FROM reservas WHERE id = %s", (reserva_id,))
-                old_mesa_id = cursor.fetchone()[0]
-                
-                update_query = "UPDATE reservas SET status = %s, mesa_asignada_id = NULL WHERE id = %s"
-                cursor.execute(update_query, (status, reserva_id))
-                
-                if old_mesa_id:
-                     cursor.execute("UPDATE mesas SET status = 'disponible' WHERE id = %s", (old_mesa_id,))
-                     
-                flash(f'Reserva {reserva_id} cancelada.', 'info')
-            
-            conn.commit()
-            
-        except Error as e:
-            flash(f'Error al actualizar la reserva: {e}', 'danger')
-        finally:
-            conn.close()
+                return confirmar(conn, cursor)
+            if status == 'cancelada':
+                return cancelar(conn, cursor)
+        return None
+
+    try:
+        resultado = reintentar(actualizar)
+        if resultado:
+            flash(*resultado)
+        motor_mesas.invalidate()
+
+    except Error as e:
+        flash(f'Error al actualizar la reserva: {e}', 'danger')
+
+    return redirect(url_for('admin_reservas'))
+
+@rutas.route('/admin/reservas/auto-asignar', methods=['POST'])
+@require_role([Config.ROLES['ADMIN']])
+def auto_asignar_reservas():
+    """Confirma de una vez las reservas pendientes de una noche asignando la mesa de mejor ajuste."""
+    try:
+        fecha = datetime.strptime(request.form.get('fecha', ''), '%Y-%m-%d')
+    except ValueError:
+        flash('Fecha inválida para la asignación automática.', 'danger')
+        return redirect(url_for('admin_reservas'))
+
+    def asignar():
+        with get_db_connection() as conn, conn.cursor(dictionary=True) as cursor:
+            # Todas las mesas bloqueadas (en orden de id) mientras se arma el índice:
+            # una confirmación manual en paralelo espera a que esta termine
+            consultas.bloquear_mesas(conn)
+            indice = cargar_indice(cursor, motor_mesas.duracion)
+            asignadas, sin_mesa = asignar_pendientes(cursor, indice, fecha, fecha + timedelta(days=1))
+            if asignadas:
+                confirmadas = consultas.confirmar_reservas_pendientes(
+                    conn, [(reserva_id, mesa['id']) for reserva_id, mesa in asignadas])
+                contadores.ajustar(cursor, reservas_pendientes=-confirmadas)
+                notificaciones.agregar_reservas(cursor, 'reserva_confirmada', [reserva_id for reserva_id, _ in asignadas])
+                conn.commit()
+            return asignadas, sin_mesa
+
+    try:
+        asignadas, sin_mesa = reintentar(asignar)
+        motor_mesas.invalidate()
+
+        mensaje = f'{len(asignadas)} reservas del {fecha:%d/%m/%Y} confirmadas con mesa asignada.'
+        if sin_mesa:
+            mensaje += f' Sin mesa libre: {", ".join(f"#{reserva_id}" for reserva_id in sin_mesa)}.'
+        flash(mensaje, 'warning' if sin_mesa else 'success')
+    except Error as e:
+        flash(f'Error en la asignación automática: {e}', 'danger')
 
     return redirect(url_for('admin_reservas'))
 
 
 # app.py (Código corregido)
 
-@app.route('/admin/platos', methods=['GET', 'POST'])
+@rutas.route('/admin/platos', methods=['GET', 'POST'])
 @require_role([Config.ROLES['ADMIN']])
 def admin_platos():
     """Vista única para Listar (GET) y Agregar (POST) Platos. Soluciona el error 404."""
-    conn = get_db_connection()
     platos = []
     categorias = []
     
-    if conn is None:
-        flash('Error al conectar a la base de datos.', 'danger')
-        return render_template('admin_platos.html', title='Gestión de Platos', platos=[], categorias=[])
-    
     try:
-        cursor = conn.cursor(dictionary=True)
-        
-        # 1. Obtener listado de categorías (necesario para el select del formulario)
-        cursor.execute("SELECT id, nombre FROM categorias_menu ORDER BY nombre") 
-        categorias = cursor.fetchall()
+        with get_db_connection() as conn, conn.cursor(dictionary=True) as cursor:
+            # 1. Obtener listado de categorías (necesario para el select del formulario)
+            categorias = consultas.categorias(conn)
         
-        # 2. Lógica POST: Agregar nuevo plato
-        if request.method == 'POST':
-            nombre = request.form.get('nombre')
-            descripcion = request.form.get('descripcion')
-            precio_str = request.form.get('precio')
-            categoria_id = request.form.get('categoria_id')
-            es_vegetariano = 1 if request.form.get('es_vegetariano') else 0
-            tiempo_str = request.form.get('tiempo_preparacion_min')
+            # 2. Lógica POST: Agregar nuevo plato
+            if request.method == 'POST':
+                nombre = request.form.get('nombre')
+                descripcion = request.form.get('descripcion')
+                precio_str = request.form.get('precio')
+                categoria_id = request.form.get('categoria_id')
+                es_vegetariano = 1 if request.form.get('es_vegetariano') else 0
+                tiempo_str = request.form.get('tiempo_preparacion_min')
             
-            if not all([nombre, descripcion, precio_str, categoria_id, tiempo_str]):
-                flash('Todos los campos son obligatorios.', 'warning')
-            else:
-                try:
-                    precio = float(precio_str)
-                    tiempo = int(tiempo_str)
-                    query = """
-                    INSERT INTO platos (categoria_id, nombre, descripcion, precio, tiempo_preparacion_min, es_vegetariano, status)
-                    VALUES (%s, %s, %s, %s, %s, %s, 'disponible')
-                    """
-                    cursor.execute(query, (categoria_id, nombre, descripcion, precio, tiempo, es_vegetariano))
-                    conn.commit()
-                    flash(f'Plato "{nombre}" agregado exitosamente.', 'success')
-                    # Redirigir a sí mismo para limpiar el formulario (PRG Pattern)
-                    return redirect(url_for('admin_platos'))
-                except ValueError:
-                    flash('Error: Precio o tiempo deben ser números válidos.', 'danger')
-                except Exception as e:
-                    conn.rollback()
-                    flash(f'Error al guardar en BD: {e}', 'danger')
+                if not all([nombre, descripcion, precio_str, categoria_id, tiempo_str]):
+                    flash('Todos los campos son obligatorios.', 'warning')
+                else:
+                    try:
+                        precio = float(precio_str)
+                        tiempo = int(tiempo_str)
+                        consultas.crear_plato(conn, categoria_id, nombre, descripcion, precio, tiempo, es_vegetariano)
+                        contadores.ajustar(cursor, platos_disponibles=1)
+                        siguiente_version(cursor, menu=True)
+                        conn.commit()
+                        catalogo.invalidate()
+                        flash(f'Plato "{nombre}" agregado exitosamente.', 'success')
+                        # Redirigir a sí mismo para limpiar el formulario (PRG Pattern)
+                        return redirect(url_for('admin_platos'))
+                    except ValueError:
+                        flash('Error: Precio o tiempo deben ser números válidos.', 'danger')
+                    except Exception as e:
+                        conn.rollback()
+                        flash(f'Error al guardar en BD: {e}', 'danger')
         
-        # 3. Lógica GET: Listar platos
-        query_platos = """
-        SELECT p.id, p.nombre, p.descripcion, p.precio, p.status, p.es_vegetariano, c.nombre AS categoria 
-        FROM platos p 
-        JOIN categorias_menu c ON p.categoria_id = c.id
-        WHERE p.status != 'agotado'
-        ORDER BY c.nombre, p.nombre
-        """
-        cursor.execute(query_platos)
-        platos = cursor.fetchall()
+            # 3. Lógica GET: Listar platos (paginado por categoría, nombre, id)
+            query_platos = """
+            SELECT p.id, p.nombre, p.descripcion, p.precio, p.status, p.es_vegetariano, c.nombre AS categoria 
+            FROM platos p 
+            JOIN categorias_menu c ON p.categoria_id = c.id
+            """
+            platos = paginar(cursor, query_platos,
+                             [('c.nombre', 'categoria'), ('p.nombre', 'nombre'), ('p.id', 'id')],
+                             limite=limite_desde(request.args), despues=request.args.get('despues'),
+                             antes=request.args.get('antes'), where=["p.status != 'agotado'"])
 
     except Exception as e:
         flash(f'Error general: {e}', 'danger')
-        if conn: conn.rollback()
-    finally:
-        if conn and conn.is_connected():
-            cursor.close()
-            conn.close()
 
     return render_template('admin_platos.html', title='Gestión de Platos', platos=platos, categorias=categorias)
 
-@app.route('/admin/platos/edit/<int:plato_id>', methods=['POST'])
+@rutas.route('/admin/platos/edit/<int:plato_id>', methods=['POST'])
 @require_role([Config.ROLES['ADMIN']])
 def update_plato(plato_id):
     """Endpoint para editar un plato existente."""
@@ -378,63 +740,51 @@ def update_plato(plato_id):
     categoria_id = request.form.get('categoria_id')
     es_vegetariano = 1 if request.form.get('es_vegetariano') == 'on' else 0
     tiempo = request.form.get('tiempo_preparacion_min')
-    status = 'disponible'
     
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            query = """
-            UPDATE platos SET 
-                nombre = %s, descripcion = %s, precio = %s, categoria_id = %s,
-                es_vegetariano = %s, tiempo_preparacion_min = %s, status = %s
-            WHERE id = %s
-            """
-            cursor.execute(query, (nombre, descripcion, precio, categoria_id, es_vegetariano, tiempo, status, plato_id))
+    try:
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            # El plato vuelve a 'disponible': cuenta solo si antes no lo estaba
+            contadores.ajustar(cursor, platos_disponibles=(
+                "(SELECT COUNT(*) FROM platos WHERE id = %s AND NOT (status <=> 'disponible'))", (plato_id,)))
+            consultas.actualizar_plato(conn, plato_id, nombre, descripcion, precio, categoria_id, es_vegetariano, tiempo)
+            siguiente_version(cursor, menu=True)
             conn.commit()
-            flash(f'Plato ID {plato_id} actualizado exitosamente.', 'success')
-        except Error as e:
-            flash(f'Error al editar plato: {e}', 'danger')
-        finally:
-            conn.close()
+        catalogo.invalidate()
+        flash(f'Plato ID {plato_id} actualizado exitosamente.', 'success')
+    except Error as e:
+        flash(f'Error al editar plato: {e}', 'danger')
             
     return redirect(url_for('admin_platos'))
 
-@app.route('/admin/platos/delete/<int:plato_id>', methods=['POST'])
+@rutas.route('/admin/platos/delete/<int:plato_id>', methods=['POST'])
 @require_role([Config.ROLES['ADMIN']])
 def delete_plato(plato_id):
     """Endpoint para eliminar (cambiar estado a 'inactivo') un plato existente."""
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            
+    try:
+        with get_db_connection() as conn, conn.cursor() as cursor:
             # Opción recomendada: Cambiar el estado a 'inactivo' o 'eliminado'
             # para mantener la integridad referencial en los pedidos anteriores.
-            query = "UPDATE platos SET status = 'agotado' WHERE id = %s"
-            cursor.execute(query, (plato_id,))
+            contadores.ajustar(cursor, platos_disponibles=(
+                "-(SELECT COUNT(*) FROM platos WHERE id = %s AND status = 'disponible')", (plato_id,)))
+            consultas.marcar_plato_agotado(conn, plato_id)
             
             # Obtener el nombre para el mensaje
-            cursor.execute("SELECT nombre FROM platos WHERE id = %s", (plato_id,))
-            nombre_plato = cursor.fetchone()
-            nombre_plato = nombre_plato[0] if nombre_plato else 'Plato Desconocido'
+            nombre_plato = consultas.nombre_plato(conn, plato_id) or 'Plato Desconocido'
             
+            siguiente_version(cursor, menu=True)
             conn.commit()
-            flash(f'Plato "{nombre_plato}" (ID: {plato_id}) marcado como inactivo.', 'success')
+        catalogo.invalidate()
+        flash(f'Plato "{nombre_plato}" (ID: {plato_id}) marcado como inactivo.', 'success')
             
-        except Error as e:
-            flash(f'Error al eliminar el plato: {e}', 'danger')
-        finally:
-            conn.close()
+    except Error as e:
+        flash(f'Error al eliminar el plato: {e}', 'danger')
             
     return redirect(url_for('admin_platos'))
 
-@app.route('/admin/menus', methods=['GET', 'POST'])
+@rutas.route('/admin/menus', methods=['GET', 'POST'])
 @require_role([Config.ROLES['ADMIN']])
 def admin_menus():
     """Vista y gestión para listar, crear y seleccionar Menú del Día."""
-    conn = get_db_connection()
-    
     if request.method == 'POST':
         if 'set_menu_del_dia' in request.form:
             # Lógica para seleccionar el Menú del Día
@@ -442,24 +792,26 @@ def admin_menus():
             precio_fijo = request.form.get('precio_fijo_dia')
             
             try:
-                cursor = conn.cursor()
-                # 1. Desactivar el menú anterior (opcional, si solo se quiere uno activo)
-                cursor.execute("UPDATE menu_del_dia_actual SET status = 'archivado' WHERE status = 'activo'")
-                
-                # 2. Crear o actualizar el menú del día actual
-                # Se asume que menu_id ya existe en la tabla principal (no implementado en esta versión)
-                query = """
-                INSERT INTO menu_del_dia_actual (fecha, precio_fijo, status)
-                VALUES (CURDATE(), %s, 'activo')
-                ON DUPLICATE KEY UPDATE 
-                    precio_fijo = %s, status = 'activo'
-                """
-                cursor.execute(query, (precio_fijo, precio_fijo))
-                
-                # Nota: En una versión completa, este POST crearía el menú y sus detalles. 
-                # Aquí simulamos que se está seleccionando un "paquete" predefinido.
-                
-                conn.commit()
+                with get_db_connection() as conn, conn.cursor() as cursor:
+                    # 1. Desactivar el menú anterior (opcional, si solo se quiere uno activo)
+                    cursor.execute("UPDATE menu_del_dia_actual SET status = 'archivado' WHERE status = 'activo'")
+                    
+                    # 2. Crear o actualizar el menú del día actual
+                    # Se asume que menu_id ya existe en la tabla principal (no implementado en esta versión)
+                    query = """
+                    INSERT INTO menu_del_dia_actual (fecha, precio_fijo, status)
+                    VALUES (CURDATE(), %s, 'activo')
+                    ON DUPLICATE KEY UPDATE 
+                        precio_fijo = %s, status = 'activo'
+                    """
+                    cursor.execute(query, (precio_fijo, precio_fijo))
+                    
+                    # Nota: En una versión completa, este POST crearía el menú y sus detalles. 
+                    # Aquí simulamos que se está seleccionando un "paquete" predefinido.
+                    
+                    siguiente_version(cursor, menu=True)
+                    conn.commit()
+                catalogo.invalidate()
                 flash('Menú del Día actualizado exitosamente.', 'success')
             except Error as e:
                 flash(f'Error al seleccionar el Menú del Día: {e}', 'danger')
@@ -468,65 +820,29 @@ def admin_menus():
         
         return redirect(url_for('admin_menus'))
     
-    # GET: Listar platos y menús
-    menus = []
-    platos_entrada = []
-    platos_segundo = []
-    platos_postre = []
+    # GET: platos disponibles por tiempo y menú del día vigente, desde el catálogo en memoria
+    platos_por_tiempo = {tiempo: [] for tiempo in TIEMPOS_MENU}
     menu_dia_actual = None
     
-    if conn:
-        cursor = conn.cursor(dictionary=True)
-        
-        # 1. Obtener todos los Platos activos por categoría para la creación de menús
-        cursor.execute("SELECT id, nombre, precio FROM platos WHERE status = 'disponible' AND categoria_id = (SELECT id FROM categorias_menu WHERE nombre='Entradas')")
-        platos_entrada = cursor.fetchall()
-        cursor.execute("SELECT id, nombre, precio FROM platos WHERE status = 'disponible' AND categoria_id = (SELECT id FROM categorias_menu WHERE nombre='Platos Principales')")
-        platos_segundo = cursor.fetchall()
-        cursor.execute("SELECT id, nombre, precio FROM platos WHERE status = 'disponible' AND categoria_id = (SELECT id FROM categorias_menu WHERE nombre='Postres' OR nombre='Bebidas')")
-        platos_postre = cursor.fetchall() # Usamos esto para Postre/Bebida simplificado
-        
-        # 2. Obtener el Menú del Día Actual
-        cursor.execute("""
-            SELECT 
-                md.id, md.fecha, md.precio_fijo, p.nombre AS plato_nombre, 
-                dmd.tipo_plato_dia, dmd.plato_id
-            FROM menu_del_dia_actual md
-            LEFT JOIN detalle_menu_dia dmd ON md.id = dmd.menu_dia_id
-            LEFT JOIN platos p ON dmd.plato_id = p.id
-            WHERE md.fecha = CURDATE() AND md.status = 'activo'
-        """)
-        menu_items = cursor.fetchall()
-        
-        if menu_items and menu_items[0]['id'] is not None:
-            menu_dia_actual = {
-                'id': menu_items[0]['id'],
-                'fecha': menu_items[0]['fecha'],
-                'precio_fijo': menu_items[0]['precio_fijo'],
-                'items': {}
-            }
-            for item in menu_items:
-                tipo = item.get('tipo_plato_dia', 'No Asignado')
-                if tipo not in menu_dia_actual['items']:
-                    menu_dia_actual['items'][tipo] = []
-                menu_dia_actual['items'][tipo].append(item['plato_nombre'])
-        
-        cursor.close()
-        conn.close()
+    try:
+        with get_db_connection() as conn:
+            _, menu_version = consultas.version_actual(conn)
+        carta = catalogo.get(menu_version)
+        platos_por_tiempo = carta.platos_por_tiempo
+        menu_dia_actual = carta.menu_del_dia
+    except Error as e:
+        flash(f'Error al cargar los menús: {e}', 'danger')
         
-    return render_template('admin_menu_del_dia.html', 
+    return render_template('admin_menu.html', 
                            title='Gestión de Menús',
-                           platos_entrada=platos_entrada,
-                           platos_segundo=platos_segundo,
-                           platos_postre=platos_postre,
+                           platos_por_tiempo=platos_por_tiempo,
                            menu_dia_actual=menu_dia_actual)
 
 
-@app.route('/admin/usuarios', methods=['GET', 'POST'])
+@rutas.route('/admin/usuarios', methods=['GET', 'POST'])
 @require_role([Config.ROLES['ADMIN']])
 def admin_usuarios():
     """Vista y gestión para listar y crear nuevos usuarios (Admin/Moza)."""
-    conn = get_db_connection()
     usuarios = []
     
     if request.method == 'POST':
@@ -539,45 +855,34 @@ def admin_usuarios():
         
         hashed_password = password # Usamos el password sin hash por la simulación simple
         
-        if conn:
-            try:
-                cursor = conn.cursor()
-                query = """
-                INSERT INTO usuarios (nombres, apellidos, email, password, rol, status)
-                VALUES (%s, %s, %s, %s, %s, 'activo')
-                """
-                cursor.execute(query, (nombres, apellidos, email, hashed_password, rol))
+        try:
+            with get_db_connection() as conn:
+                consultas.crear_usuario(conn, nombres, apellidos, email, hashed_password, rol)
                 conn.commit()
-                flash(f'Usuario "{nombres} {apellidos}" ({rol}) creado exitosamente.', 'success')
-            except Error as e:
-                flash(f'Error al crear usuario: {e}', 'danger')
-            finally:
-                conn.close()
-            return redirect(url_for('admin_usuarios'))
-        else:
-            flash('Error: No se pudo conectar a la base de datos para crear el usuario.', 'danger')
+            flash(f'Usuario "{nombres} {apellidos}" ({rol}) creado exitosamente.', 'success')
+        except Error as e:
+            flash(f'Error al crear usuario: {e}', 'danger')
+        return redirect(url_for('admin_usuarios'))
 
     
     # GET (Listar Usuarios)
-    if conn:
-        try:
-            cursor = conn.cursor(dictionary=True)
-            # Obtener todos los usuarios, excluyendo el rol 'cliente' por defecto
-            cursor.execute("""
-                SELECT id, nombres, apellidos, email, rol, status 
-                FROM usuarios 
-                WHERE rol IN (%s, %s, %s, %s) AND status != 'inactivo'
-                ORDER BY rol, apellidos
-                """, (Config.ROLES['ADMIN'], Config.ROLES['MOZA'], Config.ROLES['CLIENTE'], Config.ROLES['COCINA']))
-            usuarios = cursor.fetchall()
+    try:
+        with get_db_connection() as conn, conn.cursor(dictionary=True) as cursor:
+            # Obtener los usuarios activos paginados por (rol, apellidos, id)
+            usuarios = paginar(
+                cursor, "SELECT id, nombres, apellidos, email, rol, rol + 0 AS rol_orden, status FROM usuarios",
+                # rol es ENUM: se ordena y compara por su posición (rol + 0), no por el texto
+                [('rol + 0', 'rol_orden'), ('apellidos', 'apellidos'), ('id', 'id')],
+                limite=limite_desde(request.args), despues=request.args.get('despues'),
+                antes=request.args.get('antes'),
+                where=["rol IN (%s, %s, %s, %s)", "status != 'inactivo'"],
+                params=[Config.ROLES['ADMIN'], Config.ROLES['MOZA'], Config.ROLES['CLIENTE'], Config.ROLES['COCINA']])
             
-        except Error as e:
-            flash(f'Error al listar usuarios: {e}', 'danger')
-        finally:
-            conn.close()
+    except Error as e:
+        flash(f'Error al listar usuarios: {e}', 'danger')
             
     # Roles disponibles para crear y editar
-    roles_disponibles = [Config.ROLES['ADMIN'], Config.ROLES['MOZA']]
+    roles_disponibles = [Config.ROLES['ADMIN'], Config.ROLES['MOZA'], Config.ROLES['COCINA']]
     
     # Nota: En el HTML se usa 'system_users' para la lista.
     return render_template('admin_usuarios.html', 
@@ -586,7 +891,7 @@ def admin_usuarios():
                            roles_disponibles=roles_disponibles)
 
 
-@app.route('/admin/usuarios/update/<int:user_id>', methods=['POST'])
+@rutas.route('/admin/usuarios/update/<int:user_id>', methods=['POST'])
 @require_role([Config.ROLES['ADMIN']])
 def update_user(user_id):
     """Endpoint para editar los datos o rol de un usuario existente."""
@@ -596,137 +901,236 @@ def update_user(user_id):
     rol = request.form.get('rol')
     status = request.form.get('status')
     
-    conn = get_db_connection()
-    if conn:
-        try:
-            cursor = conn.cursor()
-            query = """
-            UPDATE usuarios SET 
-                nombres = %s, 
-                apellidos = %s, 
-                email = %s, 
-                rol = %s,
-                status = %s
-            WHERE id = %s
-            """
-            cursor.execute(query, (nombres, apellidos, email, rol, status, user_id))
+    try:
+        with get_db_connection() as conn:
+            actualizados = consultas.actualizar_usuario(conn, user_id, nombres, apellidos, email, rol, status)
             conn.commit()
             
-            if cursor.rowcount > 0:
+            if actualizados > 0:
                 flash(f'Usuario ID {user_id} ({nombres}) actualizado exitosamente.', 'success')
             else:
                 flash(f'No se encontraron cambios o el usuario ID {user_id} no existe.', 'warning')
-        except Error as e:
-            flash(f'Error al editar usuario: {e}', 'danger')
-        finally:
-            conn.close()
+    except Error as e:
+        flash(f'Error al editar usuario: {e}', 'danger')
             
     return redirect(url_for('admin_usuarios'))
 
 
-@app.route('/admin/usuarios/delete/<int:user_id>', methods=['POST'])
+@rutas.route('/admin/usuarios/delete/<int:user_id>', methods=['POST'])
 @require_role([Config.ROLES['ADMIN']])
 def delete_user(user_id):
     """Endpoint para desactivar (o "eliminar") un usuario."""
-    conn = get_db_connection()
-    
     if user_id == session.get('user_id'):
         flash('No puedes desactivar tu propia cuenta de administrador.', 'warning')
         return redirect(url_for('admin_usuarios'))
 
-    if conn:
-        try:
-            cursor = conn.cursor()
+    try:
+        with get_db_connection() as conn:
             # Generalmente, es mejor desactivar (status = 'inactivo') que borrar
-            query = "UPDATE usuarios SET status = 'inactivo' WHERE id = %s"
-            cursor.execute(query, (user_id,))
+            desactivados = consultas.desactivar_usuario(conn, user_id)
             conn.commit()
             
-            if cursor.rowcount > 0:
+            if desactivados > 0:
                 flash(f'Usuario ID {user_id} desactivado exitosamente.', 'success')
             else:
                 flash(f'Error: El usuario ID {user_id} no existe.', 'danger')
-        except Error as e:
-            flash(f'Error al desactivar usuario: {e}', 'danger')
-        finally:
-            conn.close()
-            
+    except Error as e:
+        flash(f'Error al desactivar usuario: {e}', 'danger')
+
     return redirect(url_for('admin_usuarios'))
 
+def _exportar_metricas():
+    series = {}
+    for clave, valor in db_pool.stats().items():
+        if clave in ('tamano', 'en_uso', 'ociosas'):
+            series[f'sumak_db_pool_{clave}'] = ('gauge', f'Pool de conexiones: {clave}.', valor)
+        else:
+            series[f'sumak_db_pool_{clave}_total'] = ('counter', f'Pool de conexiones: {clave}.', valor)
+    series['sumak_sse_clientes'] = ('gauge', 'Tablets conectadas a /moza/stream.', eventos.clientes)
+    series['sumak_cocina_pantallas'] = ('gauge', 'Pantallas conectadas a /cocina/stream.', eventos_cocina.clientes)
+    tickets = tiempos_ticket.stats()
+    series['sumak_cocina_tickets_total'] = ('counter', 'Pedidos con todos sus platos listos.', tickets['tickets'])
+    series['sumak_cocina_ticket_segundos_total'] = (
+        'counter', 'Suma de los tiempos de ticket (comanda -> último plato listo).', tickets['segundos'])
+    series['sumak_catalogo_version'] = ('gauge', 'Versión local del catálogo en memoria.', catalogo.version)
+    for clave, valor in salon.stats().items():
+        if clave in ('version', 'mesas', 'pedidos_abiertos'):
+            series[f'sumak_salon_{clave}'] = ('gauge', f'Estado del salón en memoria: {clave}.', valor)
+        else:
+            series[f'sumak_salon_{clave}_total'] = ('counter', f'Estado del salón en memoria: {clave}.', valor)
+    claves = claves_comanda.stats()
+    series['sumak_comandas_claves'] = ('gauge', 'Claves de idempotencia de comandas recordadas.', claves['entradas'])
+    series['sumak_comandas_repetidas_total'] = (
+        'counter', 'Reenvíos de comandas respondidos sin volver a escribir.', claves['aciertos'])
+    for clave, valor in reintentar.stats().items():
+        series[f'sumak_transacciones_{clave}_total'] = (
+            'counter', f'Transacciones abortadas por deadlock o espera de lock: {clave}.', valor)
+    cola = drenador.stats()
+    series['sumak_cola_formularios_pendientes'] = ('gauge', 'Formularios en la cola sin pasar a MySQL.', cola['pendientes'])
+    series['sumak_cola_formularios_antiguedad_segundos'] = (
+        'gauge', 'Antigüedad del formulario pendiente más viejo.', cola['antiguedad_segundos'])
+    for clave in ('procesadas', 'rechazadas', 'reintentos'):
+        series[f'sumak_cola_formularios_{clave}_total'] = ('counter', f'Cola de formularios: {clave}.', cola[clave])
+    for clave, valor in despachador.stats().items():
+        series[f'sumak_notificaciones_{clave}_total'] = ('counter', f'Correos salientes: {clave}.', valor)
+    for clave, valor in actualizador_reportes.stats().items():
+        series[f'sumak_reportes_rollup_{clave}_total'] = ('counter', f'Rollups de ventas: {clave}.', valor)
+    for fase, segundos in arranque.items():
+        series[f'sumak_arranque_{fase}_segundos'] = ('gauge', f'Duración de la fase de arranque: {fase}.', segundos)
+    for clave, valor in cache_fragmentos.stats().items():
+        if clave == 'entradas':
+            series['sumak_fragmentos_entradas'] = ('gauge', 'Fragmentos de plantilla en caché.', valor)
+        else:
+            series[f'sumak_fragmentos_{clave}_total'] = ('counter', f'Caché de fragmentos: {clave}.', valor)
+    for clave, valor in cache_paginas.stats().items():
+        if clave in ('entradas', 'bytes'):
+            series[f'sumak_cache_paginas_{clave}'] = ('gauge', f'Caché de páginas públicas: {clave}.', valor)
+        else:
+            series[f'sumak_cache_paginas_{clave}_total'] = ('counter', f'Caché de páginas públicas: {clave}.', valor)
+    return Response(metricas.exportar(series), mimetype='text/plain; version=0.0.4')
+
+@rutas.route('/admin/metrics')
+def admin_metrics():
+    """Métricas en formato Prometheus. Acepta sesión de admin o `Authorization: Bearer <METRICS_TOKEN>`."""
+    token = current_app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') == f'Bearer {token}':
+        return _exportar_metricas()
+    return require_role([Config.ROLES['ADMIN']])(_exportar_metricas)()
+
+
+def rango_reporte(args):
+    """Rango [desde, hasta] de la query string; por defecto los últimos 30 días."""
+    hasta = datetime.now().date()
+    desde = hasta - timedelta(days=29)
+    try:
+        if args.get('hasta'):
+            hasta = datetime.strptime(args['hasta'], '%Y-%m-%d').date()
+        if args.get('desde'):
+            desde = datetime.strptime(args['desde'], '%Y-%m-%d').date()
+    except ValueError:
+        pass
+    return min(desde, hasta), hasta
+
+def datos_reporte(desde, hasta):
+    """Lee el reporte de los rollups (al día hasta la última pasada de `actualizador_reportes`)."""
+    with get_db_connection() as conn, conn.cursor(dictionary=True) as cursor:
+        return reportes.consultar(cursor, desde, hasta)
+
+@rutas.route('/admin/reportes')
+@require_role([Config.ROLES['ADMIN']])
+def admin_reportes():
+    """Reporte de ventas: totales por día, platos más vendidos y desempeño por moza."""
+    desde, hasta = rango_reporte(request.args)
+    reporte = {'totales': {}, 'diario': [], 'items': [], 'mozas': []}
+    try:
+        reporte = datos_reporte(desde, hasta)
+    except Error as e:
+        flash(f'Error al cargar el reporte: {e}', 'danger')
+
+    return render_template('admin_reportes.html', title='Reportes de Ventas',
+                           reporte=reporte, desde=desde, hasta=hasta)
+
+@rutas.route('/admin/api/reportes')
+@require_role([Config.ROLES['ADMIN']])
+def admin_api_reportes():
+    """Variante JSON de /admin/reportes."""
+    desde, hasta = rango_reporte(request.args)
+    try:
+        reporte = datos_reporte(desde, hasta)
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+
+    for dia in reporte['diario']:
+        dia['fecha'] = dia['fecha'].isoformat()
+    return jsonify({'desde': desde.isoformat(), 'hasta': hasta.isoformat(), **reporte})
+
+@rutas.route('/admin/exportar/<recurso>.<formato>')
+@require_role([Config.ROLES['ADMIN']])
+def admin_exportar(recurso, formato):
+    """Descarga completa de reclamaciones, pedidos o reservas (CSV o JSON Lines), filtrable por fechas."""
+    if recurso not in exportacion.EXPORTACIONES or formato not in exportacion.FORMATOS:
+        return jsonify({'error': 'Exportación no disponible.'}), 404
+
+    rango = {}
+    for clave in ('desde', 'hasta'):
+        if request.args.get(clave):
+            try:
+                rango[clave] = datetime.strptime(request.args[clave], '%Y-%m-%d').date()
+            except ValueError:
+                return jsonify({'error': f'Fecha inválida en "{clave}" (formato AAAA-MM-DD).'}), 400
+
+    nombre = f"{recurso}_{datetime.now():%Y%m%d_%H%M%S}.{formato}"
+    return Response(
+        exportacion.generar(get_db_connection._get_current_object(), recurso, formato, **rango),
+        mimetype=exportacion.FORMATOS[formato],
+        headers={
+            'Content-Disposition': f'attachment; filename="{nombre}"',
+            'Cache-Control': 'no-store',
+            'X-Accel-Buffering': 'no',  # que nginx no acumule la descarga
+        },
+    )
+
+@rutas.command('drenar-cola')
+def drenar_cola_command():
+    """Pasa a MySQL los formularios pendientes de la cola (`flask --app app drenar-cola`)."""
+    procesadas = drenador.drenar()
+    pendientes, antiguedad = cola_formularios.estado()
+    print(f"{procesadas} formularios procesados; quedan {pendientes} (el más antiguo de hace {antiguedad:.0f} s).")
+
+@rutas.command('enviar-notificaciones')
+def enviar_notificaciones_command():
+    """Envía los correos pendientes de la bandeja de salida (`flask --app app enviar-notificaciones`)."""
+    if not despachador.activo:
+        print("SMTP_HOST no está definido: no se envía nada.")
+        return
+    enviadas = despachador.despachar()
+    if enviadas is None:
+        print("Otro proceso está enviando las notificaciones.")
+        return
+    print(f"{enviadas} notificaciones procesadas: {despachador.stats()}")
+
+@rutas.command('rollup-ventas')
+def rollup_ventas_command():
+    """Agrega los pedidos cerrados pendientes en las tablas de reportes (para cron)."""
+    with get_db_connection() as conn, conn.cursor(dictionary=True) as cursor:
+        procesados = reportes.procesar(conn, cursor)
+    print(f"Rollup de ventas: {procesados} pedidos agregados.")
+
 
 # -----------------------------------------------------
 # 3. RUTAS DE MOZA (Protegidas) 💁‍♀️
 # -----------------------------------------------------
 
-@app.route('/moza/comandas')
+def publicar_comanda(cambio):
+    """Tras el commit: aplica el cambio de mesa/pedido al salón de este proceso y lo envía a las tablets."""
+    salon.aplicar(cambio)
+    eventos.publicar('comanda', cambio)
+
+@rutas.route('/moza/comandas')
 @require_role([Config.ROLES['MOZA']])
 def moza_comandas():
-    conn = get_db_connection()
     mesas_con_estado = []
     menu_del_dia = None
     platos_a_la_carta = []
+    carta_clave = None
+    version = 0
 
-    if conn:
-        cursor = conn.cursor(dictionary=True)
-
-        # 1. Obtener TODAS las Mesas y la Comanda Activa si existe.
-        cursor.execute("""
-            SELECT 
-                m.id AS mesa_id, 
-                m.numero_mesa AS numero, 
-                m.status AS mesa_status, 
-                m.capacidad,
-                p.id AS pedido_id, 
-                p.total AS pedido_total, 
-                p.status AS pedido_status
-            FROM mesas m
-            LEFT JOIN pedidos p ON m.id = p.mesa_id 
-                AND p.status IN ('abierto', 'en_preparacion', 'listo_pago')
-            ORDER BY m.numero_mesa, p.fecha_pedido DESC
-        """)
-
-        # El HTML espera una lista de objetos 'mesa', por lo que usamos 'mesas_con_estado'
-        # que tiene el formato que el Jinja espera (`mesas=comandas_activas.values()` no funciona bien con todas las mesas)
-        mesas_con_estado = cursor.fetchall()
-
-        # 2. Obtener Platos a la Carta
-        cursor.execute("""
-            SELECT 
-                p.id, p.nombre, p.precio, c.nombre AS categoria, c.id AS categoria_id
-            FROM platos p
-            JOIN categorias_menu c ON p.categoria_id = c.id
-            WHERE p.status = 'disponible'
-            ORDER BY c.orden, p.nombre
-        """)
-        platos_a_la_carta = cursor.fetchall()
-
-        # 3. Obtener Menú del Día (Lógica existente)
-        cursor.execute("""
-            SELECT 
-                md.id AS menu_dia_id, md.precio_fijo, p.id AS plato_id, p.nombre AS plato_nombre, 
-                dmd.tipo_plato_dia
-            FROM menu_del_dia_actual md
-            JOIN detalle_menu_dia dmd ON md.id = dmd.menu_dia_id
-            JOIN platos p ON dmd.plato_id = p.id
-            WHERE md.fecha = CURDATE() AND md.status = 'activo'
-            ORDER BY dmd.tipo_plato_dia, dmd.orden
-        """)
-        menu_items = cursor.fetchall()
-
-        if menu_items:
-            menu_del_dia = {
-                'id': menu_items[0]['menu_dia_id'],
-                'precio_fijo': menu_items[0]['precio_fijo'],
-                'items': {}
-            }
-            for item in menu_items:
-                tipo = item['tipo_plato_dia']
-                if tipo not in menu_del_dia['items']:
-                    menu_del_dia['items'][tipo] = []
-                menu_del_dia['items'][tipo].append({'id': item['plato_id'], 'nombre': item['plato_nombre']})
-
-        cursor.close()
-        conn.close()
+    try:
+        with get_db_connection() as conn:
+            # 0. Versión de sincronización (antes de leer, para no perder cambios concurrentes)
+            version, menu_version = consultas.version_actual(conn)
+
+        # 1. Todas las mesas, una vez cada una, con su comanda activa si existe: desde el
+        # salón en memoria (solo consulta el delta si otro worker escribió desde la última vez)
+        mesas_con_estado = salon.mesas(version)
+
+        # 2 y 3. Platos a la Carta y Menú del Día desde el catálogo en memoria
+        carta = catalogo.get(menu_version)
+        platos_a_la_carta = carta.platos_disponibles
+        menu_del_dia = carta.menu_del_dia
+        carta_clave = carta.clave
+    except Error as e:
+        flash(f'Error al cargar las comandas: {e}', 'danger')
 
     # 4. Crear un diccionario de las mesas (mesa_id: mesa_data) 
     # para el bucle del modal 'Nueva Comanda' en Jinja
@@ -737,10 +1141,49 @@ def moza_comandas():
                            mesas=mesas_con_estado,  # <-- CAMBIO: Pasar la lista completa de mesas
                            comandas_activas=comandas_activas_dict,  # <-- Pasar el dict para el select del modal
                            menu_del_dia=menu_del_dia,
-                           platos_a_la_carta=platos_a_la_carta)
+                           platos_a_la_carta=platos_a_la_carta,
+                           carta_clave=carta_clave,
+                           version=version)
+
+
+@rutas.route('/moza/api/state')
+@require_role([Config.ROLES['MOZA']])
+def moza_api_state():
+    """
+    Sincronización incremental para las tablets: retorna solo las mesas, pedidos
+    y carta modificados después de `since`, o 304 si no hubo cambios.
+    """
+    since = request.args.get('since', 0, type=int)
+
+    try:
+        with get_db_connection() as conn, conn.cursor(dictionary=True) as cursor:
+            version, menu_version = consultas.version_actual(conn)
+            if since and version <= since:
+                return Response(status=304)
+            if since:
+                mesas, pedidos = cambios_desde(cursor, since)
+        if not since:
+            # Estado completo: el salón en memoria ya lo tiene
+            mesas, pedidos = salon.estado(version)
+
+        menu = None
+        if not since or menu_version > since:
+            carta = catalogo.get(menu_version)
+            menu = {'platos_a_la_carta': carta.platos_disponibles, 'menu_del_dia': carta.menu_del_dia}
+
+    except Error as e:
+        return jsonify({'error': f'Error al consultar la base de datos: {e}'}), 500
+
+    return jsonify({
+        'version': version,
+        'completo': not since,
+        'mesas': mesas,
+        'pedidos': pedidos,
+        'menu': menu,
+    })
 
 
-@app.route('/moza/comandas/new', methods=['POST'])
+@rutas.route('/moza/comandas/new', methods=['POST'])
 @require_role([Config.ROLES['MOZA']])
 def new_comanda(): 
     """Endpoint para registrar un nuevo pedido/comanda."""
@@ -758,141 +1201,82 @@ def new_comanda():
         flash('Datos de la comanda inválidos (formato JSON incorrecto).', 'danger')
         return redirect(url_for('moza_comandas'))
 
-    conn = get_db_connection()
-    if not conn:
-        flash('Error de conexión a la base de datos.', 'danger')
-        return redirect(url_for('moza_comandas'))
-
-    cursor = None
     try:
-        cursor = conn.cursor()
-        total_pedido = 0
-
-        # Diccionario para almacenar precios y evitar múltiples consultas redundantes (Caché simple)
-        item_prices = {}
-
-        # 1. Pre-cálculo de precios y total consultando la BD
-        for item in items:
-            item_id = item['id']
-            item_type = item['tipo'] # 'plato' o 'menu'
-            quantity = int(item.get('cantidad', 1))
-            
-            price = 0
-            cache_key = f"{item_type}_{item_id}"
-            
-            if cache_key in item_prices:
-                price = item_prices[cache_key]
-            else:
-                if item_type == 'plato':
-                    # Obtener precio del plato
-                    cursor.execute("SELECT precio FROM platos WHERE id = %s", (item_id,))
-                    result = cursor.fetchone()
-                    if result and result[0] is not None:
-                        price = float(result[0])
-                elif item_type == 'menu':
-                    # Obtener precio fijo del menú del día
-                    cursor.execute(
-                        "SELECT precio_fijo FROM menu_del_dia_actual WHERE id = %s AND status = 'activo'",
-                        (item_id,)
-                    )
-                    result = cursor.fetchone()
-                    if result and result[0] is not None:
-                        price = float(result[0])
-            
-            if price == 0:
-                # Si el precio es 0, el ítem no existe o está inactivo
-                raise ValueError(f"Precio no encontrado para ítem {item_type} ID {item_id}")
-            
-            item_prices[cache_key] = price
-            total_pedido += price * quantity
-
-        # 2. Insertar el Pedido (Comanda)
-        pedido_query = """
-        INSERT INTO pedidos (mesa_id, usuario_moza_id, fecha_pedido, total, status)
-        VALUES (%s, %s, NOW(), %s, 'abierto')
-        """
-        cursor.execute(pedido_query, (mesa_id, moza_id, total_pedido))
-        pedido_id = cursor.lastrowid # Obtener el ID del pedido recién insertado
-
-        # 3. Insertar los detalles del Pedido
-        detalle_query = """
-        INSERT INTO detalle_pedido (pedido_id, plato_id, menu_dia_id, cantidad, precio_unitario, status)
-        VALUES (%s, %s, %s, %s, %s, 'pendiente')
-        """
-        
-        for item in items:
-            item_id = item['id']
-            item_type = item['tipo']
-            quantity = int(item.get('cantidad', 1))
-            price = item_prices[f"{item_type}_{item_id}"]
-            
-            # Solo uno de los dos ID (plato_id o menu_dia_id) será diferente de NULL
-            plato_id = item_id if item_type == 'plato' else None
-            menu_id = item_id if item_type == 'menu' else None
-            
-            cursor.execute(detalle_query, (pedido_id, plato_id, menu_id, quantity, price))
-
-        # 4. Actualizar estado de la Mesa a 'ocupada' si es la primera comanda en esa mesa
-        cursor.execute("UPDATE mesas SET status = 'ocupada' WHERE id = %s AND status = 'disponible'", (mesa_id,))
-
-        conn.commit()
+        # Reenvío de una comanda ya registrada (Wi-Fi inestable, doble toque): se
+        # responde con el pedido original sin precios ni transacción
+        clave = normalizar_clave(request.form.get('clave'))
+        if clave:
+            repetida = claves_comanda.obtener(clave)
+            if repetida is None:
+                with get_db_connection() as conn:
+                    original = consultas.pedido_por_clave(conn, clave)
+                if original:
+                    repetida = (original['id'], original['mesa_id'], float(original['total']))
+                    claves_comanda.guardar(clave, repetida)
+            if repetida:
+                pedido_id, mesa_original, total_pedido = repetida
+                flash(f'La comanda #{pedido_id} de la Mesa {mesa_original} ya estaba registrada. '
+                      f'Total: S/ {total_pedido:.2f}', 'info')
+                return redirect(url_for('moza_comandas'))
+
+        lineas = normalizar_items(items, current_app.config['COMANDA_MAX_ITEMS'])
+        # Precios de la versión vigente del catálogo: un cambio hecho por el admin
+        # en otro worker se ve ya, no al vencer CATALOGO_MAX_AGE
+        with get_db_connection() as conn:
+            _, menu_version = consultas.version_actual(conn)
+        carta = catalogo.get(menu_version)
+
+        def registrar():
+            with get_db_connection() as conn, conn.cursor() as cursor:
+                ingesta = IngestaComanda(conn, cursor)
+                # 1. Precios desde el catálogo (un IN (...) por tipo solo para los faltantes)
+                item_prices = ingesta.resolver_precios(lineas, carta)
+                # 2. Pedido, detalles (INSERT multi-fila) y mesa ocupada
+                pedido_id, total_pedido = ingesta.registrar(mesa_id, moza_id, lineas, item_prices, clave)
+                ingesta.commit()
+                return ingesta, pedido_id, total_pedido
+
+        ingesta, pedido_id, total_pedido = reintentar(registrar)
+        if clave:
+            claves_comanda.guardar(clave, (pedido_id, int(mesa_id), total_pedido))
+        if ingesta.repetida:
+            flash(f'La comanda #{pedido_id} de la Mesa {mesa_id} ya estaba registrada. '
+                  f'Total: S/ {total_pedido:.2f}', 'info')
+            return redirect(url_for('moza_comandas'))
+
+        publicar_comanda({
+            'pedido_id': pedido_id, 'mesa_id': int(mesa_id), 'mesa_status': ingesta.mesa_status,
+            'pedido_status': 'abierto', 'pedido_total': total_pedido, 'version': ingesta.version,
+        })
+        eventos_cocina.publicar('comanda', {'pedido_id': pedido_id, 'mesa_id': int(mesa_id)})
         flash(f'Comanda #{pedido_id} abierta para la Mesa {mesa_id}. Total: S/ {total_pedido:.2f}', 'success')
-        return redirect(url_for('moza_comandas'))
+        response = redirect(url_for('moza_comandas'))
+        if current_app.debug:
+            response.headers['X-Comanda-Round-Trips'] = str(ingesta.round_trips)
+        return response
     
     except ValueError as ve:
-        if conn:
-            conn.rollback()
         flash(f'Error de datos: {ve}', 'danger')
     except Error as e:
-        if conn:
-            conn.rollback()
         flash(f'Error de base de datos al crear la comanda: {e}', 'danger')
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except Exception:
-                pass
-        if conn and conn.is_connected():
-            conn.close()
         
     flash('Ocurrió un error al procesar la comanda.', 'danger')
     return redirect(url_for('moza_comandas'))
 
-@app.route('/moza/comandas/detail/<int:pedido_id>', methods=['GET'])
+@rutas.route('/moza/comandas/detail/<int:pedido_id>', methods=['GET'])
 @require_role([Config.ROLES['MOZA']])
 def detail_comanda(pedido_id):
   """Retorna los detalles de un pedido específico en formato JSON para la Moza/UI."""
-  conn = get_db_connection()
-  if not conn:
-    return jsonify({'error': 'Error de conexión a la base de datos.'}), 500
-
   try:
-    cursor = conn.cursor(dictionary=True)
-    # 1. Obtener el encabezado del pedido
-    cursor.execute("SELECT id, mesa_id, total, status, fecha_pedido FROM pedidos WHERE id = %s", (pedido_id,))
-    pedido_header = cursor.fetchone()
-
-    if not pedido_header:
-      return jsonify({'error': f'Pedido ID {pedido_id} no encontrado.'}), 404
-
-    # 2. Obtener los detalles (ítems) del pedido
-    detalle_query = """
-    SELECT 
-      dp.id AS detalle_id, 
-      dp.cantidad, 
-      dp.precio_unitario,
-      dp.status AS item_status,
-      COALESCE(p.nombre, 'Menú del Día') AS nombre_item,
-      dp.plato_id,
-      dp.menu_dia_id
-    FROM detalle_pedido dp
-    LEFT JOIN platos p ON dp.plato_id = p.id
-    WHERE dp.pedido_id = %s
-    ORDER BY dp.detalle_id
-    """
-    cursor.execute(detalle_query, (pedido_id,))
-    pedido_details = cursor.fetchall()
+    with get_db_connection() as conn:
+      # 1. Obtener el encabezado del pedido
+      pedido_header = consultas.pedido(conn, pedido_id)
+
+      if not pedido_header:
+        return jsonify({'error': f'Pedido ID {pedido_id} no encontrado.'}), 404
+
+      # 2. Obtener los detalles (ítems) del pedido
+      pedido_details = consultas.items_pedido(conn, pedido_id)
     
     # Formatear la salida para JSON (Asegurar que los decimales sean float)
     response_data = {
@@ -914,86 +1298,92 @@ def detail_comanda(pedido_id):
   except Error as e:
     print(f"Error al obtener detalle de comanda: {e}")
     return jsonify({'error': f'Error al consultar la base de datos: {e}'}), 500
-  finally:
-    if conn and conn.is_connected():
-      conn.close()
 
 
-@app.route('/moza/comandas/close/<int:pedido_id>', methods=['POST'])
+@rutas.route('/moza/comandas/close/<int:pedido_id>', methods=['POST'])
 @require_role([Config.ROLES['MOZA']])
 def close_comanda(pedido_id):
   """Cierra un pedido/comanda (pago realizado) y libera la mesa."""
   moza_id = session.get('user_id')
-  
-  conn = get_db_connection()
-  if not conn:
-    flash('Error de conexión a la base de datos.', 'danger')
-    return redirect(url_for('moza_comandas'))
 
-  try:
-    cursor = conn.cursor()
-    
-    # 1. Obtener ID de la mesa, total y estado actual
-    cursor.execute("SELECT mesa_id, total, status FROM pedidos WHERE id = %s", (pedido_id,))
-    pedido_info = cursor.fetchone()
-    
-    if not pedido_info:
-      flash(f'Pedido ID {pedido_id} no encontrado.', 'danger')
-      return redirect(url_for('moza_comandas'))
+  def cerrar():
+    with get_db_connection() as conn, conn.cursor() as cursor:
+      # 1. Pedido y mesa bloqueados hasta el commit: si dos mozas cobran la misma
+      # comanda, la segunda espera aquí y la encuentra cerrada (ver transacciones.py)
+      pedido_info = consultas.bloquear_pedido(conn, pedido_id)
+      if not pedido_info or pedido_info['status'] not in ESTADOS_PEDIDO_ABIERTO:
+        return pedido_info, None, False
+
+      mesa_id = pedido_info['mesa_id']
+      # La mesa se libera solo si no le queda otra comanda abierta
+      libera = not consultas.otros_pedidos_abiertos(conn, mesa_id, pedido_id)
+
+      # 2. Cerrar el Pedido (Actualizar status y registrar cierre)
+      version = siguiente_version(cursor)
+      contadores.ajustar(
+        cursor,
+        pedidos_abiertos=-1,
+        mesas_ocupadas=-1 if libera and pedido_info['mesa_status'] == 'ocupada' else 0,
+        ingresos_hoy=pedido_info['total'],
+      )
+      consultas.cerrar_pedido(conn, pedido_id, moza_id, version)
+
+      # 3. Liberar la Mesa
+      if libera:
+        consultas.liberar_mesa(conn, mesa_id, version)
+
+      conn.commit()
+      return pedido_info, version, libera
 
-    mesa_id, total, status = pedido_info
-    
-    if status == 'cerrado':
-      flash(f'El pedido #{pedido_id} ya está cerrado.', 'warning')
-      return redirect(url_for('moza_comandas'))
-      
-    # 2. Cerrar el Pedido (Actualizar status y registrar cierre)
-    update_pedido_query = """
-    UPDATE pedidos 
-    SET status = 'cerrado', fecha_cierre = NOW(), usuario_cierre_id = %s
-    WHERE id = %s
-    """
-    cursor.execute(update_pedido_query, (moza_id, pedido_id))
-    
-    # 3. Liberar la Mesa
-    cursor.execute("UPDATE mesas SET status = 'disponible' WHERE id = %s", (mesa_id,))
-    
-    conn.commit()
-    flash(f'¡Pago recibido! Comanda #{pedido_id} cerrada. Mesa {mesa_id} liberada. Total: S/ {total:.2f}', 'success')
-    
+  try:
+    pedido_info, version, libera = reintentar(cerrar)
   except Error as e:
-    conn.rollback()
     flash(f'Error al cerrar la comanda: {e}', 'danger')
-  finally:
-    if conn and conn.is_connected():
-      conn.close()
-      
+    return redirect(url_for('moza_comandas'))
+
+  if not pedido_info:
+    flash(f'Pedido ID {pedido_id} no encontrado.', 'danger')
+  elif version is None:
+    flash(f'El pedido #{pedido_id} ya está cerrado.', 'warning')
+  else:
+    mesa_id, total = pedido_info['mesa_id'], pedido_info['total']
+    publicar_comanda({
+      'pedido_id': pedido_id, 'mesa_id': mesa_id,
+      'mesa_status': 'disponible' if libera else pedido_info['mesa_status'],
+      'pedido_status': 'cerrado', 'pedido_total': float(total), 'version': version,
+    })
+    mesa = f'Mesa {mesa_id} liberada' if libera else f'La mesa {mesa_id} sigue con otra comanda abierta'
+    flash(f'¡Pago recibido! Comanda #{pedido_id} cerrada. {mesa}. Total: S/ {total:.2f}', 'success')
+
   return redirect(url_for('moza_comandas'))
 
-@app.route('/libro-reclamaciones', methods=['GET'])
+@rutas.route('/moza/stream')
+@require_role([Config.ROLES['MOZA']])
+def moza_stream():
+    """Flujo SSE con los cambios de mesas y comandas; reemplaza la recarga completa de la página."""
+    return Response(eventos.stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # Evita que un proxy (nginx) acumule el flujo
+    })
+
+@rutas.route('/libro-reclamaciones', methods=['GET'])
+@pagina_publica
 def libro_reclamaciones_view():
     """Vista pública del Libro de Reclamaciones."""
     # Nota: Asegúrate de tener una plantilla 'base.html' para esta vista pública.
     return render_template('libro_reclamaciones.html', title='Libro de Reclamaciones')
 
 
-@app.route('/libro-reclamaciones', methods=['POST'])
+@rutas.route('/libro-reclamaciones', methods=['POST'])
 def registrar_reclamacion():
     """Procesa y guarda el reclamo o queja en la BD MySQL."""
     
-    conn = get_db_connection()
-    if conn is None:
-        flash('Error interno: No se pudo conectar a la base de datos.', 'danger')
-        return redirect(url_for('libro_reclamaciones_view'))
-        
-    cursor = conn.cursor()
-    
     try:
         # --- 1. CAPTURA Y VALIDACIÓN BÁSICA DE DATOS ---
         form_data = request.form
         
         # Generar código de reclamo único (R- + UUID corto)
-        codigo_reclamo = 'R-' + str(uuid.uuid4())[:8].upper()
+        codigo_reclamo = nuevo_codigo('R')
         
         # Determinar el tipo de documento
         num_doc = form_data.get('documento_identidad')
@@ -1004,52 +1394,180 @@ def registrar_reclamacion():
         # Esto es una simplificación.
         fecha_limite = (datetime.now() + timedelta(days=15)).strftime('%Y-%m-%d')
         
-        # --- 2. INSERCIÓN EN LA BASE DE DATOS ---
-        query = """
-        INSERT INTO reclamaciones (
-            codigo_reclamo, fecha_respuesta_limite, 
-            tipo_documento, numero_documento, nombre_consumidor, 
-            domicilio, telefono, email, 
-            tipo_bien, monto_reclamado, descripcion_bien, 
-            tipo_solicitud, detalle, pedido_consumidor
-        ) VALUES (
-            %s, %s, 
-            %s, %s, %s, 
-            %s, %s, %s, 
-            %s, %s, %s, 
-            %s, %s, %s
-        )
-        """
-        data = (
-            codigo_reclamo, fecha_limite,
-            tipo_doc, num_doc, form_data.get('nombre_consumidor'),
-            form_data.get('domicilio'), form_data.get('telefono'), form_data.get('email'),
-            form_data.get('tipo_bien'), float(form_data.get('monto_reclamado', 0.00)), form_data.get('descripcion_bien'),
-            form_data.get('tipo_solicitud'), form_data.get('detalle'), form_data.get('pedido_consumidor')
-        )
-
-        cursor.execute(query, data)
-        conn.commit()
+        # --- 2. ENCOLADO (el drenador lo inserta en MySQL) ---
+        cola_formularios.encolar('reclamacion', {
+            'codigo_reclamo': codigo_reclamo, 'fecha_respuesta_limite': fecha_limite,
+            'tipo_documento': tipo_doc, 'numero_documento': num_doc,
+            'nombre_consumidor': form_data.get('nombre_consumidor'),
+            'domicilio': form_data.get('domicilio'), 'telefono': form_data.get('telefono'),
+            'email': form_data.get('email'), 'tipo_bien': form_data.get('tipo_bien'),
+            'monto_reclamado': float(form_data.get('monto_reclamado', 0.00)),
+            'descripcion_bien': form_data.get('descripcion_bien'),
+            'tipo_solicitud': form_data.get('tipo_solicitud'), 'detalle': form_data.get('detalle'),
+            'pedido_consumidor': form_data.get('pedido_consumidor'),
+        })
+        drenador.avisar()
         
         # --- 3. RESPUESTA AL USUARIO ---
         flash(f'¡Reclamo **{codigo_reclamo}** registrado con éxito! Recibirás una respuesta antes del {fecha_limite}.', 'success')
         
-    except Error as e:
-        conn.rollback()
+    except OSError as e:
         flash(f'Error al procesar la reclamación. Intente de nuevo. Código de error: {e}', 'danger')
         
     except ValueError:
         flash('Error de formato en el monto reclamado.', 'danger')
-        
-    finally:
-        cursor.close()
-        conn.close()
 
     return redirect(url_for('libro_reclamaciones_view'))
 
+# -----------------------------------------------------
+# 4. RUTAS DE COCINA (Protegidas) 👨‍🍳
+# -----------------------------------------------------
+
+def estado_cocina():
+    """Cola de la cocina planificada (ver cocina.py) y tiempo de ticket promedio de hoy."""
+    with get_db_connection() as conn:
+        lineas = consultas.cola_cocina(conn)
+        tickets_hoy, promedio = consultas.ticket_promedio_hoy(conn)
+    ahora = datetime.now()
+    lineas = cocina.planificar(lineas, ahora, current_app.config['COCINA_TIEMPO_DEFECTO_MIN'])
+    return {
+        'lineas': cocina.serializar(lineas, ahora),
+        'tickets_hoy': tickets_hoy,
+        'ticket_promedio_segundos': promedio,
+    }
+
+@rutas.route('/cocina')
+@require_role([Config.ROLES['COCINA']])
+def cocina_pantalla():
+    """Pantalla de la cocina: las líneas por empezar, en preparación y listas para servir."""
+    estado = {'lineas': [], 'tickets_hoy': 0, 'ticket_promedio_segundos': None}
+    try:
+        estado = estado_cocina()
+    except Error as e:
+        flash(f'Error al cargar la cola de la cocina: {e}', 'danger')
+
+    return render_template('cocina.html', title='Cocina', estado=estado,
+                           refresco=current_app.config['COCINA_REFRESCO'])
+
+@rutas.route('/cocina/api/cola')
+@require_role([Config.ROLES['COCINA']])
+def cocina_api_cola():
+    """La cola recalculada; la pantalla la pide al recibir un evento y cada COCINA_REFRESCO segundos."""
+    try:
+        return jsonify(estado_cocina())
+    except Error as e:
+        return jsonify({'error': f'Error al consultar la base de datos: {e}'}), 500
+
+@rutas.route('/cocina/lineas/<int:detalle_id>/estado', methods=['POST'])
+@require_role([Config.ROLES['COCINA']])
+def cocina_cambiar_estado(detalle_id):
+    """Pasa una línea al estado `status` del formulario (ver cocina.TRANSICIONES)."""
+    hacia = request.form.get('status')
+
+    def cambiar():
+        with get_db_connection() as conn:
+            cambio = cocina.cambiar_estado(conn, detalle_id, hacia)
+            conn.commit()
+            return cambio
+
+    try:
+        cambio = reintentar(cambiar)
+    except cocina.TransicionInvalida as e:
+        return jsonify({'error': str(e)}), 409
+    except Error as e:
+        return jsonify({'error': f'Error al actualizar la línea: {e}'}), 500
+
+    if cambio['ticket_segundos'] is not None:
+        tiempos_ticket.observar(cambio['ticket_segundos'])
+    eventos_cocina.publicar('linea', {'detalle_id': detalle_id, 'pedido_id': cambio['pedido_id'], 'status': hacia})
+    if cambio['pedido_status']:
+        # Las tablets de las mozas ven el pedido en preparación o listo para cobrar
+        publicar_comanda({
+            'pedido_id': cambio['pedido_id'], 'mesa_id': cambio['mesa_id'],
+            'pedido_status': cambio['pedido_status'], 'pedido_total': float(cambio['total']),
+            'version': cambio['version'],
+        })
+    return jsonify({'detalle_id': detalle_id, 'status': hacia, 'pedido_status': cambio['pedido_status']})
+
+@rutas.route('/cocina/stream')
+@require_role([Config.ROLES['COCINA']])
+def cocina_stream():
+    """Flujo SSE de comandas nuevas y cambios de estado de las líneas."""
+    return Response(eventos_cocina.stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
 # -----------------------------------------------------
 # INICIO DE LA APLICACIÓN
 # -----------------------------------------------------
+# Segundos de cada fase del arranque de este proceso (también en /admin/metrics)
+arranque = {}
+
+def precargar(app):
+    """
+    Trabajo que no depende del proceso: compila todas las plantillas de `app`
+    (quedan en memoria y en la caché de bytecode) y carga el manifest de los
+    bundles. Con `preload_app` de gunicorn se hace una sola vez en el maestro y
+    los workers lo heredan al hacer fork. No abre conexiones ni hilos.
+    """
+    inicio = time.perf_counter()
+    for nombre in app.jinja_env.list_templates():
+        try:
+            app.jinja_env.get_template(nombre)
+        except Exception as e:
+            # La plantilla fallará igual al usarse; el arranque sigue con las demás
+            app.logger.warning("No se pudo compilar la plantilla %s: %s", nombre, e)
+    with app.test_request_context():
+        activo('public.css')
+    arranque['precarga'] = time.perf_counter() - inicio
+
+def calentar(app):
+    """
+    Trabajo de cada proceso, después del fork y antes de aceptar tráfico: arranca
+    los hilos de fondo de `app`, prepara las consultas de consultas.py en una conexión
+    del pool y carga el catálogo (menú y categorías por tiempo), la ocupación
+    de mesas y el estado del salón. Si MySQL no responde el worker arranca igual y todo se carga en
+    la primera petición que lo necesite.
+    """
+    inicio = time.perf_counter()
+    with app.app_context():
+        iniciar_hilos_de_fondo()
+        try:
+            with get_db_connection() as conn:
+                consultas.preparar(conn)
+                version, menu_version = consultas.version_actual(conn)
+            catalogo.get(menu_version)
+            motor_mesas.get(version)
+            salon.sincronizar(version)
+        except Error as e:
+            app.logger.warning("Calentamiento incompleto (pid %s), MySQL no responde: %s", os.getpid(), e)
+    arranque['calentamiento'] = time.perf_counter() - inicio
+
+def create_app(config=None, calentar_ahora=False):
+    """
+    Construye una app nueva: `Config` más las claves de `config` (un dict, p. ej. para
+    pruebas con otra base o COLA_DIR), sus propios servicios (pool, cachés, colas,
+    hilos de fondo), las rutas de `rutas` y las plantillas ya compiladas (`precargar`).
+    Con `calentar_ahora` también ejecuta `calentar()`; con gunicorn (ver
+    gunicorn.conf.py) el maestro construye la app y cada worker la calienta tras el fork.
+    """
+    inicio = time.perf_counter()
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if config:
+        app.config.from_mapping(config)
+    _crear_servicios(app)
+    rutas.aplicar(app)
+    arranque['construccion'] = time.perf_counter() - inicio
+
+    if not os.environ.get('SECRET_KEY'):
+        app.logger.warning("ADVERTENCIA: Usando clave secreta por defecto. Define SECRET_KEY en producción.")
+    precargar(app)
+    if calentar_ahora:
+        calentar(app)
+    return app
+
 if __name__ == '__main__':
     # Usar debug=True solo en desarrollo
-    app.run(debug=True)
\ No newline at end of file
+    create_app(calentar_ahora=True).run(debug=True)
\ No newline at end of file
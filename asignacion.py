@@ -0,0 +1,172 @@
+import bisect
+import threading
+import time
+from datetime import datetime
+
+from sincronizacion import ESTADOS_PEDIDO_ABIERTO
+
+
+class IndiceMesas:
+    """
+    Ocupación de cada mesa como intervalos [inicio, fin) disjuntos y ordenados.
+
+    Las reservas confirmadas ocupan `duracion` desde `reserva_at`; los pedidos
+    abiertos, desde `fecha_pedido` hasta al menos el momento de la carga. Los
+    intervalos que se solapan se fusionan, así que consultar si una mesa está
+    libre es una búsqueda binaria, y proponer mesa recorre las mesas de menor a
+    mayor capacidad empezando por la primera que alcanza.
+    """
+
+    def __init__(self, mesas, duracion, version=0):
+        self.version = version
+        self.generacion = 0
+        self.duracion = duracion
+        self.creado_en = time.monotonic()
+        self.mesas = sorted(mesas, key=lambda m: (m['capacidad'], m['numero_mesa']))
+        self._capacidades = [m['capacidad'] for m in self.mesas]
+        self._inicios = {m['id']: [] for m in self.mesas}
+        self._fines = {m['id']: [] for m in self.mesas}
+
+    def ocupar(self, mesa_id, inicio, fin=None):
+        """Marca la mesa como ocupada en [inicio, fin); ignora mesas fuera del índice (mantenimiento)."""
+        if mesa_id not in self._inicios:
+            return
+        fin = fin or inicio + self.duracion
+        inicios, fines = self._inicios[mesa_id], self._fines[mesa_id]
+
+        i = bisect.bisect_left(inicios, inicio)
+        if i > 0 and fines[i - 1] >= inicio:
+            i -= 1
+            inicio = inicios[i]
+        j = i
+        while j < len(inicios) and inicios[j] <= fin:
+            fin = max(fin, fines[j])
+            j += 1
+        inicios[i:j] = [inicio]
+        fines[i:j] = [fin]
+
+    def libre(self, mesa_id, inicio, fin=None):
+        if mesa_id not in self._inicios:
+            return False
+        fin = fin or inicio + self.duracion
+        inicios, fines = self._inicios[mesa_id], self._fines[mesa_id]
+        # El último intervalo que empieza antes de `fin` es el único que puede solaparse
+        i = bisect.bisect_left(inicios, fin)
+        return i == 0 or fines[i - 1] <= inicio
+
+    def candidatas(self, guests, inicio):
+        """Mesas libres con capacidad suficiente, de la más ajustada a la más grande."""
+        fin = inicio + self.duracion
+        desde = bisect.bisect_left(self._capacidades, guests)
+        return [mesa for mesa in self.mesas[desde:] if self.libre(mesa['id'], inicio, fin)]
+
+    def proponer(self, guests, inicio):
+        """Mejor ajuste: la mesa libre más pequeña que alcanza para `guests`; None si no hay."""
+        fin = inicio + self.duracion
+        for mesa in self.mesas[bisect.bisect_left(self._capacidades, guests):]:
+            if self.libre(mesa['id'], inicio, fin):
+                return mesa
+        return None
+
+
+def cargar_indice(cursor, duracion, version=0, ahora=None):
+    """Construye el índice con tres consultas. Requiere un cursor `dictionary=True`."""
+    ahora = ahora or datetime.now()
+
+    cursor.execute("""
+        SELECT id, numero_mesa, capacidad FROM mesas
+        WHERE status IS NULL OR status <> 'mantenimiento'
+    """)
+    indice = IndiceMesas(cursor.fetchall(), duracion, version)
+
+    # Solo importan las reservas que aún pueden solaparse con una hora futura
+    cursor.execute("""
+        SELECT mesa_asignada_id, reserva_at FROM reservas
+        WHERE status = 'confirmada' AND mesa_asignada_id IS NOT NULL AND reserva_at >= %s
+    """, (ahora - duracion,))
+    for row in cursor.fetchall():
+        indice.ocupar(row['mesa_asignada_id'], row['reserva_at'])
+
+    placeholders = ', '.join(['%s'] * len(ESTADOS_PEDIDO_ABIERTO))
+    cursor.execute(
+        f"SELECT mesa_id, fecha_pedido FROM pedidos WHERE status IN ({placeholders})",
+        ESTADOS_PEDIDO_ABIERTO,
+    )
+    for row in cursor.fetchall():
+        # Un pedido abierto ocupa la mesa hasta que se cierre; se estima su fin con la duración
+        indice.ocupar(row['mesa_id'], row['fecha_pedido'], max(row['fecha_pedido'] + duracion, ahora))
+
+    return indice
+
+
+def asignar_pendientes(cursor, indice, desde, hasta):
+    """
+    Propone mesa para cada reserva pendiente en [desde, hasta), ocupándola en el
+    índice a medida que asigna. Los grupos grandes van primero para que no se
+    queden sin las mesas grandes. Retorna (asignadas [(reserva_id, mesa)], sin_mesa [reserva_id]).
+    """
+    cursor.execute("""
+        SELECT id, guests, reserva_at FROM reservas
+        WHERE status = 'pendiente' AND reserva_at >= %s AND reserva_at < %s
+        ORDER BY guests DESC, reserva_at, id
+    """, (desde, hasta))
+
+    asignadas, sin_mesa = [], []
+    for reserva in cursor.fetchall():
+        mesa = indice.proponer(reserva['guests'], reserva['reserva_at'])
+        if mesa is None:
+            sin_mesa.append(reserva['id'])
+            continue
+        indice.ocupar(mesa['id'], reserva['reserva_at'])
+        asignadas.append((reserva['id'], mesa))
+    return asignadas, sin_mesa
+
+
+class MotorAsignacion:
+    """
+    Índice de ocupación compartido por las peticiones de lectura del proceso.
+
+    Igual que el catálogo: `invalidate()` tras una escritura local, recarga si
+    quien llama conoce una versión de sync_estado más nueva (pedido abierto o
+    cerrado en otro worker) o si el índice supera `max_age` (los pedidos abiertos
+    extienden su ocupación con el reloj). Las reservas no tocan sync_estado: una
+    confirmada en otro worker aparece aquí a más tardar a los `max_age` segundos.
+    Solo afecta a las mesas sugeridas; las escrituras validan contra un índice
+    cargado dentro de su propia transacción, no contra este.
+    """
+
+    def __init__(self, connection_factory, duracion, max_age=60.0):
+        self._connection_factory = connection_factory
+        self.duracion = duracion
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._generacion = 0
+        self._indice = None
+
+    def invalidate(self):
+        with self._lock:
+            self._generacion += 1
+
+    def get(self, version=0):
+        indice = self._indice
+        if self._is_fresh(indice, version):
+            return indice
+
+        with self._lock:
+            indice = self._indice
+            if self._is_fresh(indice, version):
+                return indice
+            generacion = self._generacion
+            with self._connection_factory() as conn, conn.cursor(dictionary=True) as cursor:
+                indice = cargar_indice(cursor, self.duracion, version)
+            indice.generacion = generacion
+            self._indice = indice
+            return indice
+
+    def _is_fresh(self, indice, version):
+        return (
+            indice is not None
+            and indice.generacion == self._generacion
+            and indice.version >= version
+            and time.monotonic() - indice.creado_en < self.max_age
+        )
@@ -0,0 +1,20 @@
+"""
+Pruebas de carga de hora punta para Sumak Mikuy.
+
+    python -m bench.seed --db sumak_mikuy_bench          # crea y puebla la BD local
+    python -m bench.run --db sumak_mikuy_bench --duracion 60 --mozas 8 --publico 20
+    python -m bench.run ... --guardar-baseline almuerzo  # guarda bench/baselines/almuerzo.json
+    python -m bench.run ... --comparar almuerzo          # falla si algún p95 empeora
+    python -m bench.consultas --db sumak_mikuy_bench     # SQL como texto vs prepared statements
+    python -m bench.arranque --db sumak_mikuy_bench      # arranque en frío de un worker, por fase
+    python -m bench.concurrencia --db sumak_mikuy_bench  # escrituras simultáneas sobre la misma fila
+
+Sin `--url` las sesiones corren en proceso con el cliente de pruebas de Flask
+(mide la app y MySQL, sin red); con `--url http://host:puerto` se ataca un
+servidor real (gunicorn) con `requests`.
+
+Cuenta como error toda respuesta fuera de 2xx/3xx y toda redirección que deja
+un mensaje flash de error (así responden los formularios cuando MySQL falla).
+La BD de bench.seed sale de script-database.sql, que debe coincidir con las
+tablas y columnas que escribe la app.
+"""
@@ -0,0 +1,102 @@
+"""
+Tiempo de arranque en frío de un worker, por fase, en procesos nuevos:
+
+    python -m bench.arranque --db sumak_mikuy_bench --repeticiones 5
+    python -m bench.arranque ... --sin-bytecode         # plantillas compiladas desde el fuente
+    python -m bench.arranque ... --guardar-baseline arranque
+    python -m bench.arranque ... --comparar arranque     # falla si alguna fase empeora
+
+Fases: `importar` (import app), `construccion`, `precarga` y `calentamiento` (ver create_app)
+y `primera_peticion` (GET / con el cliente de pruebas de Flask).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+from bench.run import BASELINES_DIR
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Se ejecuta en un intérprete nuevo; imprime los segundos de cada fase en JSON
+MEDICION = """
+import json, time
+inicio = time.perf_counter()
+import app as modulo
+importar = time.perf_counter() - inicio
+cliente = modulo.create_app(calentar_ahora=True).test_client()
+inicio = time.perf_counter()
+cliente.get('/').close()
+print(json.dumps({'importar': importar, **modulo.arranque,
+                  'primera_peticion': time.perf_counter() - inicio}))
+"""
+
+
+def medir(db, sin_bytecode):
+    entorno = dict(os.environ, MYSQL_DB=db, PAGINAS_CACHE_TTL='0')
+    with tempfile.TemporaryDirectory() as vacio:
+        if sin_bytecode:
+            entorno['JINJA_BYTECODE_DIR'] = vacio
+        salida = subprocess.run([sys.executable, '-c', MEDICION], cwd=RAIZ, env=entorno,
+                                capture_output=True, text=True, check=True).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default='sumak_mikuy_bench')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--sin-bytecode', action='store_true', help='Cada proceso con la caché de bytecode vacía')
+    parser.add_argument('--guardar-baseline', metavar='NOMBRE')
+    parser.add_argument('--comparar', metavar='NOMBRE', help='Baseline contra la que detectar regresiones')
+    parser.add_argument('--tolerancia', type=float, default=0.30, help='Empeoramiento admitido (0.30 = 30%%)')
+    args = parser.parse_args(argv)
+
+    muestras = [medir(args.db, args.sin_bytecode) for _ in range(args.repeticiones)]
+    fases = {}
+    for fase in muestras[0]:
+        valores = sorted(m[fase] * 1000 for m in muestras)
+        fases[fase] = {'mediana_ms': round(statistics.median(valores), 1), 'max_ms': round(valores[-1], 1)}
+    fases['total'] = {
+        clave: round(sum(f[clave] for f in fases.values()), 1) for clave in ('mediana_ms', 'max_ms')
+    }
+
+    print(f"{'Fase':<18} {'mediana ms':>11} {'máx ms':>9}")
+    for fase, r in fases.items():
+        print(f"{fase:<18} {r['mediana_ms']:>11} {r['max_ms']:>9}")
+
+    if args.guardar_baseline:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        ruta = os.path.join(BASELINES_DIR, f'{args.guardar_baseline}.json')
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump({
+                'fecha': datetime.now().isoformat(timespec='seconds'),
+                'parametros': {k: v for k, v in vars(args).items() if k not in ('guardar_baseline', 'comparar')},
+                'fases': fases,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"\nBaseline guardada en {ruta}")
+
+    if args.comparar:
+        with open(os.path.join(BASELINES_DIR, f'{args.comparar}.json'), encoding='utf-8') as f:
+            baseline = json.load(f)
+        regresiones = [
+            (fase, base['mediana_ms'], fases[fase]['mediana_ms'])
+            for fase, base in baseline['fases'].items()
+            if fase in fases and base['mediana_ms']
+            and fases[fase]['mediana_ms'] > base['mediana_ms'] * (1 + args.tolerancia)
+        ]
+        if regresiones:
+            print(f"\nRegresiones de arranque (tolerancia {args.tolerancia:.0%}):")
+            for fase, antes, ahora in regresiones:
+                print(f"  {fase}: {antes} ms -> {ahora} ms")
+            return 1
+        print(f"\nSin regresiones respecto a '{args.comparar}'.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""
+Prueba de estrés de escrituras concurrentes sobre la misma fila:
+
+    python -m bench.concurrencia --db sumak_mikuy_bench --hilos 8
+
+Tres escenarios, cada uno con `--hilos` sesiones que salen a la vez de una barrera:
+
+- `cerrar`: todas las mozas cobran la misma comanda;
+- `comandas`: todas abren una comanda en la misma mesa libre;
+- `reservas`: el admin confirma a la vez reservas pendientes de la misma hora
+  sobre la misma mesa.
+
+Se revisa la respuesta de cada POST (estado HTTP y mensajes de error, ver
+bench.escenarios) y después se verifica en MySQL que ninguna comanda se cerró
+dos veces, que la mesa no quedó con dos reservas confirmadas que se solapan y
+que los contadores del dashboard no derivaron (`contadores.reconciliar` no
+encuentra diferencias). Retorna 1 si algo no cuadra. Usa la BD de bench.seed,
+cuyo esquema (script-database.sql) debe ser el que espera app.py: con otro,
+las comandas fallan y la prueba lo informa en vez de medir.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+import contadores
+from bench.escenarios import ClienteLocal, login
+from bench.seed import conectar
+
+
+class PruebaInvalida(Exception):
+    """El escenario no pudo prepararse o sus peticiones no hicieron lo esperado."""
+
+
+def en_paralelo(app, credenciales, hilos, peticion):
+    """
+    Abre `hilos` sesiones, las suelta juntas y cada una hace `peticion(i)` -> (method, path, data).
+    Retorna por sesión True si la respuesta fue 2xx/3xx sin mensajes de error.
+    """
+    barrera = threading.Barrier(hilos)
+    exitos = [False] * hilos
+
+    def sesion(i):
+        cliente = ClienteLocal(app)
+        login(lambda _ruta, method, path, data=None: cliente.request(method, path, data)[:2], *credenciales)
+        method, path, data = peticion(i)
+        barrera.wait()
+        status, _, errores = cliente.request(method, path, data)
+        exitos[i] = 200 <= status < 400 and not errores
+
+    trabajadores = [threading.Thread(target=sesion, args=(i,)) for i in range(hilos)]
+    for hilo in trabajadores:
+        hilo.start()
+    for hilo in trabajadores:
+        hilo.join()
+    return exitos
+
+
+def mesa_libre(cursor, capacidad=1):
+    cursor.execute("""
+        SELECT m.id, m.capacidad FROM mesas m
+        WHERE m.status = 'disponible' AND m.capacidad >= %s
+          AND NOT EXISTS (SELECT 1 FROM pedidos p WHERE p.mesa_id = m.id
+                          AND p.status IN ('abierto', 'en_preparacion', 'listo_pago'))
+        ORDER BY m.id LIMIT 1
+    """, (capacidad,))
+    fila = cursor.fetchone()
+    if fila is None:
+        raise PruebaInvalida(f'no hay mesas libres para {capacidad} personas (¿BD sembrada con bench.seed?)')
+    return fila
+
+
+def items_comanda(cursor):
+    cursor.execute("SELECT id FROM platos WHERE status = 'disponible' ORDER BY id LIMIT 3")
+    items = [{'tipo': 'plato_carta', 'plato_id': plato_id, 'cantidad': 1} for (plato_id,) in cursor]
+    if not items:
+        raise PruebaInvalida('no hay platos disponibles para armar la comanda')
+    return json.dumps(items)
+
+
+def ultimo_pedido(cursor):
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM pedidos")
+    return cursor.fetchone()[0]
+
+
+def escenario_cerrar(app, conn, args, violaciones):
+    cursor = conn.cursor()
+    mesa_id, _ = mesa_libre(cursor)
+    items = items_comanda(cursor)
+    ultimo = ultimo_pedido(cursor)
+    conn.commit()
+    creada, = en_paralelo(app, args.moza, 1,
+                          lambda i: ('POST', '/moza/comandas/new', {'mesa_id': mesa_id, 'items': items}))
+    cursor.execute("SELECT MAX(id) FROM pedidos WHERE mesa_id = %s AND id > %s", (mesa_id, ultimo))
+    pedido_id = cursor.fetchone()[0]
+    conn.commit()
+    if not creada or pedido_id is None:
+        raise PruebaInvalida(f'no se pudo abrir la comanda de prueba en la mesa {mesa_id}')
+
+    exitos = en_paralelo(app, args.moza, args.hilos, lambda i: ('POST', f'/moza/comandas/close/{pedido_id}', None))
+
+    cursor.execute("SELECT p.status, m.status FROM pedidos p JOIN mesas m ON m.id = p.mesa_id WHERE p.id = %s",
+                   (pedido_id,))
+    fila = cursor.fetchone()
+    conn.commit()
+    if fila is None:
+        raise PruebaInvalida(f'la comanda #{pedido_id} desapareció')
+    pedido_status, mesa_status = fila
+    print(f"cerrar: comanda #{pedido_id} {pedido_status}, mesa {mesa_id} {mesa_status}, "
+          f"{sum(exitos)}/{args.hilos} respuestas sin error")
+    if pedido_status != 'cerrado' or mesa_status != 'disponible':
+        violaciones.append(f'cerrar: la comanda #{pedido_id} quedó {pedido_status} y la mesa {mesa_status}')
+    # Cobrar una comanda ya cerrada es un aviso, no un error
+    if not all(exitos):
+        violaciones.append(f'cerrar: {args.hilos - sum(exitos)} cobros respondieron con error')
+
+
+def escenario_comandas(app, conn, args, violaciones):
+    cursor = conn.cursor()
+    mesa_id, _ = mesa_libre(cursor)
+    items = items_comanda(cursor)
+    ultimo = ultimo_pedido(cursor)
+    conn.commit()
+
+    exitos = en_paralelo(app, args.moza, args.hilos,
+                         lambda i: ('POST', '/moza/comandas/new', {'mesa_id': mesa_id, 'items': items}))
+
+    cursor.execute("SELECT COUNT(*) FROM pedidos WHERE mesa_id = %s AND id > %s", (mesa_id, ultimo))
+    abiertas = cursor.fetchone()[0]
+    cursor.execute("SELECT status FROM mesas WHERE id = %s", (mesa_id,))
+    mesa_status, = cursor.fetchone()
+    conn.commit()
+    if not any(exitos):
+        raise PruebaInvalida(f'ninguna de las {args.hilos} comandas se pudo abrir en la mesa {mesa_id}')
+    print(f"comandas: {abiertas}/{args.hilos} abiertas en la mesa {mesa_id}, que quedó {mesa_status}, "
+          f"{sum(exitos)}/{args.hilos} respuestas sin error")
+    if abiertas != args.hilos or mesa_status != 'ocupada':
+        violaciones.append(f'comandas: {abiertas} de {args.hilos} registradas, mesa {mesa_status}')
+    if sum(exitos) != abiertas:
+        violaciones.append(f'comandas: {sum(exitos)} respuestas sin error para {abiertas} comandas registradas')
+
+
+def escenario_reservas(app, conn, args, violaciones):
+    cursor = conn.cursor()
+    mesa_id, capacidad = mesa_libre(cursor, capacidad=2)
+    # Lejos de los datos sembrados para que la mesa esté libre a esa hora
+    hora = (datetime.now() + timedelta(days=400)).replace(hour=20, minute=0, second=0, microsecond=0)
+    reservas = []
+    for i in range(args.hilos):
+        cursor.execute(
+            "INSERT INTO reservas (name, email, guests, reserva_at, status) VALUES (%s, %s, %s, %s, 'pendiente')",
+            (f'Estrés {i}', 'estres@bench.local', capacidad, hora + timedelta(minutes=15 * (i % 3))),
+        )
+        reservas.append(cursor.lastrowid)
+    conn.commit()
+
+    exitos = en_paralelo(app, args.admin, args.hilos, lambda i: (
+        'POST', f'/admin/reservas/update/{reservas[i]}', {'status': 'confirmada', 'mesa_id': mesa_id}))
+
+    cursor.execute(
+        f"SELECT COUNT(*) FROM reservas WHERE id IN ({', '.join(['%s'] * len(reservas))}) AND status = 'confirmada'",
+        reservas,
+    )
+    confirmadas = cursor.fetchone()[0]
+    conn.commit()
+    print(f"reservas: {confirmadas}/{args.hilos} confirmadas sobre la mesa {mesa_id}, "
+          f"{sum(exitos)}/{args.hilos} respuestas sin error")
+    if confirmadas != 1:
+        violaciones.append(f'reservas: {confirmadas} reservas solapadas confirmadas en la mesa {mesa_id}')
+    # Las demás deben recibir "la mesa no está libre", no un éxito
+    if sum(exitos) != confirmadas:
+        violaciones.append(f'reservas: {sum(exitos)} respuestas sin error para {confirmadas} confirmadas')
+
+
+ESCENARIOS = {
+    'cerrar': escenario_cerrar,
+    'comandas': escenario_comandas,
+    'reservas': escenario_reservas,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default='sumak_mikuy_bench')
+    parser.add_argument('--hilos', type=int, default=8, help='Sesiones que escriben a la vez')
+    parser.add_argument('--escenario', choices=list(ESCENARIOS), action='append',
+                        help='Repetible; por defecto todos')
+    parser.add_argument('--moza', nargs=2, default=('moza@bench.local', 'bench'), metavar=('EMAIL', 'PASSWORD'))
+    parser.add_argument('--admin', nargs=2, default=('admin@bench.local', 'bench'), metavar=('EMAIL', 'PASSWORD'))
+    args = parser.parse_args(argv)
+
+    os.environ['MYSQL_DB'] = args.db
+    import app as modulo
+    app = modulo.create_app(calentar_ahora=True)
+
+    conn = conectar(args.db)
+    cursor = conn.cursor()
+    # Punto de partida sin deriva: lo que difiera al final lo causó la prueba
+    contadores.reconciliar(cursor)
+    conn.commit()
+
+    violaciones = []
+    for nombre in args.escenario or ESCENARIOS:
+        try:
+            ESCENARIOS[nombre](app, conn, args, violaciones)
+        except PruebaInvalida as e:
+            conn.rollback()
+            print(f"{nombre}: no se pudo ejecutar: {e}")
+            violaciones.append(f'{nombre}: {e}')
+
+    deriva = contadores.reconciliar(cursor)
+    conn.commit()
+    conn.close()
+    for nombre, (antes, despues) in deriva.items():
+        violaciones.append(f'contador {nombre}: {antes} en la tabla, {despues} según las tablas base')
+
+    print(f"reintentos: {app.extensions['sumak']['reintentar'].stats()}")
+    if violaciones:
+        print("\nViolaciones:")
+        for violacion in violaciones:
+            print(f"  {violacion}")
+        return 1
+    print("\nSin violaciones.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Microbenchmark de la capa de consultas: cada sentencia de lectura de consultas.py
+ejecutada como texto (cursor normal) y como prepared statement, sin Flask.
+
+    python -m bench.consultas --db sumak_mikuy_bench --repeticiones 2000
+"""
+import argparse
+import time
+
+import consultas
+from bench.seed import conectar
+
+
+def parametros(cursor):
+    """Parámetros reales de la BD para las sentencias de lectura."""
+    cursor.execute("SELECT MIN(id) FROM pedidos")
+    pedido_id = cursor.fetchone()[0]
+    cursor.execute("SELECT MIN(id) FROM reservas")
+    reserva_id = cursor.fetchone()[0]
+    cursor.execute("SELECT MIN(id) FROM platos")
+    plato_id = cursor.fetchone()[0]
+    cursor.execute("SELECT email FROM usuarios WHERE rol = 'moza' LIMIT 1")
+    email = cursor.fetchone()[0]
+    return {
+        'usuario_para_login': (email, 'admin', 'moza', 'cocina'),
+        'categorias': (),
+        'nombre_plato': (plato_id,),
+        'version_actual': (),
+        'pedido': (pedido_id,),
+        'items_pedido': (pedido_id,),
+        'bloquear_reserva': (reserva_id,),
+        'cola_cocina': (),
+        'avance_pedido': (pedido_id,),
+        'ticket_promedio_hoy': (),
+    }
+
+
+def medir(ejecutar, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        ejecutar()
+    return (time.perf_counter() - inicio) / repeticiones * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default='sumak_mikuy_bench')
+    parser.add_argument('--repeticiones', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    conn = conectar(args.db)
+    try:
+        with conn.cursor() as cursor:
+            casos = parametros(cursor)
+
+        print(f"{'Sentencia':<26} {'texto µs':>10} {'preparada µs':>13} {'mejora':>7}")
+        for nombre, params in casos.items():
+            sql = consultas.SENTENCIAS[nombre]
+
+            def texto():
+                with conn.cursor(dictionary=True) as cursor:
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+
+            consultas.filas(conn, nombre, params)  # La preparación no entra en la medición
+            t_texto = medir(texto, args.repeticiones)
+            t_preparada = medir(lambda: consultas.filas(conn, nombre, params), args.repeticiones)
+            print(f"{nombre:<26} {t_texto:>10.1f} {t_preparada:>13.1f} {t_texto / t_preparada:>6.2f}x")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
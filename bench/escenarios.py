@@ -0,0 +1,169 @@
+"""Sesiones guionizadas de hora punta: mozas operando comandas y tráfico público."""
+import json
+from datetime import datetime, timedelta
+
+from flask import Flask
+from itsdangerous import BadSignature
+
+from config import Config
+
+ESTADOS_ABIERTOS = ('abierto', 'en_preparacion', 'listo_pago')
+
+
+class MensajesDeError:
+    """
+    Las rutas de formularios responden 302 también cuando fallan: el error va en
+    un mensaje flash 'danger' dentro de la cookie de sesión. Esto cuenta los que
+    agrega cada respuesta que reescribe la cookie.
+    """
+
+    def __init__(self, flask_app):
+        self.nombre_cookie = flask_app.config['SESSION_COOKIE_NAME']
+        self._serializador = flask_app.session_interface.get_signing_serializer(flask_app)
+        self._anteriores = 0
+
+    def nuevos(self, cookie):
+        """Errores agregados por la respuesta que fijó la cookie con valor `cookie`."""
+        try:
+            sesion = self._serializador.loads(cookie) if cookie else {}
+        except BadSignature:
+            return 0  # Otra SECRET_KEY: no se puede saber
+        actuales = sum(1 for categoria, _ in sesion.get('_flashes', ()) if categoria == 'danger')
+        nuevos = max(0, actuales - self._anteriores)
+        self._anteriores = actuales
+        return nuevos
+
+
+class ClienteLocal:
+    """Ejecuta las peticiones en proceso con el cliente de pruebas de Flask."""
+
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+        self.errores = MensajesDeError(flask_app)
+
+    def request(self, method, path, data=None):
+        """(status, JSON o None, mensajes de error que dejó la respuesta)."""
+        response = self.client.open(path, method=method, data=data, follow_redirects=False)
+        try:
+            errores = 0
+            if any(cabecera.startswith(self.errores.nombre_cookie + '=')
+                   for cabecera in response.headers.getlist('Set-Cookie')):
+                cookie = self.client.get_cookie(self.errores.nombre_cookie)
+                errores = self.errores.nuevos(cookie.value if cookie else None)
+            return response.status_code, response.get_json(silent=True), errores
+        finally:
+            response.close()
+
+
+class ClienteHTTP:
+    """Ejecuta las peticiones contra un servidor real (con la SECRET_KEY de este entorno)."""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        app = Flask(__name__)
+        app.secret_key = Config.SECRET_KEY
+        self.errores = MensajesDeError(app)
+
+    def request(self, method, path, data=None):
+        response = self.session.request(method, self.base_url + path, data=data, allow_redirects=False, timeout=30)
+        body = None
+        if response.headers.get('Content-Type', '').startswith('application/json'):
+            body = response.json()
+        errores = 0
+        if self.errores.nombre_cookie in response.cookies:
+            errores = self.errores.nuevos(response.cookies[self.errores.nombre_cookie])
+        return response.status_code, body, errores
+
+
+class EstadoMoza:
+    """Lo que la tablet de una moza sabe del salón (alimentado por /moza/api/state)."""
+
+    def __init__(self):
+        self.version = 0
+        self.mesas = {}
+        self.pedidos_abiertos = {}
+        self.platos = []
+        self.menu_id = None
+
+    def aplicar(self, estado):
+        for mesa in estado['mesas']:
+            self.mesas[mesa['mesa_id']] = mesa
+        for pedido in estado['pedidos']:
+            if pedido['pedido_status'] in ESTADOS_ABIERTOS:
+                self.pedidos_abiertos[pedido['pedido_id']] = pedido
+            else:
+                self.pedidos_abiertos.pop(pedido['pedido_id'], None)
+        if estado.get('menu'):
+            self.platos = [plato['id'] for plato in estado['menu']['platos_a_la_carta']]
+            menu_del_dia = estado['menu']['menu_del_dia']
+            self.menu_id = menu_del_dia['id'] if menu_del_dia else None
+        self.version = estado['version']
+
+    def mesas_libres(self):
+        ocupadas = {pedido['mesa_id'] for pedido in self.pedidos_abiertos.values()}
+        return [mesa_id for mesa_id, mesa in self.mesas.items()
+                if mesa['mesa_status'] == 'disponible' and mesa_id not in ocupadas]
+
+
+def login(medir, email, password):
+    status, _ = medir('POST /login', 'POST', '/login', {'email': email, 'password': password})
+    return status == 302
+
+
+def sesion_moza(medir, rnd, estado):
+    """Una vuelta de la moza: refresca la pantalla, sincroniza y abre o cierra comandas."""
+    medir('GET /moza/comandas', 'GET', '/moza/comandas')
+
+    status, cuerpo = medir('GET /moza/api/state', 'GET', f'/moza/api/state?since={estado.version}')
+    if status == 200 and cuerpo:
+        estado.aplicar(cuerpo)
+
+    libres = estado.mesas_libres()
+    if libres and estado.platos and rnd.random() < 0.35:
+        items = [
+            {'tipo': 'plato_carta', 'plato_id': plato_id, 'cantidad': rnd.randint(1, 3)}
+            for plato_id in rnd.sample(estado.platos, k=min(len(estado.platos), rnd.randint(2, 12)))
+        ]
+        if estado.menu_id and rnd.random() < 0.5:
+            items.append({'tipo': 'menu_dia', 'menu_id': estado.menu_id, 'cantidad': rnd.randint(1, 4)})
+        medir('POST /moza/comandas/new', 'POST', '/moza/comandas/new',
+              {'mesa_id': rnd.choice(libres), 'items': json.dumps(items)})
+    elif estado.pedidos_abiertos and rnd.random() < 0.30:
+        pedido_id = rnd.choice(list(estado.pedidos_abiertos))
+        medir('POST /moza/comandas/close/<id>', 'POST', f'/moza/comandas/close/{pedido_id}')
+
+
+def sesion_publica(medir, rnd, _estado=None):
+    """Un visitante anónimo: portada, reservas y, a veces, el libro de reclamaciones."""
+    medir('GET /', 'GET', '/')
+    medir('GET /reservas', 'GET', '/reservas')
+
+    if rnd.random() < 0.3:
+        reserva_at = datetime.now() + timedelta(days=rnd.randint(0, 30), minutes=30 * rnd.randint(0, 20))
+        medir('POST /reservas', 'POST', '/reservas', {
+            'name': f'Visitante {rnd.randint(1, 10**6)}',
+            'email': 'visitante@bench.local',
+            'guests': rnd.randint(1, 8),
+            'date': reserva_at.strftime('%Y-%m-%d'),
+            'time': reserva_at.strftime('%H:%M'),
+            'notes': '',
+        })
+
+    if rnd.random() < 0.2:
+        medir('GET /libro-reclamaciones', 'GET', '/libro-reclamaciones')
+        if rnd.random() < 0.3:
+            medir('POST /libro-reclamaciones', 'POST', '/libro-reclamaciones', {
+                'documento_identidad': f'{rnd.randint(10**7, 10**8 - 1)}',
+                'nombre_consumidor': 'Consumidor Bench',
+                'domicilio': 'Av. Siempre Viva 123',
+                'telefono': '999999999',
+                'email': 'consumidor@bench.local',
+                'tipo_bien': rnd.choice(['producto', 'servicio']),
+                'monto_reclamado': f'{rnd.uniform(0, 200):.2f}',
+                'descripcion_bien': 'Plato del día',
+                'tipo_solicitud': rnd.choice(['reclamo', 'queja']),
+                'detalle': 'Detalle de prueba de carga',
+                'pedido_consumidor': 'Pedido de prueba de carga',
+            })
@@ -0,0 +1,161 @@
+"""Reproduce sesiones de hora punta y reporta p50/p95/p99 y peticiones por segundo por ruta."""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+from bench.escenarios import ClienteHTTP, ClienteLocal, EstadoMoza, login, sesion_moza, sesion_publica
+
+BASELINES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+def percentil(valores_ordenados, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not valores_ordenados:
+        return 0.0
+    k = max(0, min(len(valores_ordenados) - 1, math.ceil(p / 100 * len(valores_ordenados)) - 1))
+    return valores_ordenados[k]
+
+
+class Registro:
+    """Muestras (ruta, segundos, error) de un usuario virtual; sin bloqueos entre hilos."""
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.muestras = []
+
+    def medir(self, ruta, method, path, data=None):
+        inicio = time.perf_counter()
+        status, cuerpo, errores = self.cliente.request(method, path, data)
+        # Error: cualquier respuesta fuera de 2xx/3xx o una redirección con mensaje de error
+        error = not 200 <= status < 400 or errores > 0
+        self.muestras.append((ruta, time.perf_counter() - inicio, error))
+        return status, cuerpo
+
+
+def usuario_virtual(crear_cliente, sesion, credenciales, fin, seed, registros):
+    rnd = random.Random(seed)
+    registro = Registro(crear_cliente())
+    registros.append(registro)
+    estado = EstadoMoza() if credenciales else None
+    if credenciales and not login(registro.medir, *credenciales):
+        return
+    while time.monotonic() < fin:
+        sesion(registro.medir, rnd, estado)
+
+
+def resumir(registros, duracion):
+    por_ruta = {}
+    for registro in registros:
+        for ruta, segundos, error in registro.muestras:
+            por_ruta.setdefault(ruta, []).append((segundos, error))
+
+    resumen = {}
+    for ruta, muestras in sorted(por_ruta.items()):
+        latencias = sorted(segundos * 1000 for segundos, _ in muestras)
+        resumen[ruta] = {
+            'n': len(muestras),
+            'errores': sum(1 for _, error in muestras if error),
+            'rps': round(len(muestras) / duracion, 2),
+            'p50_ms': round(percentil(latencias, 50), 2),
+            'p95_ms': round(percentil(latencias, 95), 2),
+            'p99_ms': round(percentil(latencias, 99), 2),
+        }
+    return resumen
+
+
+def imprimir(resumen):
+    print(f"{'Ruta':<34} {'n':>7} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for ruta, r in resumen.items():
+        print(f"{ruta:<34} {r['n']:>7} {r['errores']:>5} {r['rps']:>8} "
+              f"{r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9}")
+
+
+def comparar(resumen, baseline, tolerancia):
+    """Retorna las rutas cuyo p95 empeoró más que `tolerancia` (fracción) respecto a la baseline."""
+    regresiones = []
+    for ruta, base in baseline['rutas'].items():
+        actual = resumen.get(ruta)
+        if actual is None or not base['p95_ms']:
+            continue
+        limite = base['p95_ms'] * (1 + tolerancia)
+        if actual['p95_ms'] > limite:
+            regresiones.append((ruta, base['p95_ms'], actual['p95_ms']))
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--url', help='Servidor a atacar; sin él se usa la app en proceso')
+    parser.add_argument('--db', default='sumak_mikuy_bench', help='BD para la app en proceso')
+    parser.add_argument('--duracion', type=float, default=30.0, help='Segundos de carga')
+    parser.add_argument('--mozas', type=int, default=6, help='Tablets de mozas concurrentes')
+    parser.add_argument('--publico', type=int, default=12, help='Visitantes anónimos concurrentes')
+    parser.add_argument('--email-moza', default='moza@bench.local')
+    parser.add_argument('--password-moza', default='bench')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--guardar-baseline', metavar='NOMBRE')
+    parser.add_argument('--comparar', metavar='NOMBRE', help='Baseline contra la que detectar regresiones')
+    parser.add_argument('--tolerancia', type=float, default=0.20, help='Empeoramiento de p95 admitido (0.20 = 20%%)')
+    args = parser.parse_args(argv)
+
+    if args.url:
+        crear_cliente = lambda: ClienteHTTP(args.url)
+    else:
+        os.environ['MYSQL_DB'] = args.db
+        from app import create_app
+        app = create_app(calentar_ahora=True)
+        crear_cliente = lambda: ClienteLocal(app)
+
+    fin = time.monotonic() + args.duracion
+    registros = []
+    hilos = []
+    credenciales = (args.email_moza, args.password_moza)
+    for i in range(args.mozas):
+        hilos.append(threading.Thread(
+            target=usuario_virtual,
+            args=(crear_cliente, sesion_moza, credenciales, fin, args.seed * 1000 + i, registros)))
+    for i in range(args.publico):
+        hilos.append(threading.Thread(
+            target=usuario_virtual,
+            args=(crear_cliente, sesion_publica, None, fin, args.seed * 1000 + 500 + i, registros)))
+
+    inicio = time.monotonic()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    resumen = resumir(registros, time.monotonic() - inicio)
+    imprimir(resumen)
+
+    if args.guardar_baseline:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        ruta = os.path.join(BASELINES_DIR, f'{args.guardar_baseline}.json')
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump({
+                'fecha': datetime.now().isoformat(timespec='seconds'),
+                'parametros': {k: v for k, v in vars(args).items() if k not in ('guardar_baseline', 'comparar')},
+                'rutas': resumen,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"\nBaseline guardada en {ruta}")
+
+    if args.comparar:
+        with open(os.path.join(BASELINES_DIR, f'{args.comparar}.json'), encoding='utf-8') as f:
+            baseline = json.load(f)
+        regresiones = comparar(resumen, baseline, args.tolerancia)
+        if regresiones:
+            print(f"\nRegresiones de p95 (tolerancia {args.tolerancia:.0%}):")
+            for ruta, antes, ahora in regresiones:
+                print(f"  {ruta}: {antes} ms -> {ahora} ms")
+            return 1
+        print(f"\nSin regresiones respecto a '{args.comparar}'.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
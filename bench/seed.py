@@ -0,0 +1,156 @@
+"""Crea una base de datos local desde script-database.sql y la puebla con volúmenes realistas."""
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+from config import Config
+
+SCRIPT_SQL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'script-database.sql')
+
+CATEGORIAS = ['Entradas', 'Platos Principales', 'Postres', 'Bebidas']
+USUARIOS_BENCH = [
+    # (nombres, email, password, rol) — el login compara la contraseña en texto plano
+    ('Admin', 'admin@bench.local', 'bench', 'admin'),
+    ('Moza', 'moza@bench.local', 'bench', 'moza'),
+]
+LOTE = 1000
+
+
+def conectar(database=None):
+    return mysql.connector.connect(
+        host=Config.MYSQL_HOST,
+        user=Config.MYSQL_USER,
+        password=Config.MYSQL_PASSWORD,
+        port=Config.MYSQL_PORT,
+        database=database,
+    )
+
+
+def crear_esquema(cursor, db):
+    cursor.execute(f"DROP DATABASE IF EXISTS `{db}`")
+    cursor.execute(f"CREATE DATABASE `{db}` CHARACTER SET utf8mb4")
+    cursor.execute(f"USE `{db}`")
+    with open(SCRIPT_SQL, encoding='utf-8') as f:
+        for sentencia in f.read().split(';'):
+            if sentencia.strip():
+                cursor.execute(sentencia)
+
+
+def insertar_en_lotes(cursor, query, filas):
+    for i in range(0, len(filas), LOTE):
+        cursor.executemany(query, filas[i:i + LOTE])
+
+
+def poblar(conn, platos, mesas, pedidos, reservas, seed):
+    rnd = random.Random(seed)
+    cursor = conn.cursor()
+    ahora = datetime.now().replace(microsecond=0)
+
+    cursor.executemany(
+        "INSERT INTO categorias_menu (nombre, orden) VALUES (%s, %s)",
+        [(nombre, orden) for orden, nombre in enumerate(CATEGORIAS, start=1)],
+    )
+    cursor.executemany(
+        "INSERT INTO usuarios (nombres, apellidos, email, password, rol) VALUES (%s, 'Bench', %s, %s, %s)",
+        USUARIOS_BENCH,
+    )
+    cursor.execute("SELECT id FROM usuarios WHERE rol = 'moza'")
+    moza_id = cursor.fetchone()[0]
+
+    insertar_en_lotes(cursor, """
+        INSERT INTO platos (categoria_id, nombre, descripcion, precio, tiempo_preparacion_min, es_vegetariano, status)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, [
+        (
+            rnd.randint(1, len(CATEGORIAS)), f'Plato {i}', f'Descripción del plato {i}',
+            round(rnd.uniform(5, 60), 2), rnd.randint(5, 45), rnd.randint(0, 1),
+            rnd.choices(['disponible', 'agotado', 'descontinuado'], weights=[85, 10, 5])[0],
+        )
+        for i in range(1, platos + 1)
+    ])
+
+    insertar_en_lotes(cursor, """
+        INSERT INTO mesas (numero_mesa, capacidad, ubicacion, status) VALUES (%s, %s, %s, 'disponible')
+    """, [
+        (i, rnd.choice([2, 2, 4, 4, 4, 6, 8]), rnd.choice(['interior', 'exterior', 'terraza', 'vip']))
+        for i in range(1, mesas + 1)
+    ])
+
+    # Menú del día vigente con tres platos
+    cursor.execute("INSERT INTO menu_del_dia_actual (id, fecha, status, precio_fijo) VALUES (1, CURDATE(), 'activo', 18.00)")
+    cursor.executemany(
+        "INSERT INTO detalle_menu_dia (menu_dia_id, plato_id, tipo_plato_dia, orden) VALUES (1, %s, %s, %s)",
+        [(1, 'entrada', 1), (2, 'segundo', 2), (3, 'postre', 3)],
+    )
+
+    # Pedidos históricos repartidos en el último año, cobrados como los cierra la
+    # app ('cerrado' con fecha_cierre) para que los rollups de reportes.py los vean
+    historicos = []
+    for _ in range(pedidos):
+        fecha_pedido = ahora - timedelta(minutes=rnd.randint(60, 525600))
+        cerrado = rnd.random() < 0.95
+        historicos.append((
+            rnd.randint(1, mesas), moza_id, fecha_pedido,
+            fecha_pedido + timedelta(minutes=rnd.randint(20, 120)) if cerrado else None,
+            moza_id if cerrado else None,
+            round(rnd.uniform(15, 300), 2), rnd.choice(['efectivo', 'tarjeta', 'yape', 'plin']),
+            'cerrado' if cerrado else 'cancelado',
+        ))
+    insertar_en_lotes(cursor, """
+        INSERT INTO pedidos (mesa_id, usuario_moza_id, fecha_pedido, fecha_cierre, usuario_cierre_id, total,
+                             metodo_pago, status)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, historicos)
+    insertar_en_lotes(cursor, """
+        INSERT INTO detalle_pedido (pedido_id, plato_id, cantidad, precio_unitario, status)
+        VALUES (%s, %s, %s, %s, 'entregado')
+    """, [
+        (pedido_id, rnd.randint(1, platos), rnd.randint(1, 4), round(rnd.uniform(5, 60), 2))
+        for pedido_id in range(1, pedidos + 1)
+        for _ in range(rnd.randint(1, 5))
+    ])
+
+    insertar_en_lotes(cursor, """
+        INSERT INTO reservas (name, email, guests, reserva_at, notas, status) VALUES (%s, %s, %s, %s, %s, %s)
+    """, [
+        (
+            f'Cliente {i}', f'cliente{i}@bench.local', rnd.randint(1, 8),
+            ahora + timedelta(minutes=15 * rnd.randint(-35000, 2000)), None,
+            rnd.choices(['pendiente', 'confirmada', 'completada', 'cancelada', 'no_asistio'],
+                        weights=[10, 10, 60, 15, 5])[0],
+        )
+        for i in range(1, reservas + 1)
+    ])
+
+    conn.commit()
+    cursor.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default='sumak_mikuy_bench', help='Base de datos a (re)crear')
+    parser.add_argument('--platos', type=int, default=300)
+    parser.add_argument('--mesas', type=int, default=30)
+    parser.add_argument('--pedidos', type=int, default=20000)
+    parser.add_argument('--reservas', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    conn = conectar()
+    cursor = conn.cursor()
+    crear_esquema(cursor, args.db)
+    cursor.close()
+    conn.close()
+
+    conn = conectar(args.db)
+    poblar(conn, args.platos, args.mesas, args.pedidos, args.reservas, args.seed)
+    conn.close()
+    print(f"BD '{args.db}' lista: {args.platos} platos, {args.mesas} mesas, "
+          f"{args.pedidos} pedidos, {args.reservas} reservas.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Caché HTTP de las páginas públicas y compresión del HTML dinámico.
+
+`CachePaginas.publica` envuelve una vista GET: a un visitante anónimo (sin
+sesión ni mensajes flash) se le entrega el HTML guardado en memoria, con ETag,
+Last-Modified y su versión gzip ya calculada, sin pasar por Jinja. Con sesión
+la vista se ejecuta siempre: el HTML depende del usuario o lleva un flash.
+Las entradas vencen a los `ttl` segundos y, si el total supera `max_bytes`, se
+descartan las menos usadas.
+"""
+import functools
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import make_response, request, session
+
+NIVEL_GZIP = 6
+MINIMO_GZIP = 1024  # Bytes: por debajo, comprimir no compensa
+
+
+class _Pagina:
+    __slots__ = ('cuerpo', 'comprimido', 'etag', 'modificada', 'mimetype', 'expira', 'tamano')
+
+    def __init__(self, cuerpo, mimetype, ttl):
+        self.cuerpo = cuerpo
+        self.comprimido = gzip.compress(cuerpo, compresslevel=NIVEL_GZIP, mtime=0)
+        self.etag = hashlib.sha1(cuerpo).hexdigest()[:20]
+        self.modificada = time.time()
+        self.mimetype = mimetype
+        self.expira = time.monotonic() + ttl
+        self.tamano = len(cuerpo) + len(self.comprimido)
+
+    def responder(self):
+        if request.accept_encodings['gzip']:
+            response = make_response(self.comprimido)
+            response.headers['Content-Encoding'] = 'gzip'
+            response.set_etag(self.etag + '-gz')
+        else:
+            response = make_response(self.cuerpo)
+            response.set_etag(self.etag)
+        response.mimetype = self.mimetype
+        response.last_modified = self.modificada
+        response.vary.add('Accept-Encoding')
+        response.vary.add('Cookie')
+        # El navegador revalida siempre (304 si no cambió): tras un flash la página es otra
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+
+class CachePaginas:
+    """Caché LRU con TTL de páginas completas, compartida por los hilos del worker."""
+
+    def __init__(self, ttl=300.0, max_bytes=32 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._paginas = OrderedDict()
+        self._bytes = 0
+        self._aciertos = 0
+        self._fallos = 0
+        self._expulsiones = 0
+
+    def _quitar(self, clave):
+        pagina = self._paginas.pop(clave)
+        self._bytes -= pagina.tamano
+
+    def obtener(self, clave):
+        with self._lock:
+            pagina = self._paginas.get(clave)
+            if pagina is not None and pagina.expira <= time.monotonic():
+                self._quitar(clave)
+                pagina = None
+            if pagina is None:
+                self._fallos += 1
+                return None
+            self._paginas.move_to_end(clave)
+            self._aciertos += 1
+            return pagina
+
+    def guardar(self, clave, cuerpo, mimetype):
+        pagina = _Pagina(cuerpo, mimetype, self.ttl)
+        with self._lock:
+            if clave in self._paginas:
+                self._quitar(clave)
+            if pagina.tamano > self.max_bytes:
+                return pagina
+            self._paginas[clave] = pagina
+            self._bytes += pagina.tamano
+            ahora = time.monotonic()
+            for vieja in [c for c, p in self._paginas.items() if p.expira <= ahora]:
+                self._quitar(vieja)
+                self._expulsiones += 1
+            while self._bytes > self.max_bytes:
+                self._quitar(next(iter(self._paginas)))
+                self._expulsiones += 1
+        return pagina
+
+    def limpiar(self):
+        with self._lock:
+            self._paginas.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entradas': len(self._paginas),
+                'bytes': self._bytes,
+                'aciertos': self._aciertos,
+                'fallos': self._fallos,
+                'expulsiones': self._expulsiones,
+            }
+
+    def servir(self, vista, *args, **kwargs):
+        """Responde `vista(*args, **kwargs)` desde la caché si la petición es anónima."""
+        if self.ttl <= 0 or request.method not in ('GET', 'HEAD') or session:
+            return vista(*args, **kwargs)
+
+        # Estas vistas no leen la query string: no se usa en la clave, así
+        # `/?x=<aleatorio>` no llena la caché
+        clave = request.path
+        pagina = self.obtener(clave)
+        if pagina is None:
+            response = make_response(vista(*args, **kwargs))
+            # La vista pudo iniciar sesión o dejar un flash: esa respuesta no se comparte
+            if (response.status_code != 200 or session or response.mimetype != 'text/html'
+                    or 'Set-Cookie' in response.headers):
+                return response
+            pagina = self.guardar(clave, response.get_data(), response.mimetype)
+        return pagina.responder()
+
+    def publica(self, vista):
+        """Decorador para vistas públicas cuyo HTML solo depende de la ruta."""
+
+        @functools.wraps(vista)
+        def envoltura(*args, **kwargs):
+            return self.servir(vista, *args, **kwargs)
+
+        return envoltura
+
+def comprimir_html(response):
+    """Para `after_request`: gzip del HTML generado en cada petición si el cliente lo acepta."""
+    if (response.mimetype != 'text/html' or response.status_code != 200
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or not request.accept_encodings['gzip']):
+        return response
+    cuerpo = response.get_data()
+    if len(cuerpo) < MINIMO_GZIP:
+        return response
+    response.set_data(gzip.compress(cuerpo, compresslevel=NIVEL_GZIP))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
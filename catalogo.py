@@ -0,0 +1,190 @@
+import threading
+import time
+from datetime import date
+
+from sincronizacion import version_actual
+
+# Tiempo del menú del día -> nombres de las categorías de la carta que lo abastecen
+TIEMPOS_MENU = {
+    'entrada': ('Entradas',),
+    'segundo': ('Platos Principales',),
+    'postre': ('Postres', 'Bebidas'),
+}
+
+
+def tiempos_por_categoria(categorias):
+    """{categoria_id: tiempo} según TIEMPOS_MENU; las categorías sin tiempo no aparecen."""
+    por_nombre = {nombre: tiempo for tiempo, nombres in TIEMPOS_MENU.items() for nombre in nombres}
+    return {c['id']: por_nombre[c['nombre']] for c in categorias if c['nombre'] in por_nombre}
+
+
+def componer_menu(platos, tiempo_por_categoria):
+    """
+    Reparte los platos (ya en el orden de la carta) entre los tiempos del menú
+    en una sola pasada. Retorna {'entrada': [...], 'segundo': [...], 'postre': [...]}.
+    """
+    tiempos = {tiempo: [] for tiempo in TIEMPOS_MENU}
+    for plato in platos:
+        tiempo = tiempo_por_categoria.get(plato['categoria_id'])
+        if tiempo is not None:
+            tiempos[tiempo].append(plato)
+    return tiempos
+
+
+class Catalogo:
+    """
+    Fotografía inmutable del catálogo: categorías, platos, precios y menú del día.
+    `platos_por_tiempo` agrupa los platos disponibles en entrada/segundo/postre
+    para armar el menú del día (admin, mozas y carta pública).
+    """
+
+    def __init__(self, version, fecha, categorias, platos_disponibles, precios_platos, menu_del_dia, precios_menus,
+                 menu_version=0):
+        self.version = version
+        self.menu_version = menu_version
+        self.fecha = fecha
+        self.creado_en = time.monotonic()
+        self.categorias = categorias
+        self.platos_disponibles = platos_disponibles
+        self.precios_platos = precios_platos
+        self.menu_del_dia = menu_del_dia
+        self.precios_menus = precios_menus
+        self.platos_por_tiempo = componer_menu(platos_disponibles, tiempos_por_categoria(categorias))
+
+    @property
+    def clave(self):
+        """Identifica esta fotografía (p. ej. en la clave de un fragmento de plantilla cacheado)."""
+        return (self.version, self.menu_version, self.creado_en)
+
+    def precio(self, item_type, item_id):
+        """Precio unitario de un ítem ('plato' o 'menu'); None si no existe o está inactivo."""
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            return None
+        if item_type == 'plato':
+            return self.precios_platos.get(item_id)
+        if item_type == 'menu':
+            return self.precios_menus.get(item_id)
+        return None
+
+
+def cargar_catalogo(cursor, version):
+    """Lee el catálogo completo desde MySQL con un cursor `dictionary=True`."""
+    # Se lee antes que los datos: la fotografía nunca declara una versión más nueva que su contenido
+    _, menu_version = version_actual(cursor)
+
+    cursor.execute("SELECT id, nombre, orden FROM categorias_menu ORDER BY orden, nombre")
+    categorias = cursor.fetchall()
+
+    # Todos los platos (para precios) y los disponibles en el orden de la carta
+    cursor.execute("""
+        SELECT
+            p.id, p.nombre, p.precio, p.status, c.nombre AS categoria, c.id AS categoria_id
+        FROM platos p
+        JOIN categorias_menu c ON p.categoria_id = c.id
+        ORDER BY c.orden, p.nombre
+    """)
+    platos = cursor.fetchall()
+    precios_platos = {p['id']: float(p['precio']) for p in platos if p['precio'] is not None}
+    platos_disponibles = [
+        {k: p[k] for k in ('id', 'nombre', 'precio', 'categoria', 'categoria_id')}
+        for p in platos if p['status'] == 'disponible'
+    ]
+
+    cursor.execute("SELECT id, precio_fijo FROM menu_del_dia_actual WHERE status = 'activo'")
+    precios_menus = {row['id']: float(row['precio_fijo']) for row in cursor.fetchall() if row['precio_fijo']}
+
+    # LEFT JOIN: el menú activo de hoy aparece aunque aún no tenga platos asignados
+    cursor.execute("""
+        SELECT
+            md.id AS menu_dia_id, md.precio_fijo, p.id AS plato_id, p.nombre AS plato_nombre,
+            dmd.tipo_plato_dia
+        FROM menu_del_dia_actual md
+        LEFT JOIN detalle_menu_dia dmd ON md.id = dmd.menu_dia_id
+        LEFT JOIN platos p ON dmd.plato_id = p.id
+        WHERE md.fecha = CURDATE() AND md.status = 'activo'
+        ORDER BY dmd.tipo_plato_dia, dmd.orden
+    """)
+    menu_items = cursor.fetchall()
+
+    menu_del_dia = None
+    if menu_items:
+        menu_del_dia = {
+            'id': menu_items[0]['menu_dia_id'],
+            'precio_fijo': menu_items[0]['precio_fijo'],
+            'items': {}
+        }
+        for item in menu_items:
+            if item['plato_id'] is not None:
+                menu_del_dia['items'].setdefault(item['tipo_plato_dia'], []).append(
+                    {'id': item['plato_id'], 'nombre': item['plato_nombre']})
+
+    return Catalogo(version, date.today(), categorias, platos_disponibles, precios_platos, menu_del_dia, precios_menus,
+                    menu_version=menu_version)
+
+
+class CatalogoCache:
+    """
+    Caché versionada del catálogo en memoria del proceso.
+
+    Las rutas de escritura del admin llaman a `invalidate()`, que solo incrementa
+    la versión; el siguiente `get()` reconstruye la fotografía una única vez
+    (las peticiones concurrentes esperan a esa misma reconstrucción). También se
+    reconstruye al cambiar el día (menú del día), cuando quien llama conoce un
+    `menu_version` de MySQL más nuevo (cambio hecho en otro worker) y, como red
+    de seguridad, cuando la fotografía supera `max_age` segundos.
+    """
+
+    def __init__(self, connection_factory, max_age=60.0):
+        self._connection_factory = connection_factory
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._version = 0
+        self._snapshot = None
+        self._al_cambiar = []
+
+    @property
+    def version(self):
+        return self._version
+
+    def al_cambiar(self, funcion):
+        """Registra `funcion()` para cuando el catálogo se invalida o se recarga con otros datos."""
+        self._al_cambiar.append(funcion)
+
+    def _avisar(self):
+        for funcion in self._al_cambiar:
+            funcion()
+
+    def invalidate(self):
+        """Marca el catálogo como obsoleto tras una escritura del admin."""
+        with self._lock:
+            self._version += 1
+        self._avisar()
+
+    def get(self, menu_version=0):
+        """Retorna la fotografía vigente, reconstruyéndola si quedó obsoleta."""
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot, menu_version):
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if self._is_fresh(snapshot, menu_version):
+                return snapshot
+            version = self._version
+            with self._connection_factory() as conn, conn.cursor(dictionary=True) as cursor:
+                snapshot = cargar_catalogo(cursor, version)
+            anterior, self._snapshot = self._snapshot, snapshot
+        if anterior is not None and anterior.menu_version != snapshot.menu_version:
+            self._avisar()  # Cambio hecho en otro worker
+        return snapshot
+
+    def _is_fresh(self, snapshot, menu_version):
+        return (
+            snapshot is not None
+            and snapshot.version == self._version
+            and snapshot.menu_version >= menu_version
+            and snapshot.fecha == date.today()
+            and time.monotonic() - snapshot.creado_en < self.max_age
+        )
@@ -0,0 +1,148 @@
+"""
+Cola de la cocina: las líneas de las comandas abiertas, en el orden en que
+conviene empezarlas para que los platos de una misma mesa salgan juntos.
+
+Cada mesa tiene una hora objetivo, común a todas sus comandas abiertas: la más
+temprana a la que puede estar listo su plato más lento (los que ya están en
+preparación cuentan desde que empezaron). Cada plato pendiente debe empezar `tiempo_preparacion_min` antes
+de ese objetivo, así el ceviche no espera frío a que salga el seco. La cola se
+ordena por esa hora de inicio; una línea cuya hora ya pasó está `atrasada`.
+
+Una línea pasa por pendiente -> en_preparacion -> listo -> entregado (ver
+TRANSICIONES). El pedido pasa a `en_preparacion` con su primera línea empezada
+y a `listo_pago` cuando se entregó la última; el tiempo de ticket es el que
+va desde la comanda hasta que su último plato estuvo listo.
+"""
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+import consultas
+from sincronizacion import siguiente_version
+
+# estado actual -> estados a los que puede pasar una línea
+TRANSICIONES = {
+    'pendiente': ('en_preparacion',),
+    'en_preparacion': ('listo', 'pendiente'),  # 'pendiente': se empezó por error
+    'listo': ('entregado',),
+}
+
+# estado al que pasa una línea -> estado en que tiene que estar
+ORIGEN = {destino: origen for origen, destinos in TRANSICIONES.items() for destino in destinos}
+
+
+class TransicionInvalida(ValueError):
+    """La línea no existe o su estado actual no admite el cambio pedido."""
+
+
+def planificar(lineas, ahora, tiempo_defecto=15):
+    """
+    Ordena las líneas de `consultas.cola_cocina()` por la hora a la que conviene
+    empezarlas. Añade a cada línea `duracion` (timedelta), `objetivo` (hora en que
+    debería estar listo todo lo de su mesa, de todas sus comandas abiertas) e
+    `iniciar_en`; las listas para servir van al final, por orden de llegada.
+    """
+    por_mesa = defaultdict(list)
+    for linea in lineas:
+        # Los ítems sin tiempo propio (el menú del día) usan el tiempo por defecto
+        linea['duracion'] = timedelta(minutes=linea['tiempo_preparacion_min'] or tiempo_defecto)
+        por_mesa[linea['mesa_id']].append(linea)
+
+    for de_la_mesa in por_mesa.values():
+        objetivo = ahora
+        for linea in de_la_mesa:
+            if linea['status'] == 'pendiente':
+                fin = ahora + linea['duracion']
+            elif linea['status'] == 'en_preparacion':
+                fin = linea['inicio_preparacion'] + linea['duracion']
+            else:
+                fin = linea['listo_at']
+            objetivo = max(objetivo, fin)
+
+        for linea in de_la_mesa:
+            linea['objetivo'] = objetivo
+            if linea['status'] == 'pendiente':
+                linea['iniciar_en'] = objetivo - linea['duracion']
+            else:
+                linea['iniciar_en'] = linea['inicio_preparacion'] or linea['listo_at']
+
+    return sorted(lineas, key=lambda linea: (
+        linea['status'] == 'listo',
+        linea['fecha_pedido'] if linea['status'] == 'listo' else linea['iniciar_en'],
+        linea['fecha_pedido'],
+        linea['detalle_id'],
+    ))
+
+
+def serializar(lineas, ahora):
+    """Líneas planificadas para el JSON de la pantalla, con tiempos en segundos relativos a `ahora`."""
+    def segundos(momento):
+        return round((momento - ahora).total_seconds()) if momento else None
+
+    return [{
+        'detalle_id': linea['detalle_id'],
+        'pedido_id': linea['pedido_id'],
+        'mesa': linea['mesa'],
+        'nombre_item': linea['nombre_item'],
+        'cantidad': linea['cantidad'],
+        'status': linea['status'],
+        'duracion_min': round(linea['duracion'].total_seconds() / 60),
+        'iniciar_en': segundos(linea['iniciar_en']),
+        'objetivo': segundos(linea['objetivo']),
+        'desde_pedido': -segundos(linea['fecha_pedido']),
+        'atrasada': linea['status'] == 'pendiente' and linea['iniciar_en'] <= ahora,
+    } for linea in lineas]
+
+
+def cambiar_estado(conn, detalle_id, hacia):
+    """
+    Aplica la transición de la línea dentro de una transacción (el commit queda
+    a cargo de quien llama). Retorna un dict con el pedido, su nuevo estado si
+    cambió (`pedido_status`, `version`) y `ticket_segundos` si con esta línea
+    quedó listo todo el pedido. Lanza TransicionInvalida.
+    """
+    # Bloquea la línea y su pedido: dos cocineros que terminan a la vez los dos
+    # últimos platos se ordenan aquí, y el segundo ve la línea del primero
+    pedido = consultas.bloquear_linea(conn, detalle_id)
+    if pedido is None:
+        raise TransicionInvalida(f'La línea {detalle_id} no existe.')
+
+    desde = ORIGEN.get(hacia)
+    if desde is None or not consultas.cambiar_estado_linea(conn, detalle_id, desde, hacia):
+        raise TransicionInvalida(f'La línea {detalle_id} no puede pasar a "{hacia}" desde su estado actual.')
+
+    resultado = {**pedido, 'desde': desde, 'pedido_status': None, 'version': None, 'ticket_segundos': None}
+    avance = consultas.avance_pedido(conn, pedido['pedido_id'])
+
+    nuevo_status = None
+    if hacia == 'en_preparacion' and pedido['pedido_status'] == 'abierto':
+        nuevo_status = 'en_preparacion'
+    elif hacia == 'entregado' and avance['entregadas'] == avance['lineas']:
+        nuevo_status = 'listo_pago'
+    if nuevo_status:
+        with conn.cursor() as cursor:
+            version = siguiente_version(cursor)
+        consultas.cambiar_estado_pedido(conn, pedido['pedido_id'], nuevo_status, version)
+        resultado.update(pedido_status=nuevo_status, version=version)
+
+    if hacia == 'listo' and avance['listas'] == avance['lineas']:
+        resultado['ticket_segundos'] = avance['ticket_segundos']
+    return resultado
+
+
+class TiemposTicket:
+    """Tickets completados por este proceso y la suma de sus tiempos, para /admin/metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tickets = 0
+        self._segundos = 0.0
+
+    def observar(self, segundos):
+        with self._lock:
+            self._tickets += 1
+            self._segundos += segundos
+
+    def stats(self):
+        with self._lock:
+            return {'tickets': self._tickets, 'segundos': self._segundos}
@@ -0,0 +1,364 @@
+"""
+Cola write-behind de los formularios públicos: reservas, reclamaciones y contacto.
+
+La petición solo agrega una línea JSON al diario `pendientes.jsonl` (con fsync)
+y responde de inmediato con el código de reserva o de reclamo; MySQL no
+interviene. Un hilo por proceso (`DrenadorCola`) vacía el diario por lotes:
+renombra el archivo a `procesando.jsonl`, lo recorre guardando en
+`procesando.pos` hasta dónde quedó confirmado y lo borra al terminar.
+
+- Reintentar un lote no duplica filas: antes de insertar se descartan los
+  códigos que ya están en la tabla (reclamaciones.codigo_reclamo, reservas.recibo,
+  notificaciones.recibo con el id de la entrada para los mensajes de contacto).
+- Si MySQL no responde, el lote queda en el diario y se reintenta con espera
+  creciente; las nuevas entradas siguen llegando a `pendientes.jsonl`.
+- Una entrada que MySQL rechaza por sus datos (DataError, IntegrityError) se
+  pasa a `rechazados.jsonl` con el error, para no bloquear a las demás; los
+  demás errores de MySQL dejan el lote en el diario para reintentarlo.
+- Los correos (acuse de la reserva, mensaje de contacto) no se envían aquí:
+  se agregan a la bandeja de salida de `notificaciones` en la misma transacción.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+from mysql.connector import errors
+
+import contadores
+import notificaciones
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos (basta para el servidor de desarrollo)
+    fcntl = None
+
+logger = logging.getLogger('sumak.cola')
+
+PENDIENTES = 'pendientes.jsonl'
+PROCESANDO = 'procesando.jsonl'
+POSICION = 'procesando.pos'
+RECHAZADOS = 'rechazados.jsonl'
+
+# Errores por el contenido de la fila: reintentarla no sirve. Los demás (esquema
+# desactualizado, permisos, conexión) se corrigen en el servidor y el lote se reintenta.
+ERRORES_DE_DATOS = (errors.DataError, errors.IntegrityError)
+
+_COLUMNAS_RESERVA = ('recibo', 'name', 'email', 'guests', 'reserva_at', 'notas')
+_COLUMNAS_RECLAMACION = (
+    'codigo_reclamo', 'fecha_registro', 'fecha_respuesta_limite', 'tipo_documento', 'numero_documento',
+    'nombre_consumidor', 'domicilio', 'telefono', 'email', 'tipo_bien', 'monto_reclamado',
+    'descripcion_bien', 'tipo_solicitud', 'detalle', 'pedido_consumidor',
+)
+_COLUMNAS_CONTACTO = ('recibo', 'tipo', 'destinatario', 'datos', 'responder_a')
+
+
+def nuevo_codigo(prefijo):
+    return f"{prefijo}-{uuid.uuid4().hex[:8].upper()}"
+
+
+class ColaFormularios:
+    """Diario append-only en disco, compartido por todos los procesos que usan `directorio`."""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self._locks = defaultdict(threading.Lock)  # Sin fcntl: solo entre hilos
+
+    def _ruta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    @contextmanager
+    def bloqueo(self, nombre, esperar=True):
+        """
+        Bloqueo exclusivo (flock) sobre `<nombre>.lock`; retorna False si `esperar=False` y está tomado.
+        Además de 'cola' y 'drenaje', app.py lo usa para que un solo proceso envíe los
+        correos ('notificaciones') y agregue los rollups de ventas ('rollup').
+        """
+        if fcntl is None:
+            lock = self._locks[nombre]
+            adquirido = lock.acquire(blocking=esperar)
+            try:
+                yield adquirido
+            finally:
+                if adquirido:
+                    lock.release()
+            return
+        fd = os.open(self._ruta(nombre + '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | (0 if esperar else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+        finally:
+            os.close(fd)  # Libera el flock
+
+    def encolar(self, tipo, datos):
+        """Agrega la entrada al diario de forma durable. Lanza OSError si el disco falla."""
+        linea = json.dumps({
+            'id': uuid.uuid4().hex,
+            'tipo': tipo,
+            'creado': datetime.now().isoformat(timespec='seconds'),
+            'datos': datos,
+        }, ensure_ascii=False) + '\n'
+        with self.bloqueo('cola'):
+            with open(self._ruta(PENDIENTES), 'a', encoding='utf-8') as f:
+                f.write(linea)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _posicion(self):
+        try:
+            with open(self._ruta(POSICION)) as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def guardar_posicion(self, posicion):
+        temporal = self._ruta(POSICION + '.tmp')
+        with open(temporal, 'w') as f:
+            f.write(str(posicion))
+        os.replace(temporal, self._ruta(POSICION))
+
+    def tomar(self):
+        """
+        Abre el lote en curso (o convierte pendientes.jsonl en uno nuevo) y retorna
+        el archivo posicionado tras lo ya confirmado; None si no hay nada pendiente.
+        Solo debe llamarlo quien tenga el bloqueo 'drenaje'.
+        """
+        if not os.path.exists(self._ruta(PROCESANDO)):
+            with self.bloqueo('cola'):
+                if not os.path.exists(self._ruta(PENDIENTES)):
+                    return None
+                os.replace(self._ruta(PENDIENTES), self._ruta(PROCESANDO))
+                self.guardar_posicion(0)
+        archivo = open(self._ruta(PROCESANDO), 'rb')
+        archivo.seek(self._posicion())
+        return archivo
+
+    def terminar(self):
+        """El lote en curso quedó completo en MySQL."""
+        os.remove(self._ruta(PROCESANDO))
+        try:
+            os.remove(self._ruta(POSICION))
+        except FileNotFoundError:
+            pass
+
+    def rechazar(self, entrada, error):
+        with open(self._ruta(RECHAZADOS), 'a', encoding='utf-8') as f:
+            f.write(json.dumps({**entrada, 'error': str(error)}, ensure_ascii=False, default=str) + '\n')
+
+    def estado(self):
+        """(entradas pendientes, segundos de la más antigua). Lee los archivos: solo para métricas."""
+        pendientes, primera = 0, None
+        for nombre, desde in ((PROCESANDO, self._posicion()), (PENDIENTES, 0)):
+            try:
+                with open(self._ruta(nombre), 'rb') as f:
+                    f.seek(desde)
+                    for linea in f:
+                        if primera is None:
+                            try:
+                                primera = json.loads(linea)['creado']
+                            except (ValueError, KeyError):
+                                pass
+                        pendientes += 1
+            except FileNotFoundError:
+                continue
+        if primera is None:
+            return pendientes, 0.0
+        return pendientes, max(0.0, (datetime.now() - datetime.fromisoformat(primera)).total_seconds())
+
+
+def _insertar_nuevos(cursor, tabla, columna_codigo, columnas, filas):
+    """INSERT multi-fila de las filas cuyo código aún no está en la tabla; retorna las insertadas."""
+    codigos = [fila[columna_codigo] for fila in filas]
+    cursor.execute(
+        f"SELECT {columna_codigo} FROM {tabla} WHERE {columna_codigo} IN ({', '.join(['%s'] * len(codigos))})",
+        tuple(codigos),
+    )
+    existentes = {row[0] for row in cursor.fetchall()}
+    nuevas, vistos = [], set(existentes)
+    for fila in filas:
+        if fila[columna_codigo] not in vistos:
+            vistos.add(fila[columna_codigo])
+            nuevas.append(fila)
+    if nuevas:
+        cursor.execute(
+            f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES "
+            + ', '.join(['(' + ', '.join(['%s'] * len(columnas)) + ')'] * len(nuevas)),
+            tuple(fila.get(columna) for fila in nuevas for columna in columnas),
+        )
+    return nuevas
+
+
+def _guardar_reservas(cursor, entradas):
+    filas = [entrada['datos'] for entrada in entradas]
+    insertadas = _insertar_nuevos(cursor, 'reservas', 'recibo', _COLUMNAS_RESERVA, filas)
+    if insertadas:
+        contadores.ajustar(cursor, reservas_pendientes=len(insertadas))
+    notificaciones.agregar_varios(cursor, [
+        ('reserva_recibida', fila['email'], {
+            'nombre': fila['name'],
+            'personas': fila['guests'],
+            'fecha': datetime.strptime(fila['reserva_at'], '%Y-%m-%d %H:%M:%S').strftime('%d/%m/%Y %H:%M'),
+            'recibo': fila['recibo'],
+        }, None)
+        for fila in insertadas if fila.get('email')
+    ])
+
+
+def _guardar_reclamaciones(cursor, entradas):
+    # fecha_registro es la del envío, no la del momento en que se vació la cola
+    filas = [{**entrada['datos'], 'fecha_registro': entrada['creado'].replace('T', ' ')} for entrada in entradas]
+    _insertar_nuevos(cursor, 'reclamaciones', 'codigo_reclamo', _COLUMNAS_RECLAMACION, filas)
+
+
+def _guardar_contactos(cursor, entradas):
+    # El mensaje va al buzón del restaurante; "Responder" le contesta al visitante.
+    # El id de la entrada sirve de recibo para no encolar dos veces el mismo correo.
+    filas = [{
+        'recibo': entrada['id'],
+        'tipo': 'contacto',
+        'destinatario': None,
+        'datos': json.dumps({'nombre': entrada['datos']['name'], 'email': entrada['datos']['email'],
+                             'mensaje': entrada['datos']['message']}, ensure_ascii=False),
+        'responder_a': entrada['datos']['email'],
+    } for entrada in entradas]
+    _insertar_nuevos(cursor, 'notificaciones', 'recibo', _COLUMNAS_CONTACTO, filas)
+
+
+# tipo de entrada -> función que guarda un grupo de entradas con el cursor de la transacción
+DESTINOS = {
+    'reserva': _guardar_reservas,
+    'reclamacion': _guardar_reclamaciones,
+    'contacto': _guardar_contactos,
+}
+
+
+class DrenadorCola:
+    """
+    Hilo de fondo que vacía la cola hacia MySQL. Solo un proceso drena a la vez
+    (bloqueo 'drenaje'); `iniciar()` es idempotente y vuelve a crear el hilo en
+    un proceso hijo tras un fork.
+    """
+
+    def __init__(self, cola, connection_factory, lote=100, intervalo=1.0, espera_max=60.0):
+        self.cola = cola
+        self._connection_factory = connection_factory
+        self.lote = lote
+        self.intervalo = intervalo
+        self.espera_max = espera_max
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._hilo = None
+        self._pid = None
+        self._contadores = {'procesadas': 0, 'rechazadas': 0, 'reintentos': 0}
+
+    def iniciar(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._despertar = threading.Event()
+            self._hilo = threading.Thread(target=self._bucle, name='drenador-cola', daemon=True)
+            self._hilo.start()
+            self._pid = os.getpid()
+
+    def avisar(self):
+        """Llamar tras encolar: despierta al hilo sin esperar al próximo intervalo."""
+        self.iniciar()
+        self._despertar.set()
+
+    def stats(self):
+        pendientes, antiguedad = self.cola.estado()
+        return {'pendientes': pendientes, 'antiguedad_segundos': antiguedad, **self._contadores}
+
+    def _bucle(self):
+        espera = self.intervalo
+        while True:
+            if espera > self.intervalo:
+                time.sleep(espera)  # Tras un fallo los avisos no adelantan el reintento
+            else:
+                self._despertar.wait(espera)
+            self._despertar.clear()
+            try:
+                self.drenar()
+                espera = self.intervalo
+            except Exception as e:
+                self._contadores['reintentos'] += 1
+                espera = min(max(espera, self.intervalo) * 2, self.espera_max)
+                logger.warning("No se pudo vaciar la cola de formularios (reintento en %.0f s): %s", espera, e)
+
+    def drenar(self):
+        """Vacía la cola; retorna las entradas procesadas. Propaga el error si MySQL no está disponible."""
+        total = 0
+        with self.cola.bloqueo('drenaje', esperar=False) as propio:
+            if not propio:
+                return 0
+            while True:
+                archivo = self.cola.tomar()
+                if archivo is None:
+                    return total
+                with archivo:
+                    while True:
+                        entradas = self._leer_lote(archivo)
+                        if not entradas:
+                            break
+                        self._procesar(entradas)
+                        self.cola.guardar_posicion(archivo.tell())
+                        total += len(entradas)
+                self.cola.terminar()
+
+    def _leer_lote(self, archivo):
+        entradas = []
+        while len(entradas) < self.lote:
+            linea = archivo.readline()
+            if not linea:
+                break
+            try:
+                entradas.append(json.loads(linea))
+            except ValueError as e:
+                # Línea a medio escribir (el proceso murió durante el append)
+                self.cola.rechazar({'linea': linea.decode('utf-8', 'replace')}, e)
+                self._contadores['rechazadas'] += 1
+        return entradas
+
+    def _procesar(self, entradas):
+        with self._connection_factory() as conn, conn.cursor() as cursor:
+            try:
+                self._guardar(cursor, entradas)
+                conn.commit()
+                self._contadores['procesadas'] += len(entradas)
+                return
+            except ERRORES_DE_DATOS + (KeyError, ValueError):
+                conn.rollback()
+
+            # Alguna entrada tiene datos inválidos: se guardan una por una para aislarla
+            for entrada in entradas:
+                try:
+                    self._guardar(cursor, [entrada])
+                    conn.commit()
+                    self._contadores['procesadas'] += 1
+                except (ERRORES_DE_DATOS + (KeyError, ValueError)) as e:
+                    conn.rollback()
+                    self.cola.rechazar(entrada, e)
+                    self._contadores['rechazadas'] += 1
+                    logger.error("Entrada %s (%s) rechazada: %s", entrada.get('id'), entrada.get('tipo'), e)
+
+    @staticmethod
+    def _guardar(cursor, entradas):
+        grupos = {}
+        for entrada in entradas:
+            grupos.setdefault(entrada.get('tipo'), []).append(entrada)
+        for tipo, grupo in grupos.items():
+            if tipo not in DESTINOS:
+                raise errors.DataError(f"Tipo de entrada desconocido: {tipo!r}")
+            DESTINOS[tipo](cursor, grupo)
@@ -0,0 +1,224 @@
+import threading
+import time
+from collections import OrderedDict
+
+from mysql.connector import IntegrityError, errorcode
+
+import contadores
+from sincronizacion import siguiente_version
+
+
+class ComandaInvalida(ValueError):
+    """Los ítems de la comanda no son válidos (formato, cantidad o precio)."""
+
+
+# El formulario de la moza envía 'plato_carta'/'menu_dia'; la API histórica 'plato'/'menu'
+TIPOS_ITEM = {
+    'plato': 'plato',
+    'plato_carta': 'plato',
+    'menu': 'menu',
+    'menu_dia': 'menu',
+}
+
+PRECIOS_SQL = {
+    'plato': "SELECT id, precio FROM platos WHERE id IN ({})",
+    'menu': "SELECT id, precio_fijo FROM menu_del_dia_actual WHERE status = 'activo' AND id IN ({})",
+}
+
+
+# Largo de pedidos.clave_idempotencia (un UUID con guiones)
+CLAVE_MAX = 36
+
+
+def normalizar_clave(clave):
+    """La clave de idempotencia que envía la tablet, o None si no envió ninguna."""
+    clave = (clave or '').strip()
+    if len(clave) > CLAVE_MAX:
+        raise ComandaInvalida('Clave de la comanda inválida.')
+    return clave or None
+
+
+def normalizar_items(items, max_items):
+    """Convierte el JSON de la comanda en líneas (tipo, id, cantidad) validadas."""
+    if not isinstance(items, list) or not items:
+        raise ComandaInvalida('La comanda no contiene ítems.')
+    if len(items) > max_items:
+        raise ComandaInvalida(f'La comanda supera el máximo de {max_items} ítems.')
+
+    lineas = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ComandaInvalida(f'Ítem de la comanda con formato inválido: {item!r}')
+        tipo = TIPOS_ITEM.get(item.get('tipo'))
+        if tipo is None:
+            raise ComandaInvalida(f"Tipo de ítem desconocido: {item.get('tipo')}")
+        item_id = item.get('id') or item.get('plato_id' if tipo == 'plato' else 'menu_id')
+        try:
+            item_id = int(item_id)
+            cantidad = int(item.get('cantidad', 1))
+        except (TypeError, ValueError):
+            raise ComandaInvalida(f'Ítem {tipo} con ID o cantidad inválidos.')
+        if cantidad < 1:
+            raise ComandaInvalida(f'Cantidad inválida para ítem {tipo} ID {item_id}.')
+        lineas.append((tipo, item_id, cantidad))
+    return lineas
+
+
+class IngestaComanda:
+    """
+    Registro de una comanda en pocas idas y vueltas a MySQL.
+
+    Los precios salen del catálogo en memoria; solo los ítems que no estén en él
+    se consultan, con un único `IN (...)` por tipo. Los detalles se insertan con
+    un INSERT multi-fila. `round_trips` cuenta las sentencias enviadas;
+    `version` y `mesa_status` guardan la versión de sincronización asignada
+    al registrar y el estado en que quedó la mesa. `repetida` indica que la
+    clave ya tenía un pedido y no se insertó nada.
+    """
+
+    def __init__(self, conn, cursor):
+        self.conn = conn
+        self.cursor = cursor
+        self.round_trips = 0
+        self.version = None
+        self.mesa_status = None
+        self.repetida = False
+
+    def _execute(self, query, params=()):
+        self.round_trips += 1
+        self.cursor.execute(query, params)
+
+    def resolver_precios(self, lineas, carta=None):
+        """Retorna {(tipo, id): precio} para todas las líneas o lanza ComandaInvalida."""
+        precios = {}
+        faltantes = {'plato': set(), 'menu': set()}
+        for tipo, item_id, _ in lineas:
+            precio = carta.precio(tipo, item_id) if carta is not None else None
+            if precio is not None:
+                precios[(tipo, item_id)] = precio
+            else:
+                faltantes[tipo].add(item_id)
+
+        for tipo, ids in faltantes.items():
+            if not ids:
+                continue
+            placeholders = ', '.join(['%s'] * len(ids))
+            self._execute(PRECIOS_SQL[tipo].format(placeholders), tuple(sorted(ids)))
+            for item_id, precio in self.cursor.fetchall():
+                if precio is not None:
+                    precios[(tipo, item_id)] = float(precio)
+
+        for tipo, item_id, _ in lineas:
+            if (tipo, item_id) not in precios:
+                # Sin precio: el ítem no existe o está inactivo
+                raise ComandaInvalida(f"Precio no encontrado para ítem {tipo} ID {item_id}")
+        return precios
+
+    def registrar(self, mesa_id, moza_id, lineas, precios, clave=None):
+        """
+        Inserta el pedido, sus detalles y ocupa la mesa. Retorna (pedido_id, total);
+        si `clave` ya tiene un pedido, el de ese pedido.
+        """
+        total = round(sum(precios[(tipo, item_id)] * cantidad for tipo, item_id, cantidad in lineas), 2)
+
+        # La mesa se bloquea antes que sync_estado (ver transacciones.py): dos comandas
+        # simultáneas en la misma mesa se ordenan aquí y solo la primera la ocupa
+        self._execute("SELECT status FROM mesas WHERE id = %s FOR UPDATE", (mesa_id,))
+        mesa = self.cursor.fetchone()
+        if mesa is None:
+            raise ComandaInvalida(f'La mesa {mesa_id} no existe.')
+        ocupa = mesa[0] == 'disponible'
+        self.mesa_status = 'ocupada' if ocupa else mesa[0]
+
+        self.round_trips += 1
+        self.version = siguiente_version(self.cursor)
+
+        try:
+            self._execute("""
+                INSERT INTO pedidos (mesa_id, usuario_moza_id, fecha_pedido, total, status, sync_version, clave_idempotencia)
+                VALUES (%s, %s, NOW(), %s, 'abierto', %s, %s)
+            """, (mesa_id, moza_id, total, self.version, clave))
+        except IntegrityError as e:
+            # Un reenvío que llegó mientras el original aún escribía: el índice único
+            # lo detuvo hasta el commit del original. Se descarta esta transacción
+            # y se responde con el pedido ya registrado.
+            if not clave or e.errno != errorcode.ER_DUP_ENTRY:
+                raise
+            self.conn.rollback()
+            self._execute("SELECT id, total FROM pedidos WHERE clave_idempotencia = %s", (clave,))
+            pedido_id, total = self.cursor.fetchone()
+            self.repetida = True
+            return pedido_id, float(total)
+        pedido_id = self.cursor.lastrowid
+
+        # Solo uno de los dos ID (plato_id o menu_dia_id) será diferente de NULL
+        valores = []
+        params = []
+        for tipo, item_id, cantidad in lineas:
+            valores.append("(%s, %s, %s, %s, %s, 'pendiente')")
+            params.extend((
+                pedido_id,
+                item_id if tipo == 'plato' else None,
+                item_id if tipo == 'menu' else None,
+                cantidad,
+                precios[(tipo, item_id)],
+            ))
+        self._execute(
+            "INSERT INTO detalle_pedido (pedido_id, plato_id, menu_dia_id, cantidad, precio_unitario, status) VALUES "
+            + ', '.join(valores),
+            tuple(params),
+        )
+
+        # Contadores del dashboard; la mesa cuenta solo si esta comanda la ocupa
+        self.round_trips += 1
+        contadores.ajustar(self.cursor, pedidos_abiertos=1, mesas_ocupadas=1 if ocupa else 0)
+
+        # Ocupar la mesa si es la primera comanda en ella (la versión se marca siempre)
+        self._execute(
+            "UPDATE mesas SET status = %s, sync_version = %s WHERE id = %s",
+            (self.mesa_status, self.version, mesa_id),
+        )
+        return pedido_id, total
+
+    def commit(self):
+        self.round_trips += 1
+        self.conn.commit()
+
+
+class ClavesComanda:
+    """
+    Comandas ya registradas por este proceso, por clave de idempotencia: un
+    reenvío de la tablet se responde desde aquí sin ir a MySQL. Guarda hasta
+    `max_entradas` claves durante `ttl` segundos; lo que no esté aquí (otro
+    worker, clave vencida) se busca en pedidos.clave_idempotencia.
+    """
+
+    def __init__(self, ttl=600.0, max_entradas=5000):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._claves = OrderedDict()  # clave -> (expira, (pedido_id, mesa_id, total))
+        self._aciertos = 0
+
+    def obtener(self, clave):
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._claves.get(clave)
+            if entrada is None:
+                return None
+            if entrada[0] <= ahora:
+                del self._claves[clave]
+                return None
+            self._aciertos += 1
+            return entrada[1]
+
+    def guardar(self, clave, pedido):
+        with self._lock:
+            self._claves[clave] = (time.monotonic() + self.ttl, pedido)
+            self._claves.move_to_end(clave)
+            while len(self._claves) > self.max_entradas:
+                self._claves.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'entradas': len(self._claves), 'aciertos': self._aciertos}
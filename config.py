@@ -8,9 +8,83 @@ class Config:
     MYSQL_HOST = 'localhost'
     MYSQL_USER = 'diosito'
     MYSQL_PASSWORD = 'amen' # ¡CAMBIA ESTO!
-    MYSQL_DB = 'sumak_mikuy'
+    MYSQL_DB = os.environ.get('MYSQL_DB', 'sumak_mikuy')
     MYSQL_PORT = 3306
 
+    # Pool de conexiones (ver db_pool.py)
+    MYSQL_POOL_SIZE = int(os.environ.get('MYSQL_POOL_SIZE', 8))  # Máximo de conexiones abiertas por proceso
+    MYSQL_POOL_TIMEOUT = 5.0         # Segundos de espera por una conexión libre
+    MYSQL_POOL_MAX_IDLE = 300.0      # Segundos sin uso antes de cerrar una conexión ociosa
+    MYSQL_POOL_PING_INTERVAL = 30.0  # Segundos ociosa tras los cuales se verifica con ping()
+    MYSQL_LOCK_WAIT_TIMEOUT = 5      # Segundos que una sentencia espera un lock de fila antes de fallar
+
+    # Escrituras concurrentes (ver transacciones.py): repeticiones de una transacción
+    # abortada por deadlock o por vencer la espera de un lock
+    TX_INTENTOS = 3
+    TX_ESPERA = 0.05  # Segundos antes del primer reintento; se duplica en cada uno
+
+    # Catálogo en memoria (ver catalogo.py): antigüedad máxima antes de recargar,
+    # para que los workers que no recibieron la invalidación también se actualicen
+    CATALOGO_MAX_AGE = 60.0
+
+    # Asignación de mesas a reservas (ver asignacion.py): tiempo que un grupo ocupa la mesa
+    RESERVA_DURACION_MIN = int(os.environ.get('RESERVA_DURACION_MIN', 120))
+
+    # Contadores del dashboard (ver contadores.py): cada cuánto se recalculan desde las tablas
+    CONTADORES_RECONCILIAR_CADA = 600.0
+
+    # Caché de páginas públicas para visitantes anónimos (ver cache_http.py); 0 la desactiva
+    PAGINAS_CACHE_TTL = float(os.environ.get('PAGINAS_CACHE_TTL', 300))
+    PAGINAS_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+    # Plantillas (ver fragmentos.py): bytecode compilado compartido por los workers y
+    # caché en memoria de los bloques {% cache %}
+    JINJA_BYTECODE_DIR = os.environ.get('JINJA_BYTECODE_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'var', 'jinja')
+    FRAGMENTOS_TTL = 600.0        # Segundos por defecto de un fragmento sin TTL explícito
+    FRAGMENTOS_MAX_ENTRADAS = 500
+
+    # Cola write-behind de reservas, reclamaciones y contacto (ver cola_formularios.py)
+    COLA_DIR = os.environ.get('COLA_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'var', 'cola')
+    COLA_LOTE = 100          # Entradas por transacción al vaciar la cola
+    COLA_INTERVALO = 1.0     # Segundos entre revisiones si nadie avisa de una entrada nueva
+
+    # Correos salientes (ver notificaciones.py); sin SMTP_HOST quedan en la bandeja sin enviarse
+    SMTP_HOST = os.environ.get('SMTP_HOST')
+    SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+    SMTP_USER = os.environ.get('SMTP_USER')
+    SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
+    SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '1') == '1'
+    MAIL_REMITENTE = os.environ.get('MAIL_REMITENTE', 'Sumak Mikuy <reservas@sumakmikuy.com>')
+    MAIL_BUZON = os.environ.get('MAIL_BUZON', 'contacto@sumakmikuy.com')  # Recibe los mensajes de contacto
+    NOTIF_HILOS = 1          # Hilos de envío por proceso, cada uno con su conexión SMTP
+    NOTIF_LOTE = 20          # Avisos reclamados por vuelta
+    NOTIF_POR_MINUTO = 60    # Límite de envíos del proveedor; solo un proceso envía, así que es el total
+    NOTIF_MAX_INTENTOS = 6   # Fallos temporales antes de dar el aviso por perdido
+
+    # Segundos entre pasadas del hilo que agrega los pedidos cerrados en los rollups de /admin/reportes
+    REPORTES_INTERVALO = 60.0
+
+    # Máximo de líneas aceptadas en una sola comanda
+    COMANDA_MAX_ITEMS = 50
+
+    # Claves de idempotencia de /moza/comandas/new recordadas por cada worker
+    # (ver comandas.ClavesComanda); las demás se buscan en MySQL
+    COMANDA_CLAVES_TTL = 600.0
+    COMANDA_CLAVES_MAX = 5000
+
+    # Pantalla de la cocina (ver cocina.py)
+    COCINA_TIEMPO_DEFECTO_MIN = 15  # Preparación de los ítems sin tiempo propio (menú del día)
+    COCINA_REFRESCO = 30.0          # Segundos entre recargas de la cola aunque no lleguen eventos
+
+    # Eventos en vivo para las tablets (ver eventos.py)
+    EVENTOS_HEARTBEAT = 15.0   # Segundos entre latidos cuando no hay cambios
+    EVENTOS_MAX_BUFFER = 100   # Eventos pendientes por cliente antes de pedirle resincronizar
+
+    # Instrumentación (ver metricas.py)
+    SQL_SLOW_QUERY_MS = float(os.environ.get('SQL_SLOW_QUERY_MS', 200))  # Umbral del log de consultas lentas
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Bearer token para que Prometheus lea /admin/metrics sin sesión
+
     # Roles de usuario para fácil referencia
     ROLES = {
         'ADMIN': 'admin',
@@ -23,9 +97,6 @@ class Config:
     LOGIN_SUCCESS_REDIRECT = {
         'admin': '/admin/dashboard',
         'moza': '/moza/comandas',
+        'cocina': '/cocina',
         'cliente': '/' # Los clientes no tienen dashboard dedicado en este sistema
     }
-
-# Simulación de la clave secreta para el entorno local
-if not os.environ.get('SECRET_KEY'):
-    print("ADVERTENCIA: Usando clave secreta por defecto. Define SECRET_KEY en producción.")
\ No newline at end of file
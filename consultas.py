@@ -0,0 +1,372 @@
+"""
+Sentencias SQL con nombre de las rutas, ejecutadas como prepared statements.
+
+Cada sentencia de SENTENCIAS se prepara en el servidor la primera vez que se
+usa en una conexión del pool; el cursor preparado queda guardado en esa
+conexión y las llamadas siguientes solo envían los parámetros (MySQL no vuelve
+a analizar el SQL). Si la conexión se reabre (`ping(reconnect=True)` cambia su
+`connection_id`) las sentencias se preparan de nuevo.
+
+Las rutas llaman a las funciones de este módulo (`usuario_para_login(conn, ...)`,
+`cerrar_pedido(conn, ...)`) con la conexión de `get_db_connection()`. Las
+consultas que arman su SQL según los filtros (paginación, exportaciones,
+contadores) y las escrituras en lote de la cola de formularios siguen usando
+cursores normales.
+
+Límite a tener en cuenta: MySQL admite `max_prepared_stmt_count` sentencias
+preparadas en total (16382 por defecto); cada conexión del pool prepara como
+mucho len(SENTENCIAS).
+"""
+from mysql.connector import Error
+
+SENTENCIAS = {
+    # --- usuarios ---
+    'usuario_para_login': """
+        SELECT id, email, password, rol, nombres FROM usuarios WHERE email = %s AND rol IN (%s, %s, %s)
+    """,
+    'crear_usuario': """
+        INSERT INTO usuarios (nombres, apellidos, email, password, rol, status)
+        VALUES (%s, %s, %s, %s, %s, 'activo')
+    """,
+    'actualizar_usuario': """
+        UPDATE usuarios SET nombres = %s, apellidos = %s, email = %s, rol = %s, status = %s WHERE id = %s
+    """,
+    'desactivar_usuario': "UPDATE usuarios SET status = 'inactivo' WHERE id = %s",
+
+    # --- platos y categorías ---
+    'categorias': "SELECT id, nombre FROM categorias_menu ORDER BY nombre",
+    'nombre_plato': "SELECT nombre FROM platos WHERE id = %s",
+    'crear_plato': """
+        INSERT INTO platos (categoria_id, nombre, descripcion, precio, tiempo_preparacion_min, es_vegetariano, status)
+        VALUES (%s, %s, %s, %s, %s, %s, 'disponible')
+    """,
+    'actualizar_plato': """
+        UPDATE platos SET
+            nombre = %s, descripcion = %s, precio = %s, categoria_id = %s,
+            es_vegetariano = %s, tiempo_preparacion_min = %s, status = 'disponible'
+        WHERE id = %s
+    """,
+    'marcar_plato_agotado': "UPDATE platos SET status = 'agotado' WHERE id = %s",
+
+    # --- mesas y pedidos ---
+    'version_actual': "SELECT version, menu_version FROM sync_estado WHERE id = 1",
+    'pedido': "SELECT id, mesa_id, total, status, fecha_pedido FROM pedidos WHERE id = %s",
+    'pedido_por_clave': "SELECT id, mesa_id, total FROM pedidos WHERE clave_idempotencia = %s",
+    'bloquear_pedido': """
+        SELECT p.mesa_id, p.total, p.status, m.status AS mesa_status
+        FROM pedidos p JOIN mesas m ON m.id = p.mesa_id
+        WHERE p.id = %s
+        FOR UPDATE
+    """,
+    'bloquear_mesa': "SELECT status FROM mesas WHERE id = %s FOR UPDATE",
+    'bloquear_mesas': "SELECT id FROM mesas ORDER BY id FOR UPDATE",
+    'items_pedido': """
+        SELECT
+            dp.id AS detalle_id,
+            dp.cantidad,
+            dp.precio_unitario,
+            dp.status AS item_status,
+            COALESCE(p.nombre, 'Menú del Día') AS nombre_item,
+            dp.plato_id,
+            dp.menu_dia_id
+        FROM detalle_pedido dp
+        LEFT JOIN platos p ON dp.plato_id = p.id
+        WHERE dp.pedido_id = %s
+        ORDER BY dp.detalle_id
+    """,
+    'cerrar_pedido': """
+        UPDATE pedidos
+        SET status = 'cerrado', fecha_cierre = NOW(), usuario_cierre_id = %s, sync_version = %s
+        WHERE id = %s
+    """,
+    'otros_pedidos_abiertos': """
+        SELECT COUNT(*) AS pedidos FROM pedidos
+        WHERE mesa_id = %s AND id <> %s AND status IN ('abierto', 'en_preparacion', 'listo_pago')
+    """,
+    'liberar_mesa': "UPDATE mesas SET status = 'disponible', sync_version = %s WHERE id = %s",
+
+    # --- reservas ---
+    'bloquear_reserva': "SELECT guests, reserva_at, status FROM reservas WHERE id = %s FOR UPDATE",
+    'confirmar_reserva': "UPDATE reservas SET status = 'confirmada', mesa_asignada_id = %s WHERE id = %s",
+    'cancelar_reserva': "UPDATE reservas SET status = 'cancelada', mesa_asignada_id = NULL WHERE id = %s",
+    'confirmar_reserva_pendiente': """
+        UPDATE reservas SET status = 'confirmada', mesa_asignada_id = %s WHERE id = %s AND status = 'pendiente'
+    """,
+
+    # --- cocina ---
+    'cola_cocina': """
+        SELECT
+            dp.id AS detalle_id,
+            dp.pedido_id,
+            dp.cantidad,
+            dp.status,
+            dp.inicio_preparacion,
+            dp.listo_at,
+            COALESCE(pl.nombre, 'Menú del Día') AS nombre_item,
+            pl.tiempo_preparacion_min,
+            p.fecha_pedido,
+            p.mesa_id,
+            m.numero_mesa AS mesa
+        FROM pedidos p
+        JOIN detalle_pedido dp ON dp.pedido_id = p.id
+        JOIN mesas m ON m.id = p.mesa_id
+        LEFT JOIN platos pl ON pl.id = dp.plato_id
+        WHERE p.status IN ('abierto', 'en_preparacion') AND dp.status IN ('pendiente', 'en_preparacion', 'listo')
+    """,
+    'bloquear_linea': """
+        SELECT p.id AS pedido_id, p.mesa_id, p.status AS pedido_status, p.total
+        FROM detalle_pedido dp JOIN pedidos p ON p.id = dp.pedido_id
+        WHERE dp.id = %s
+        FOR UPDATE
+    """,
+    'cambiar_estado_linea': """
+        UPDATE detalle_pedido
+        SET status = %s,
+            inicio_preparacion = CASE %s WHEN 'en_preparacion' THEN NOW() WHEN 'pendiente' THEN NULL
+                                 ELSE inicio_preparacion END,
+            listo_at = IF(%s = 'listo', NOW(), listo_at)
+        WHERE id = %s AND status = %s
+    """,
+    'avance_pedido': """
+        SELECT
+            COUNT(*) AS lineas,
+            COUNT(listo_at) AS listas,
+            SUM(status = 'entregado') AS entregadas,
+            TIMESTAMPDIFF(SECOND, MIN(p.fecha_pedido), MAX(dp.listo_at)) AS ticket_segundos
+        FROM detalle_pedido dp JOIN pedidos p ON p.id = dp.pedido_id
+        WHERE dp.pedido_id = %s
+    """,
+    'cambiar_estado_pedido': "UPDATE pedidos SET status = %s, sync_version = %s WHERE id = %s",
+    'ticket_promedio_hoy': """
+        SELECT COUNT(*) AS tickets, AVG(segundos) AS promedio_segundos
+        FROM (
+            SELECT TIMESTAMPDIFF(SECOND, MIN(p.fecha_pedido), MAX(dp.listo_at)) AS segundos
+            FROM pedidos p JOIN detalle_pedido dp ON dp.pedido_id = p.id
+            WHERE p.fecha_pedido >= CURDATE()
+            GROUP BY p.id
+            HAVING COUNT(*) = COUNT(dp.listo_at)
+        ) AS tickets
+    """,
+}
+
+# Atributo de la conexión de mysql.connector donde se guardan sus cursores preparados
+_ATRIBUTO = '_sumak_sentencias'
+
+
+def _cursor(conn, nombre):
+    """Cursor preparado de `nombre` para esta conexión; lo crea la primera vez."""
+    cruda = getattr(conn, 'cruda', conn)
+    cache = getattr(cruda, _ATRIBUTO, None)
+    if cache is None or cache[0] != cruda.connection_id:
+        cache = (cruda.connection_id, {})
+        setattr(cruda, _ATRIBUTO, cache)
+    cursor = cache[1].get(nombre)
+    if cursor is None:
+        cursor = cache[1][nombre] = conn.cursor(prepared=True, dictionary=True)
+    return cursor
+
+
+def _descartar(conn, nombre):
+    cruda = getattr(conn, 'cruda', conn)
+    cache = getattr(cruda, _ATRIBUTO, None)
+    cursor = cache[1].pop(nombre, None) if cache else None
+    if cursor is not None:
+        try:
+            cursor.close()
+        except Error:
+            pass
+
+
+def _ejecutar(conn, nombre, params=()):
+    cursor = _cursor(conn, nombre)
+    try:
+        # Se pasa siempre el mismo objeto str: el cursor reutiliza la sentencia
+        # preparada solo si la operación es idéntica (`is`) a la anterior
+        cursor.execute(SENTENCIAS[nombre], params)
+    except Error:
+        # No se sabe en qué quedó la sentencia en el servidor: se prepara de nuevo
+        _descartar(conn, nombre)
+        raise
+    return cursor
+
+
+def filas(conn, nombre, params=()):
+    """Todas las filas (dicts) de una consulta con nombre."""
+    return _ejecutar(conn, nombre, params).fetchall()
+
+
+def fila(conn, nombre, params=()):
+    """La primera fila (dict) de una consulta con nombre, o None."""
+    resultado = filas(conn, nombre, params)
+    return resultado[0] if resultado else None
+
+
+def ejecutar(conn, nombre, params=()):
+    """Ejecuta una escritura con nombre; retorna las filas afectadas."""
+    return _ejecutar(conn, nombre, params).rowcount
+
+
+def preparar(conn):
+    """
+    Prepara en `conn` las consultas de lectura ejecutándolas una vez, con NULL
+    en cada parámetro (las escrituras y las lecturas con bloqueo no se tocan).
+    Para el calentamiento del worker; retorna cuántas preparó.
+    """
+    lecturas = [nombre for nombre, sql in SENTENCIAS.items()
+                if sql.lstrip().upper().startswith('SELECT') and 'FOR UPDATE' not in sql]
+    for nombre in lecturas:
+        filas(conn, nombre, (None,) * SENTENCIAS[nombre].count('%s'))
+    return len(lecturas)
+
+
+# -----------------------------------------------------
+# Usuarios
+# -----------------------------------------------------
+def usuario_para_login(conn, email, roles):
+    return fila(conn, 'usuario_para_login', (email, *roles))
+
+
+def crear_usuario(conn, nombres, apellidos, email, password, rol):
+    return ejecutar(conn, 'crear_usuario', (nombres, apellidos, email, password, rol))
+
+
+def actualizar_usuario(conn, user_id, nombres, apellidos, email, rol, status):
+    return ejecutar(conn, 'actualizar_usuario', (nombres, apellidos, email, rol, status, user_id))
+
+
+def desactivar_usuario(conn, user_id):
+    return ejecutar(conn, 'desactivar_usuario', (user_id,))
+
+
+# -----------------------------------------------------
+# Platos y categorías
+# -----------------------------------------------------
+def categorias(conn):
+    return filas(conn, 'categorias')
+
+
+def nombre_plato(conn, plato_id):
+    resultado = fila(conn, 'nombre_plato', (plato_id,))
+    return resultado['nombre'] if resultado else None
+
+
+def crear_plato(conn, categoria_id, nombre, descripcion, precio, tiempo, es_vegetariano):
+    return ejecutar(conn, 'crear_plato', (categoria_id, nombre, descripcion, precio, tiempo, es_vegetariano))
+
+
+def actualizar_plato(conn, plato_id, nombre, descripcion, precio, categoria_id, es_vegetariano, tiempo):
+    return ejecutar(conn, 'actualizar_plato',
+                    (nombre, descripcion, precio, categoria_id, es_vegetariano, tiempo, plato_id))
+
+
+def marcar_plato_agotado(conn, plato_id):
+    return ejecutar(conn, 'marcar_plato_agotado', (plato_id,))
+
+
+# -----------------------------------------------------
+# Mesas y pedidos
+# -----------------------------------------------------
+def version_actual(conn):
+    """(version, menu_version) vigentes; ver sincronizacion.py."""
+    resultado = fila(conn, 'version_actual')
+    if resultado is None:
+        return 0, 0
+    return resultado['version'], resultado['menu_version']
+
+
+def pedido(conn, pedido_id):
+    return fila(conn, 'pedido', (pedido_id,))
+
+
+def items_pedido(conn, pedido_id):
+    return filas(conn, 'items_pedido', (pedido_id,))
+
+
+def pedido_por_clave(conn, clave):
+    """El pedido registrado con esa clave de idempotencia, o None."""
+    return fila(conn, 'pedido_por_clave', (clave,))
+
+
+def bloquear_pedido(conn, pedido_id):
+    """Mesa, total y estado del pedido y de su mesa, con ambas filas bloqueadas hasta el commit (o None)."""
+    return fila(conn, 'bloquear_pedido', (pedido_id,))
+
+
+def bloquear_mesa(conn, mesa_id):
+    """Estado de la mesa, bloqueada hasta el commit; None si no existe."""
+    resultado = fila(conn, 'bloquear_mesa', (mesa_id,))
+    return resultado['status'] if resultado else None
+
+
+def bloquear_mesas(conn):
+    """Bloquea todas las mesas (asignación automática de reservas); retorna cuántas hay."""
+    return len(filas(conn, 'bloquear_mesas'))
+
+
+def cerrar_pedido(conn, pedido_id, usuario_id, version):
+    return ejecutar(conn, 'cerrar_pedido', (usuario_id, version, pedido_id))
+
+
+def otros_pedidos_abiertos(conn, mesa_id, pedido_id):
+    """Cuántos pedidos abiertos tiene la mesa aparte de `pedido_id`."""
+    return fila(conn, 'otros_pedidos_abiertos', (mesa_id, pedido_id))['pedidos']
+
+
+def liberar_mesa(conn, mesa_id, version):
+    return ejecutar(conn, 'liberar_mesa', (version, mesa_id))
+
+
+# -----------------------------------------------------
+# Reservas
+# -----------------------------------------------------
+def bloquear_reserva(conn, reserva_id):
+    """La reserva, bloqueada hasta el commit (ver transacciones.py), o None."""
+    return fila(conn, 'bloquear_reserva', (reserva_id,))
+
+
+def confirmar_reserva(conn, reserva_id, mesa_id):
+    return ejecutar(conn, 'confirmar_reserva', (mesa_id, reserva_id))
+
+
+def cancelar_reserva(conn, reserva_id):
+    return ejecutar(conn, 'cancelar_reserva', (reserva_id,))
+
+
+def confirmar_reservas_pendientes(conn, asignaciones):
+    """Confirma cada (reserva_id, mesa_id) que siga pendiente; retorna cuántas confirmó."""
+    return sum(ejecutar(conn, 'confirmar_reserva_pendiente', (mesa_id, reserva_id))
+               for reserva_id, mesa_id in asignaciones)
+
+
+# -----------------------------------------------------
+# Cocina
+# -----------------------------------------------------
+def cola_cocina(conn):
+    """Líneas por preparar, en preparación o listas para servir de los pedidos abiertos."""
+    return filas(conn, 'cola_cocina')
+
+
+def bloquear_linea(conn, detalle_id):
+    """Pedido de la línea, con la línea y el pedido bloqueados hasta el commit (o None)."""
+    return fila(conn, 'bloquear_linea', (detalle_id,))
+
+
+def cambiar_estado_linea(conn, detalle_id, desde, hacia):
+    """Pasa la línea de `desde` a `hacia`; retorna 0 si ya no estaba en `desde`."""
+    return ejecutar(conn, 'cambiar_estado_linea', (hacia, hacia, hacia, detalle_id, desde))
+
+
+def avance_pedido(conn, pedido_id):
+    return fila(conn, 'avance_pedido', (pedido_id,))
+
+
+def cambiar_estado_pedido(conn, pedido_id, status, version):
+    return ejecutar(conn, 'cambiar_estado_pedido', (status, version, pedido_id))
+
+
+def ticket_promedio_hoy(conn):
+    """(tickets completos hoy, segundos promedio del pedido hasta su último plato listo)."""
+    resultado = fila(conn, 'ticket_promedio_hoy')
+    if not resultado or not resultado['tickets']:
+        return 0, None
+    return resultado['tickets'], float(resultado['promedio_segundos'])
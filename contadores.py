@@ -0,0 +1,110 @@
+"""
+Contadores del dashboard mantenidos de forma incremental.
+
+Cada ruta de escritura llama a `ajustar()` dentro de su propia transacción, así
+el contador cambia (o no) junto con los datos. `reconciliar()` los recalcula
+con COUNT/SUM para corregir cualquier deriva; el dashboard solo lee la tabla.
+"""
+import threading
+import time
+from datetime import date
+
+from sincronizacion import ESTADOS_PEDIDO_ABIERTO
+
+NOMBRES = ('reservas_pendientes', 'platos_disponibles', 'pedidos_abiertos',
+           'mesas_ocupadas', 'mesas_totales', 'ingresos_hoy')
+
+# Contadores que se reinician cada día (la columna `fecha` indica a qué día corresponden)
+DIARIOS = ('ingresos_hoy',)
+
+
+def ajustar(cursor, **deltas):
+    """
+    Suma los deltas indicados en una sola sentencia. Un delta puede ser un número
+    o un par (expresión SQL, parámetros) que se evalúa en la misma sentencia,
+    útil cuando el cambio depende del estado previo de otra fila.
+    """
+    casos = []
+    params = []
+    for nombre, delta in deltas.items():
+        if isinstance(delta, tuple):
+            expresion, expresion_params = delta
+            casos.append(f"WHEN %s THEN {expresion}")
+            params.extend((nombre, *expresion_params))
+        else:
+            casos.append("WHEN %s THEN %s")
+            params.extend((nombre, delta))
+    if not casos:
+        return
+
+    placeholders = ', '.join(['%s'] * len(deltas))
+    # Los contadores diarios de otro día se reinician antes de sumar
+    cursor.execute(f"""
+        UPDATE contadores
+        SET valor = IF(fecha IS NULL OR fecha = CURDATE(), valor, 0) + CASE nombre {' '.join(casos)} ELSE 0 END,
+            fecha = IF(fecha IS NULL, NULL, CURDATE())
+        WHERE nombre IN ({placeholders})
+    """, (*params, *deltas))
+
+
+def leer(cursor):
+    """Retorna {nombre: valor}; los diarios de un día anterior valen 0."""
+    cursor.execute("SELECT nombre, valor, fecha FROM contadores")
+    hoy = date.today()
+    valores = {}
+    for row in cursor.fetchall():
+        nombre, valor, fecha = (row['nombre'], row['valor'], row['fecha']) if isinstance(row, dict) else row
+        valores[nombre] = 0 if fecha is not None and fecha != hoy else valor
+    return valores
+
+
+def reconciliar(cursor):
+    """Recalcula todos los contadores desde las tablas base. Retorna {nombre: (antes, después)} de los que derivaron."""
+    antes = leer(cursor)
+    placeholders = ', '.join(['%s'] * len(ESTADOS_PEDIDO_ABIERTO))
+    cursor.execute(f"""
+        SELECT
+            (SELECT COUNT(*) FROM reservas WHERE status = 'pendiente') AS reservas_pendientes,
+            (SELECT COUNT(*) FROM platos WHERE status = 'disponible') AS platos_disponibles,
+            (SELECT COUNT(*) FROM pedidos WHERE status IN ({placeholders})) AS pedidos_abiertos,
+            (SELECT COUNT(*) FROM mesas WHERE status = 'ocupada') AS mesas_ocupadas,
+            (SELECT COUNT(*) FROM mesas) AS mesas_totales,
+            (SELECT COALESCE(SUM(total), 0) FROM pedidos
+             WHERE status = 'cerrado' AND fecha_cierre >= CURDATE()
+               AND fecha_cierre < CURDATE() + INTERVAL 1 DAY) AS ingresos_hoy
+    """, ESTADOS_PEDIDO_ABIERTO)
+    row = cursor.fetchone()
+    if not isinstance(row, dict):
+        row = dict(zip([d[0] for d in cursor.description], row))
+    despues = {nombre: row[nombre] for nombre in NOMBRES}
+
+    cursor.execute(
+        "INSERT INTO contadores (nombre, valor, fecha) VALUES "
+        + ', '.join(['(%s, %s, %s)'] * len(despues))
+        + " ON DUPLICATE KEY UPDATE valor = VALUES(valor), fecha = VALUES(fecha)",
+        tuple(v for nombre, valor in despues.items()
+              for v in (nombre, valor, date.today() if nombre in DIARIOS else None)),
+    )
+    return {
+        nombre: (antes.get(nombre), valor)
+        for nombre, valor in despues.items()
+        if antes.get(nombre) != valor
+    }
+
+
+class Reconciliador:
+    """Decide cuándo toca reconciliar en este proceso (como mucho una vez cada `intervalo` segundos)."""
+
+    def __init__(self, intervalo=600.0):
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._ultima = None
+
+    def pendiente(self):
+        """True (una sola vez por intervalo, aunque haya peticiones concurrentes) si toca reconciliar."""
+        with self._lock:
+            ahora = time.monotonic()
+            if self._ultima is not None and ahora - self._ultima < self.intervalo:
+                return False
+            self._ultima = ahora
+            return True
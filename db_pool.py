@@ -0,0 +1,238 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import Error, errors
+
+
+class PoolAgotadoError(Error):
+    """No se liberó ninguna conexión del pool dentro del tiempo de espera."""
+
+
+class ConnectionPool:
+    """
+    Pool acotado de conexiones MySQL.
+
+    Las conexiones se crean bajo demanda hasta `size`, se prestan con
+    `connection()` (context manager) y vuelven al pool al salir del bloque.
+    Antes de reutilizar una conexión que lleva más de `ping_interval` segundos
+    ociosa se verifica con `ping(reconnect=True)`; las que superan `max_idle`
+    segundos sin uso se cierran al prestar otra o, si el proceso queda inactivo,
+    desde el hilo de `start_maintenance()`.
+    """
+
+    def __init__(self, connect_args, size=8, timeout=5.0, max_idle=300.0, ping_interval=30.0):
+        self._connect_args = dict(connect_args)
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.ping_interval = ping_interval
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conexion, instante_de_devolucion); la más reciente a la derecha
+        self._in_use = 0
+        self._pid = os.getpid()
+        self._maintenance_lock = threading.Lock()
+        self._maintenance_pid = None
+        self._counters = {
+            'creadas': 0,
+            'reutilizadas': 0,
+            'pings': 0,
+            'descartadas': 0,
+            'expiradas': 0,
+            'esperas': 0,
+            'timeouts': 0,
+        }
+
+    @classmethod
+    def from_config(cls, config):
+        """Construye el pool a partir de la configuración de Flask (no abre conexiones)."""
+        return cls(
+            {
+                'host': config['MYSQL_HOST'],
+                'user': config['MYSQL_USER'],
+                'password': config['MYSQL_PASSWORD'],
+                'database': config['MYSQL_DB'],
+                'port': config['MYSQL_PORT'],
+                # Una escritura bloqueada falla pronto (y se reintenta) en vez de ocupar el worker 50 s
+                'init_command': f"SET SESSION innodb_lock_wait_timeout = {int(config.get('MYSQL_LOCK_WAIT_TIMEOUT', 50))}",
+            },
+            size=config.get('MYSQL_POOL_SIZE', 8),
+            timeout=config.get('MYSQL_POOL_TIMEOUT', 5.0),
+            max_idle=config.get('MYSQL_POOL_MAX_IDLE', 300.0),
+            ping_interval=config.get('MYSQL_POOL_PING_INTERVAL', 30.0),
+        )
+
+    # -----------------------------------------------------
+    # Préstamo y devolución
+    # -----------------------------------------------------
+    @contextmanager
+    def connection(self):
+        """Presta una conexión y la devuelve (con rollback si quedó una transacción abierta)."""
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except (errors.OperationalError, errors.InterfaceError, GeneratorExit):
+            # La conexión pudo quedar en un estado inconsistente (o, si se cortó una
+            # respuesta en streaming, con un resultado sin leer): no se reutiliza.
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def acquire(self):
+        """Toma una conexión libre, crea una nueva si hay cupo o espera hasta `timeout`."""
+        deadline = time.monotonic() + self.timeout
+        expired = []
+        conn = None
+        last_used = None
+
+        with self._cond:
+            self._reset_after_fork()
+            while True:
+                expired.extend(self._pop_expired(time.monotonic()))
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._in_use < self.size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolAgotadoError(
+                        msg=f"Pool de conexiones agotado ({self.size} en uso) tras {self.timeout}s de espera."
+                    )
+                self._counters['esperas'] += 1
+                self._cond.wait(remaining)
+            self._in_use += 1
+
+        self._close_quietly(expired)
+
+        try:
+            if conn is None:
+                conn = mysql.connector.connect(**self._connect_args)
+                self._count('creadas')
+            else:
+                if time.monotonic() - last_used > self.ping_interval:
+                    conn.ping(reconnect=True, attempts=2, delay=0)
+                    self._count('pings')
+                self._count('reutilizadas')
+        except Error:
+            self._close_quietly([conn] if conn is not None else [])
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn, discard=False):
+        """Devuelve una conexión al pool o la cierra si está dañada."""
+        if not discard:
+            try:
+                if conn.unread_result:
+                    # Un resultado sin buffer a medio leer: la próxima consulta fallaría
+                    discard = True
+                elif conn.in_transaction:
+                    conn.rollback()
+            except Error:
+                discard = True
+
+        with self._cond:
+            forked = os.getpid() != self._pid
+            if not forked:
+                self._in_use -= 1
+            if discard or forked:
+                self._counters['descartadas'] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            self._cond.notify()
+
+        if conn is not None and not forked:
+            self._close_quietly([conn])
+
+    # -----------------------------------------------------
+    # Mantenimiento
+    # -----------------------------------------------------
+    def evict_idle(self):
+        """Cierra las conexiones ociosas que superan `max_idle`. Retorna cuántas cerró."""
+        with self._cond:
+            self._reset_after_fork()
+            expired = self._pop_expired(time.monotonic())
+        self._close_quietly(expired)
+        return len(expired)
+
+    def close_all(self):
+        """Cierra todas las conexiones ociosas (las prestadas se cierran al devolverse)."""
+        with self._cond:
+            self._reset_after_fork()
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+        self._close_quietly(idle)
+
+    def start_maintenance(self, interval=None):
+        """
+        Arranca (una vez por proceso, también tras un fork) un hilo que llama a
+        `evict_idle()` cada `interval` segundos (por defecto `max_idle / 2`), para
+        que un worker sin tráfico no retenga conexiones que MySQL ya cortó.
+        """
+        if self._maintenance_pid == os.getpid():
+            return
+        with self._maintenance_lock:
+            if self._maintenance_pid == os.getpid():
+                return
+            interval = interval or max(1.0, self.max_idle / 2)
+            threading.Thread(target=self._maintenance_loop, args=(interval,),
+                             name='pool-mantenimiento', daemon=True).start()
+            self._maintenance_pid = os.getpid()
+
+    def stats(self):
+        """Fotografía del estado del pool para diagnóstico."""
+        with self._cond:
+            return {
+                'tamano': self.size,
+                'en_uso': self._in_use,
+                'ociosas': len(self._idle),
+                **self._counters,
+            }
+
+    # -----------------------------------------------------
+    # Internos
+    # -----------------------------------------------------
+    def _pop_expired(self, now):
+        # Las más antiguas están a la izquierda; el préstamo es LIFO, así que
+        # las conexiones sobrantes tras un pico de carga terminan expirando aquí.
+        expired = []
+        while self._idle and now - self._idle[0][1] > self.max_idle:
+            expired.append(self._idle.popleft()[0])
+        self._counters['expiradas'] += len(expired)
+        return expired
+
+    def _maintenance_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            self.evict_idle()
+
+    def _reset_after_fork(self):
+        # Un proceso hijo no debe compartir sockets con el padre: se olvidan sin
+        # cerrarlos (cerrar enviaría COM_QUIT por el socket del padre).
+        if os.getpid() != self._pid:
+            self._idle.clear()
+            self._in_use = 0
+            self._pid = os.getpid()
+
+    def _count(self, key):
+        with self._cond:
+            self._counters[key] += 1
+
+    @staticmethod
+    def _close_quietly(conns):
+        for conn in conns:
+            try:
+                conn.close()
+            except Error:
+                pass
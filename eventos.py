@@ -0,0 +1,100 @@
+import json
+import threading
+from collections import deque
+
+
+class Suscripcion:
+    """Buffer acotado de eventos pendientes para un cliente SSE."""
+
+    def __init__(self, max_eventos):
+        self.max_eventos = max_eventos
+        self._cond = threading.Condition()
+        self._buffer = deque()
+        self.desbordada = False
+
+    def push(self, evento):
+        with self._cond:
+            if len(self._buffer) >= self.max_eventos:
+                # Cliente lento: se descarta lo acumulado y se le pide resincronizar
+                self._buffer.clear()
+                self.desbordada = True
+            self._buffer.append(evento)
+            self._cond.notify()
+
+    def esperar(self, timeout):
+        """Bloquea hasta `timeout` segundos; retorna (eventos, desbordada)."""
+        with self._cond:
+            if not self._buffer:
+                self._cond.wait(timeout)
+            eventos = list(self._buffer)
+            self._buffer.clear()
+            desbordada, self.desbordada = self.desbordada, False
+            return eventos, desbordada
+
+
+class BusEventos:
+    """
+    Publicación de cambios de mesas y comandas hacia las tablets (Server-Sent Events).
+
+    Cada cliente conectado tiene su propio buffer de como máximo `max_eventos`;
+    si se llena, se vacía y el cliente recibe un evento `resync`. El bus vive
+    en memoria del proceso: solo llega a los clientes conectados a este worker.
+    """
+
+    def __init__(self, max_eventos=100, heartbeat=15.0):
+        self.max_eventos = max_eventos
+        self.heartbeat = heartbeat
+        self._lock = threading.Lock()
+        self._suscripciones = set()
+        self._seq = 0
+
+    def publicar(self, tipo, datos):
+        """Envía un evento a todos los clientes conectados."""
+        with self._lock:
+            self._seq += 1
+            evento = (self._seq, tipo, datos)
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            suscripcion.push(evento)
+
+    def suscribir(self):
+        suscripcion = Suscripcion(self.max_eventos)
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    @property
+    def clientes(self):
+        with self._lock:
+            return len(self._suscripciones)
+
+    def stream(self):
+        """Generador del cuerpo `text/event-stream` para un cliente."""
+        suscripcion = self.suscribir()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                eventos, desbordada = suscripcion.esperar(self.heartbeat)
+                if desbordada:
+                    yield formatear_evento(None, 'resync', {})
+                if not eventos and not desbordada:
+                    # Comentario SSE: mantiene viva la conexión a través de proxies
+                    yield ": heartbeat\n\n"
+                    continue
+                for seq, tipo, datos in eventos:
+                    yield formatear_evento(seq, tipo, datos)
+        finally:
+            self.cancelar(suscripcion)
+
+
+def formatear_evento(seq, tipo, datos):
+    lineas = []
+    if seq is not None:
+        lineas.append(f"id: {seq}")
+    lineas.append(f"event: {tipo}")
+    lineas.append(f"data: {json.dumps(datos, default=str)}")
+    return '\n'.join(lineas) + '\n\n'
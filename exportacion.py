@@ -0,0 +1,109 @@
+"""
+Exportaciones completas en CSV o JSON Lines, enviadas en streaming.
+
+Las filas se leen con un cursor sin buffer (el resultado queda en el socket de
+MySQL y se consume por lotes con `fetchmany`), así que la memoria no depende
+del tamaño de la tabla. La cabecera sale antes de ejecutar la consulta para
+que el primer byte llegue de inmediato: en CSV la fila de títulos y en JSON
+Lines una primera línea `{"recurso": ..., "columnas": [...]}`.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from mysql.connector import errors
+
+LOTE = 500
+
+# recurso -> (tabla, columna de fecha para filtrar y ordenar, columna id de desempate, columnas exportadas)
+EXPORTACIONES = {
+    'reclamaciones': ('reclamaciones', 'fecha_registro', 'id_reclamacion', (
+        'id_reclamacion', 'codigo_reclamo', 'fecha_registro', 'estado', 'fecha_respuesta_limite',
+        'tipo_documento', 'numero_documento', 'nombre_consumidor', 'domicilio', 'telefono', 'email',
+        'tipo_bien', 'monto_reclamado', 'descripcion_bien', 'tipo_solicitud', 'detalle',
+        'pedido_consumidor', 'detalle_respuesta', 'fecha_respuesta',
+    )),
+    'pedidos': ('pedidos', 'fecha_pedido', 'id', (
+        'id', 'mesa_id', 'usuario_moza_id', 'fecha_pedido', 'fecha_cierre', 'usuario_cierre_id',
+        'total', 'metodo_pago', 'status',
+    )),
+    'reservas': ('reservas', 'reserva_at', 'id', (
+        'id', 'name', 'email', 'guests', 'reserva_at', 'status', 'mesa_asignada_id', 'usuario_id', 'notas',
+    )),
+}
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def _valor_json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, (bytes, bytearray)):
+        return valor.decode('utf-8', 'replace')
+    raise TypeError(f'No serializable: {type(valor).__name__}')
+
+
+def consulta(recurso, desde=None, hasta=None):
+    """SQL y parámetros de la exportación; `hasta` es inclusivo (día completo)."""
+    tabla, columna_fecha, columna_id, columnas = EXPORTACIONES[recurso]
+    where, params = [], []
+    if desde:
+        where.append(f"{columna_fecha} >= %s")
+        params.append(desde)
+    if hasta:
+        where.append(f"{columna_fecha} < %s")
+        params.append(hasta + timedelta(days=1))
+    sql = f"SELECT {', '.join(columnas)} FROM {tabla}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {columna_fecha}, {columna_id}"
+    return sql, params, columnas
+
+
+def generar(connection_factory, recurso, formato, desde=None, hasta=None):
+    """
+    Generador de trozos de texto listo para `Response`. Si el cliente corta la
+    descarga o falla un lote, el cursor se cierra igual; las filas que quedaron
+    sin leer en el socket hacen que el pool descarte la conexión.
+    """
+    sql, params, columnas = consulta(recurso, desde, hasta)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    if formato == 'csv':
+        writer.writerow(columnas)
+        yield buffer.getvalue()
+    else:
+        yield json.dumps({'recurso': recurso, 'columnas': list(columnas)}, ensure_ascii=False) + '\n'
+
+    with connection_factory() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            while True:
+                filas = cursor.fetchmany(LOTE)
+                if not filas:
+                    break
+                buffer.seek(0)
+                buffer.truncate()
+                if formato == 'csv':
+                    writer.writerows(filas)
+                else:
+                    for fila in filas:
+                        buffer.write(json.dumps(dict(zip(columnas, fila)), default=_valor_json, ensure_ascii=False))
+                        buffer.write('\n')
+                yield buffer.getvalue()
+        finally:
+            try:
+                cursor.close()
+            except errors.InternalError:
+                # "Unread result found": leer el resto costaría tanto como la exportación;
+                # ConnectionPool.release descarta la conexión con el resultado pendiente.
+                pass
@@ -0,0 +1,121 @@
+"""
+Caché de fragmentos de plantilla y caché de bytecode de Jinja.
+
+En una plantilla:
+
+    {% cache ('catalogo', 'carta_moza', carta_clave), 600 %}
+        ... HTML que solo depende del catálogo ...
+    {% endcache %}
+
+La clave es una expresión (una tupla o un texto) y el segundo argumento,
+opcional, el TTL en segundos. El primer elemento de la tupla es el grupo:
+`CacheFragmentos.invalidar('catalogo')` descarta todos los fragmentos de ese
+grupo cuando cambian los datos que muestran. Conviene incluir en la clave una
+versión de esos datos: otro worker no recibe la invalidación, pero una
+versión nueva genera una clave nueva.
+
+Un fragmento cacheado no debe mostrar nada propio de la petición (usuario,
+flash, token): se comparte entre todos los que piden la misma clave.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+
+class CacheFragmentos:
+    """LRU en memoria de fragmentos HTML (Markup), con TTL y agrupados para invalidar."""
+
+    def __init__(self, ttl=300.0, max_entradas=500):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._fragmentos = OrderedDict()  # clave -> (expira, html)
+        self._aciertos = 0
+        self._fallos = 0
+        self._invalidaciones = 0
+
+    @staticmethod
+    def _grupo(clave):
+        return clave[0] if isinstance(clave, tuple) else clave
+
+    def obtener_o_generar(self, clave, ttl, generar):
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._fragmentos.get(clave)
+            if entrada is not None and entrada[0] > ahora:
+                self._fragmentos.move_to_end(clave)
+                self._aciertos += 1
+                return entrada[1]
+            self._fallos += 1
+
+        # Se genera fuera del lock: dos peticiones simultáneas pueden generar el
+        # mismo fragmento, pero ninguna espera a la otra
+        html = generar()
+        with self._lock:
+            self._fragmentos[clave] = (ahora + (self.ttl if ttl is None else ttl), html)
+            self._fragmentos.move_to_end(clave)
+            while len(self._fragmentos) > self.max_entradas:
+                self._fragmentos.popitem(last=False)
+        return html
+
+    def invalidar(self, grupo=None):
+        """Descarta los fragmentos del grupo (todos si `grupo` es None)."""
+        with self._lock:
+            if grupo is None:
+                self._fragmentos.clear()
+            else:
+                for clave in [c for c in self._fragmentos if self._grupo(c) == grupo]:
+                    del self._fragmentos[clave]
+            self._invalidaciones += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entradas': len(self._fragmentos),
+                'aciertos': self._aciertos,
+                'fallos': self._fallos,
+                'invalidaciones': self._invalidaciones,
+            }
+
+
+class ExtensionCache(Extension):
+    """Etiqueta `{% cache clave[, ttl] %}...{% endcache %}`; usa `environment.cache_fragmentos`."""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(cache_fragmentos=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        cuerpo = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_renderizar', args), [], [], cuerpo).set_lineno(lineno)
+
+    def _renderizar(self, clave, ttl, caller):
+        cache = self.environment.cache_fragmentos
+        if cache is None:
+            return caller()
+        if isinstance(clave, list):
+            clave = tuple(clave)
+        return cache.obtener_o_generar(clave, ttl, caller)
+
+
+def configurar(jinja_env, cache, directorio_bytecode=None):
+    """Registra la etiqueta `cache` y, si se indica un directorio, la caché de bytecode en disco."""
+    jinja_env.add_extension(ExtensionCache)
+    jinja_env.cache_fragmentos = cache
+    if directorio_bytecode:
+        # Compartida por los workers: Jinja escribe cada archivo de forma atómica
+        # y lo descarta si la plantilla cambió
+        os.makedirs(directorio_bytecode, exist_ok=True)
+        jinja_env.bytecode_cache = FileSystemBytecodeCache(directorio_bytecode, '%s.jinja.cache')
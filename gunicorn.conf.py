@@ -0,0 +1,25 @@
+"""
+Configuración de gunicorn:
+
+    gunicorn -c gunicorn.conf.py
+
+El maestro construye la app con `create_app()` una sola vez (preload_app):
+servicios, plantillas compiladas y manifest quedan en memoria antes del fork.
+Cada worker, ya en su propio proceso, ejecuta `calentar(app)` (conexión del
+pool, consultas preparadas, catálogo, hilos de fondo) antes de aceptar peticiones.
+"""
+import os
+
+wsgi_app = 'app:create_app()'
+preload_app = True
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+# Hilos por worker: /moza/stream (SSE) mantiene una conexión abierta por tablet
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+
+
+def post_fork(server, worker):
+    from app import calentar
+
+    calentar(server.app.wsgi())
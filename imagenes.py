@@ -0,0 +1,182 @@
+"""
+Variantes responsive de las imágenes de static/images.
+
+Paso de build (requiere Pillow con soporte WebP/AVIF):
+
+    python imagenes.py                 # o: flask --app app construir-imagenes
+
+Genera en static/build/images una versión AVIF y otra WebP por cada ancho de
+ANCHOS (sin ampliar nunca el original), con el hash del contenido en el nombre,
+y un manifest.json que el helper `imagen()` de las plantillas usa para emitir
+`<picture>` con `srcset`/`sizes`. Las imágenes cuyo original no cambió no se
+vuelven a codificar.
+"""
+import hashlib
+import html
+import io
+import json
+import os
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+ORIGEN = os.path.join(STATIC_DIR, 'images')
+DESTINO = os.path.join(STATIC_DIR, 'build', 'images')
+MANIFEST = os.path.join(DESTINO, 'manifest.json')
+
+ANCHOS = (480, 960, 1600)
+EXTENSIONES = ('.png', '.jpg', '.jpeg')
+# formato -> (tipo MIME, opciones de Pillow); AVIF primero: es el más liviano
+FORMATOS = {
+    'avif': ('image/avif', {'quality': 50, 'speed': 6}),
+    'webp': ('image/webp', {'quality': 78, 'method': 6}),
+}
+
+
+def _sha256(datos):
+    return hashlib.sha256(datos).hexdigest()
+
+
+def _codificar(imagen, formato, opciones):
+    salida = io.BytesIO()
+    imagen.save(salida, format=formato.upper(), **opciones)
+    return salida.getvalue()
+
+
+def construir(origen=ORIGEN, destino=DESTINO, anchos=ANCHOS, log=print):
+    """Genera las variantes que falten y reescribe el manifest. Retorna el manifest."""
+    from PIL import Image, ImageOps, features
+
+    formatos = {fmt: conf for fmt, conf in FORMATOS.items() if features.check(fmt)}
+    for fmt in FORMATOS.keys() - formatos.keys():
+        log(f"ADVERTENCIA: Pillow no soporta {fmt.upper()}; se omite ese formato.")
+
+    manifest_path = os.path.join(destino, 'manifest.json')
+    anterior = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            anterior = json.load(f)
+
+    os.makedirs(destino, exist_ok=True)
+    manifest = {}
+    vigentes = set()
+
+    for carpeta, _, archivos in os.walk(origen):
+        for archivo in sorted(archivos):
+            if not archivo.lower().endswith(EXTENSIONES):
+                continue
+            ruta = os.path.join(carpeta, archivo)
+            # Clave = ruta relativa a static/, la misma que se pasa a url_for('static', ...)
+            clave = os.path.relpath(ruta, STATIC_DIR).replace(os.sep, '/')
+            with open(ruta, 'rb') as f:
+                fuente_hash = _sha256(f.read())
+
+            previa = anterior.get(clave)
+            if (previa and previa['fuente'] == fuente_hash
+                    and set(previa['variantes']) == set(formatos)
+                    and all(os.path.exists(os.path.join(STATIC_DIR, url))
+                            for variantes in previa['variantes'].values() for _, url in variantes)):
+                manifest[clave] = previa
+                vigentes.update(url for variantes in previa['variantes'].values() for _, url in variantes)
+                continue
+
+            with Image.open(ruta) as original:
+                original = ImageOps.exif_transpose(original)
+                if original.mode not in ('RGB', 'RGBA'):
+                    original = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+                ancho, alto = original.size
+                objetivos = sorted({min(a, ancho) for a in anchos})
+
+                entrada = {'fuente': fuente_hash, 'ancho': ancho, 'alto': alto, 'variantes': {}}
+                nombre_base = os.path.splitext(os.path.relpath(ruta, origen))[0].replace(os.sep, '/')
+                for objetivo in objetivos:
+                    reducida = original if objetivo == ancho else original.resize(
+                        (objetivo, round(alto * objetivo / ancho)), Image.LANCZOS)
+                    for fmt, (_, opciones) in formatos.items():
+                        datos = _codificar(reducida, fmt, opciones)
+                        nombre = f"{nombre_base}-{objetivo}w.{_sha256(datos)[:10]}.{fmt}"
+                        destino_archivo = os.path.join(destino, nombre)
+                        os.makedirs(os.path.dirname(destino_archivo), exist_ok=True)
+                        with open(destino_archivo, 'wb') as f:
+                            f.write(datos)
+                        url = os.path.relpath(destino_archivo, STATIC_DIR).replace(os.sep, '/')
+                        entrada['variantes'].setdefault(fmt, []).append([objetivo, url])
+                        vigentes.add(url)
+
+            manifest[clave] = entrada
+            log(f"{clave}: {len(objetivos)} anchos x {len(formatos)} formatos")
+
+    # Variantes huérfanas de versiones anteriores
+    for carpeta, _, archivos in os.walk(destino):
+        for archivo in archivos:
+            ruta = os.path.join(carpeta, archivo)
+            url = os.path.relpath(ruta, STATIC_DIR).replace(os.sep, '/')
+            if ruta != manifest_path and url not in vigentes:
+                os.remove(ruta)
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, ensure_ascii=False, sort_keys=True)
+    return manifest
+
+
+class ImagenesResponsive:
+    """
+    Lee el manifest (y lo relee si cambió en disco) y arma el HTML `<picture>`.
+    Sin manifest o sin entrada para la imagen se emite un `<img>` simple.
+    """
+
+    def __init__(self, url_for, manifest_path=MANIFEST):
+        self._url_for = url_for
+        self._manifest_path = manifest_path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._manifest = {}
+
+    def _cargar(self):
+        try:
+            mtime = os.path.getmtime(self._manifest_path)
+        except OSError:
+            return {}
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    with open(self._manifest_path, encoding='utf-8') as f:
+                        self._manifest = json.load(f)
+                    self._mtime = mtime
+        return self._manifest
+
+    def __call__(self, filename, alt, sizes='100vw', clase='', lazy=True, **atributos):
+        """
+        Uso en plantillas: {{ imagen('images/chef.png', 'Chef', sizes='(min-width: 768px) 50vw, 100vw') }}.
+        `lazy=False` para la imagen principal (LCP) de la página.
+        """
+        from markupsafe import Markup
+
+        entrada = self._cargar().get(filename)
+        attrs = {'alt': alt, 'class': clase or None}
+        if lazy:
+            attrs.update(loading='lazy', decoding='async')
+        else:
+            attrs.update(fetchpriority='high', decoding='async')
+        if entrada:
+            attrs.update(width=entrada['ancho'], height=entrada['alto'])
+        attrs.update(atributos)
+
+        img = '<img src="{}" {}>'.format(
+            html.escape(self._url_for('static', filename=filename)),
+            ' '.join(f'{k.replace("_", "-")}="{html.escape(str(v))}"' for k, v in attrs.items() if v is not None),
+        )
+        if not entrada:
+            return Markup(img)
+
+        sources = []
+        for fmt, variantes in entrada['variantes'].items():
+            srcset = ', '.join(f"{self._url_for('static', filename=url)} {ancho}w" for ancho, url in variantes)
+            sources.append(
+                f'<source type="{FORMATOS[fmt][0]}" srcset="{html.escape(srcset)}" sizes="{html.escape(sizes)}">'
+            )
+        return Markup('<picture>' + ''.join(sources) + img + '</picture>')
+
+
+if __name__ == '__main__':
+    construir()
@@ -0,0 +1,225 @@
+import logging
+import re
+import threading
+import time
+
+from flask import g, has_request_context
+
+logger = logging.getLogger('sumak.sql')
+
+# Límites de los histogramas de latencia por ruta (segundos)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_RE_IN_LIST = re.compile(r"\bIN\s*\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)", re.IGNORECASE)
+_RE_VALUES_LIST = re.compile(r"(\([^()]*\))(?:\s*,\s*\([^()]*\))+")
+_RE_STRING = re.compile(r"'(?:[^'\\]|\\.)*'")
+_RE_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_SPACES = re.compile(r"\s+")
+
+
+def normalizar_sql(sql):
+    """Reduce una sentencia a su forma canónica: sin literales ni listas variables."""
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode('utf-8', 'replace')
+    sql = _RE_SPACES.sub(' ', sql).strip()
+    sql = _RE_STRING.sub('?', sql)
+    sql = _RE_NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _RE_IN_LIST.sub('IN (...)', sql)
+    sql = _RE_VALUES_LIST.sub(r'\1, ...', sql)
+    return sql[:300]
+
+
+class Metricas:
+    """Acumulador de métricas del proceso, exportable en formato de texto de Prometheus."""
+
+    def __init__(self, slow_query_ms=200.0):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._sentencias = {}  # sql -> [llamadas, segundos, filas]
+        self._rutas = {}       # (ruta, método) -> dict de acumulados
+
+    # -----------------------------------------------------
+    # Registro
+    # -----------------------------------------------------
+    def registrar_sql(self, sql, segundos, filas=0, contar=True):
+        """Suma una ejecución (o una lectura de filas si `contar=False`) a la sentencia y a la petición."""
+        with self._lock:
+            acumulado = self._sentencias.setdefault(sql, [0, 0.0, 0])
+            if contar:
+                acumulado[0] += 1
+            acumulado[1] += segundos
+            acumulado[2] += filas
+
+        if has_request_context():
+            stats = g.setdefault('sql_stats', {'consultas': 0, 'segundos': 0.0, 'filas': 0})
+            if contar:
+                stats['consultas'] += 1
+            stats['segundos'] += segundos
+            stats['filas'] += filas
+
+        if contar and segundos * 1000 >= self.slow_query_ms:
+            logger.warning("Consulta lenta (%.1f ms): %s", segundos * 1000, sql)
+
+    def observar_peticion(self, ruta, metodo, segundos, db_segundos, render_segundos, consultas):
+        with self._lock:
+            acumulado = self._rutas.get((ruta, metodo))
+            if acumulado is None:
+                acumulado = self._rutas[(ruta, metodo)] = {
+                    'buckets': [0] * len(BUCKETS), 'count': 0, 'sum': 0.0,
+                    'db': 0.0, 'render': 0.0, 'consultas': 0,
+                }
+            for i, limite in enumerate(BUCKETS):
+                if segundos <= limite:
+                    acumulado['buckets'][i] += 1
+            acumulado['count'] += 1
+            acumulado['sum'] += segundos
+            acumulado['db'] += db_segundos
+            acumulado['render'] += render_segundos
+            acumulado['consultas'] += consultas
+
+    # -----------------------------------------------------
+    # Exportación
+    # -----------------------------------------------------
+    def exportar(self, series=None):
+        """
+        Texto en formato de exposición de Prometheus (versión 0.0.4).
+        `series` añade valores externos: {nombre: (tipo, ayuda, valor)}.
+        """
+        with self._lock:
+            rutas = {clave: {**valor, 'buckets': list(valor['buckets'])} for clave, valor in self._rutas.items()}
+            sentencias = {sql: list(valor) for sql, valor in self._sentencias.items()}
+
+        lineas = [
+            '# HELP sumak_http_request_duration_seconds Latencia de las peticiones por ruta.',
+            '# TYPE sumak_http_request_duration_seconds histogram',
+        ]
+        for (ruta, metodo), valor in sorted(rutas.items()):
+            etiquetas = f'route="{_escapar(ruta)}",method="{metodo}"'
+            for limite, cantidad in zip(BUCKETS, valor['buckets']):
+                lineas.append(f'sumak_http_request_duration_seconds_bucket{{{etiquetas},le="{limite}"}} {cantidad}')
+            lineas.append(f'sumak_http_request_duration_seconds_bucket{{{etiquetas},le="+Inf"}} {valor["count"]}')
+            lineas.append(f'sumak_http_request_duration_seconds_sum{{{etiquetas}}} {valor["sum"]:.6f}')
+            lineas.append(f'sumak_http_request_duration_seconds_count{{{etiquetas}}} {valor["count"]}')
+
+        for nombre, clave, ayuda in (
+            ('sumak_http_db_seconds_total', 'db', 'Tiempo en MySQL por ruta.'),
+            ('sumak_http_render_seconds_total', 'render', 'Tiempo en render_template por ruta.'),
+            ('sumak_http_db_queries_total', 'consultas', 'Sentencias SQL ejecutadas por ruta.'),
+        ):
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} counter')
+            for (ruta, metodo), valor in sorted(rutas.items()):
+                numero = valor[clave]
+                numero = f'{numero:.6f}' if isinstance(numero, float) else numero
+                lineas.append(f'{nombre}{{route="{_escapar(ruta)}",method="{metodo}"}} {numero}')
+
+        for nombre, indice, ayuda in (
+            ('sumak_sql_calls_total', 0, 'Ejecuciones por sentencia normalizada.'),
+            ('sumak_sql_seconds_total', 1, 'Tiempo acumulado por sentencia normalizada.'),
+            ('sumak_sql_rows_total', 2, 'Filas leídas o afectadas por sentencia normalizada.'),
+        ):
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} counter')
+            for sql, valor in sorted(sentencias.items()):
+                numero = f'{valor[indice]:.6f}' if indice == 1 else valor[indice]
+                lineas.append(f'{nombre}{{statement="{_escapar(sql)}"}} {numero}')
+
+        for nombre, (tipo, ayuda, valor) in sorted((series or {}).items()):
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+            lineas.append(f'{nombre} {valor}')
+
+        return '\n'.join(lineas) + '\n'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+# -----------------------------------------------------
+# Envoltorios de conexión y cursor
+# -----------------------------------------------------
+class CursorInstrumentado:
+    """Cursor de mysql.connector que mide cada sentencia y las filas devueltas."""
+
+    def __init__(self, cursor, metricas):
+        self._cursor = cursor
+        self._metricas = metricas
+        self._sql = None
+
+    def execute(self, operation, params=(), *args, **kwargs):
+        self._sql = normalizar_sql(operation)
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            filas = 0 if self._cursor.with_rows else max(self._cursor.rowcount, 0)
+            self._metricas.registrar_sql(self._sql, time.perf_counter() - inicio, filas)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        self._sql = normalizar_sql(operation)
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            self._metricas.registrar_sql(self._sql, time.perf_counter() - inicio, max(self._cursor.rowcount, 0))
+
+    def _leer(self, metodo, *args):
+        inicio = time.perf_counter()
+        resultado = metodo(*args)
+        if resultado is None:
+            filas = 0
+        elif isinstance(resultado, list):
+            filas = len(resultado)
+        else:
+            filas = 1
+        self._metricas.registrar_sql(self._sql, time.perf_counter() - inicio, filas, contar=False)
+        return resultado
+
+    def fetchone(self):
+        return self._leer(self._cursor.fetchone)
+
+    def fetchmany(self, size=1):
+        return self._leer(self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        return self._leer(self._cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class ConexionInstrumentada:
+    """Conexión que entrega cursores instrumentados; el resto de atributos se delega."""
+
+    def __init__(self, conn, metricas):
+        self._conn = conn
+        self._metricas = metricas
+
+    @property
+    def cruda(self):
+        """La conexión de mysql.connector que presta el pool (dura más que este envoltorio)."""
+        return self._conn
+
+    def cursor(self, *args, **kwargs):
+        return CursorInstrumentado(self._conn.cursor(*args, **kwargs), self._metricas)
+
+    def commit(self):
+        inicio = time.perf_counter()
+        try:
+            self._conn.commit()
+        finally:
+            self._metricas.registrar_sql('COMMIT', time.perf_counter() - inicio)
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
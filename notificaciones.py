@@ -0,0 +1,369 @@
+"""
+Correos salientes con bandeja de salida (outbox) en MySQL.
+
+Las rutas nunca envían correo: dentro de su propia transacción agregan una
+fila a `notificaciones` (tipo de aviso + datos JSON). El
+`DespachadorNotificaciones` corre en hilos de fondo: reclama un lote de filas
+pendientes, las envía por una conexión SMTP que reutiliza entre lotes,
+respetando un límite de envíos por minuto, y marca el resultado. Con varios
+workers solo envía el proceso que tiene el bloqueo: el límite es del proveedor. Un fallo
+temporal reprograma el aviso con espera exponencial; un rechazo 5xx del
+servidor o agotar los intentos lo deja como 'fallida'.
+
+Para probar en local sin un servidor real:
+
+    python -m aiosmtpd -n -l localhost:8025
+    SMTP_HOST=localhost SMTP_PORT=8025 SMTP_STARTTLS=0 flask --app app enviar-notificaciones
+"""
+import json
+import logging
+import os
+import smtplib
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from email.message import EmailMessage
+
+logger = logging.getLogger('sumak.notificaciones')
+
+# tipo -> (asunto, cuerpo); se completan con los datos JSON de la fila
+PLANTILLAS = {
+    'reserva_recibida': (
+        "Recibimos tu reserva {recibo}",
+        "Hola {nombre}:\n\n"
+        "Recibimos tu solicitud de reserva para {personas} personas el {fecha}.\n"
+        "Te escribiremos apenas la confirmemos.\n\n"
+        "Código de reserva: {recibo}\n\n"
+        "Sumak Mikuy",
+    ),
+    'reserva_confirmada': (
+        "Tu reserva {recibo} está confirmada",
+        "Hola {nombre}:\n\n"
+        "Tu reserva para {personas} personas el {fecha} está confirmada. ¡Te esperamos!\n\n"
+        "Código de reserva: {recibo}\n\n"
+        "Sumak Mikuy",
+    ),
+    'reserva_cancelada': (
+        "Tu reserva {recibo} fue cancelada",
+        "Hola {nombre}:\n\n"
+        "Lamentamos informarte que tu reserva para el {fecha} fue cancelada.\n"
+        "Puedes hacer una nueva reserva en nuestra web o respondiendo este correo.\n\n"
+        "Sumak Mikuy",
+    ),
+    'contacto': (
+        "Nuevo mensaje de contacto de {nombre}",
+        "{mensaje}\n\n-- \n{nombre} <{email}>",
+    ),
+}
+
+
+def agregar(cursor, tipo, destinatario, datos, responder_a=None):
+    """Agrega un aviso a la bandeja de salida. `destinatario` None = buzón del restaurante."""
+    agregar_varios(cursor, [(tipo, destinatario, datos, responder_a)])
+
+
+def agregar_varios(cursor, avisos):
+    """Igual que `agregar` para una lista de (tipo, destinatario, datos, responder_a), en un solo INSERT."""
+    if avisos:
+        cursor.executemany(
+            "INSERT INTO notificaciones (tipo, destinatario, datos, responder_a) VALUES (%s, %s, %s, %s)",
+            [(tipo, destinatario, json.dumps(datos, ensure_ascii=False, default=str), responder_a)
+             for tipo, destinatario, datos, responder_a in avisos],
+        )
+
+
+def agregar_reservas(cursor, tipo, reserva_ids):
+    """Un aviso `tipo` por cada reserva de `reserva_ids`, armado en el mismo INSERT ... SELECT."""
+    if not reserva_ids:
+        return
+    cursor.execute(f"""
+        INSERT INTO notificaciones (tipo, destinatario, datos)
+        SELECT %s, email, JSON_OBJECT(
+            'nombre', name, 'personas', guests,
+            'fecha', DATE_FORMAT(reserva_at, '%%d/%%m/%%Y %%H:%%i'),
+            'recibo', COALESCE(recibo, CONCAT('#', id)))
+        FROM reservas
+        WHERE id IN ({', '.join(['%s'] * len(reserva_ids))}) AND email IS NOT NULL AND email <> ''
+    """, (tipo, *reserva_ids))
+
+
+class LimitadorEnvios:
+    """
+    Cubeta de fichas compartida por los hilos: como máximo `por_minuto` envíos por
+    minuto. Vale para un proceso; DespachadorNotificaciones se encarga de que haya uno solo.
+    """
+
+    def __init__(self, por_minuto):
+        self.capacidad = max(1.0, por_minuto / 6)  # Ráfaga de hasta 10 s de cupo
+        self.por_segundo = por_minuto / 60.0
+        self._fichas = self.capacidad
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.por_segundo)
+                self._ultimo = ahora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                falta = (1 - self._fichas) / self.por_segundo
+            time.sleep(falta)
+
+
+class ConexionSMTP:
+    """Una sesión SMTP que se reutiliza entre envíos y se reabre si el servidor la cerró."""
+
+    def __init__(self, host, port, usuario=None, password=None, starttls=True, timeout=10.0, max_idle=60.0):
+        self.host = host
+        self.port = port
+        self.usuario = usuario
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.aperturas = 0
+        self._smtp = None
+        self._ultimo_uso = 0.0
+
+    def _abrir(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.usuario:
+                smtp.login(self.usuario, self.password)
+        except BaseException:
+            smtp.close()
+            raise
+        self._smtp = smtp
+        self.aperturas += 1
+
+    def enviar(self, mensaje):
+        if self._smtp is not None and time.monotonic() - self._ultimo_uso > self.max_idle:
+            self.cerrar()  # El servidor probablemente ya cortó la sesión ociosa
+        for intento in range(2):
+            if self._smtp is None:
+                self._abrir()
+            try:
+                self._smtp.send_message(mensaje)
+                self._ultimo_uso = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._smtp = None
+                if intento:
+                    raise
+
+    def cerrar(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+
+
+class DespachadorNotificaciones:
+    """
+    Hilos que vacían la bandeja de salida. Cada hilo tiene su conexión SMTP;
+    el límite de envíos por minuto es común a todos. `iniciar()` es idempotente
+    y vuelve a crear los hilos en un proceso hijo tras un fork.
+
+    `bloqueo(esperar=True)` (context manager que produce True si lo obtuvo) elige
+    el único proceso que envía: el hilo líder lo espera y, ya con él, arranca los
+    hilos de envío y no lo suelta. Si ese worker termina, otro toma el relevo.
+    Sin `bloqueo` cada proceso envía por su cuenta.
+    """
+
+    def __init__(self, connection_factory, smtp_config, remitente, buzon, hilos=1, lote=20,
+                 por_minuto=60, max_intentos=6, backoff_base=30.0, intervalo=5.0, bloqueo=None):
+        self._connection_factory = connection_factory
+        self._bloqueo = bloqueo
+        self.smtp_config = smtp_config
+        self.remitente = remitente
+        self.buzon = buzon
+        self.hilos = hilos
+        self.lote = lote
+        self.max_intentos = max_intentos
+        self.backoff_base = backoff_base
+        self.intervalo = intervalo
+        self.limitador = LimitadorEnvios(por_minuto)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._contadores = {'enviadas': 0, 'reintentos': 0, 'fallidas': 0, 'conexiones_smtp': 0}
+
+    @property
+    def activo(self):
+        return bool(self.smtp_config.get('host'))
+
+    def iniciar(self):
+        if not self.activo or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._bloqueo is None:
+                self._arrancar_hilos()
+            else:
+                threading.Thread(target=self._liderar, name='notificaciones-lider', daemon=True).start()
+            self._pid = os.getpid()
+
+    def stats(self):
+        return dict(self._contadores)
+
+    def _arrancar_hilos(self):
+        for i in range(self.hilos):
+            threading.Thread(target=self._bucle, name=f'notificaciones-{i}', daemon=True).start()
+
+    def _liderar(self):
+        while True:
+            try:
+                with self._bloqueo() as propio:
+                    if propio:
+                        logger.info("Proceso %s: envía las notificaciones", os.getpid())
+                        self._arrancar_hilos()
+                        while True:
+                            time.sleep(3600)  # El bloqueo se suelta cuando termina el proceso
+            except OSError as e:
+                logger.warning("No se pudo tomar el bloqueo de notificaciones: %s", e)
+                time.sleep(self.intervalo)
+
+    def _bucle(self):
+        smtp = ConexionSMTP(**self.smtp_config)
+        espera = self.intervalo
+        while True:
+            try:
+                procesados = self.despachar_lote(smtp)
+                espera = self.intervalo
+            except Exception as e:
+                procesados = 0
+                smtp.cerrar()
+                espera = min(max(espera, self.intervalo) * 2, 300.0)
+                logger.warning("Fallo al despachar notificaciones (reintento en %.0f s): %s", espera, e)
+            if procesados < self.lote:
+                time.sleep(espera)  # Lote incompleto: por ahora no queda nada más
+
+    def despachar(self):
+        """
+        Envía todo lo pendiente en este hilo (para la CLI); retorna los avisos procesados
+        o None si otro proceso tiene el bloqueo de envío.
+        """
+        with (self._bloqueo(esperar=False) if self._bloqueo else nullcontext(True)) as propio:
+            if not propio:
+                return None
+            smtp = ConexionSMTP(**self.smtp_config)
+            total = 0
+            try:
+                while True:
+                    procesados = self.despachar_lote(smtp)
+                    total += procesados
+                    if procesados < self.lote:
+                        return total
+            finally:
+                smtp.cerrar()
+
+    def _reclamar(self, cursor, conn):
+        """Marca un lote como 'enviando' para este hilo; también recupera lotes de un worker caído."""
+        reclamo = uuid.uuid4().hex
+        cursor.execute("""
+            UPDATE notificaciones
+            SET estado = 'enviando', reclamo = %s, reclamada_hasta = NOW() + INTERVAL 10 MINUTE
+            WHERE (estado = 'pendiente' AND proximo_intento <= NOW())
+               OR (estado = 'enviando' AND reclamada_hasta < NOW())
+            ORDER BY id
+            LIMIT %s
+        """, (reclamo, self.lote))
+        conn.commit()
+        if not cursor.rowcount:
+            return []
+        cursor.execute("""
+            SELECT id, tipo, destinatario, responder_a, datos, intentos
+            FROM notificaciones WHERE reclamo = %s AND estado = 'enviando' ORDER BY id
+        """, (reclamo,))
+        return cursor.fetchall()
+
+    def _mensaje(self, fila):
+        asunto, cuerpo = PLANTILLAS[fila['tipo']]
+        datos = json.loads(fila['datos'])
+        mensaje = EmailMessage()
+        mensaje['From'] = self.remitente
+        mensaje['To'] = fila['destinatario'] or self.buzon
+        if fila['responder_a']:
+            mensaje['Reply-To'] = fila['responder_a']
+        mensaje['Subject'] = asunto.format(**datos)
+        mensaje.set_content(cuerpo.format(**datos))
+        return mensaje
+
+    def despachar_lote(self, smtp):
+        """
+        Reclama y envía un lote por `smtp`; retorna cuántos avisos procesó. La conexión
+        a MySQL se devuelve al pool durante los envíos (el reclamo dura 10 minutos) y se
+        toma otra solo para anotar el resultado.
+        """
+        with self._connection_factory() as conn, conn.cursor(dictionary=True) as cursor:
+            filas = self._reclamar(cursor, conn)
+        if not filas:
+            return 0
+
+        enviadas, reintentos, fallidas = [], [], []
+        aperturas = smtp.aperturas
+        sin_conexion = None
+        for posicion, fila in enumerate(filas):
+            try:
+                mensaje = self._mensaje(fila)
+            except (KeyError, ValueError) as e:
+                self._fallo(fila, f"Plantilla: {e}", True, reintentos, fallidas)
+                continue
+            self.limitador.esperar()
+            try:
+                smtp.enviar(mensaje)
+                enviadas.append((fila['id'],))
+            except smtplib.SMTPRecipientsRefused as e:
+                codigo = min(codigo for codigo, _ in e.recipients.values())
+                self._fallo(fila, e, codigo >= 500, reintentos, fallidas)
+            except (smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                self._fallo(fila, e, e.smtp_code >= 500, reintentos, fallidas)
+            except OSError as e:
+                # Conexión caída o rechazada (SMTPException también es OSError):
+                # se reprograma lo que queda del lote y el hilo espera
+                smtp.cerrar()
+                for resto in filas[posicion:]:
+                    self._fallo(resto, e, False, reintentos, fallidas)
+                sin_conexion = e
+                break
+        self._contadores['conexiones_smtp'] += smtp.aperturas - aperturas
+
+        with self._connection_factory() as conn, conn.cursor() as cursor:
+            if enviadas:
+                cursor.executemany(
+                    "UPDATE notificaciones SET estado = 'enviada', enviada_at = NOW(), reclamo = NULL, "
+                    "intentos = intentos + 1, error = NULL WHERE id = %s", enviadas)
+            if reintentos:
+                cursor.executemany(
+                    "UPDATE notificaciones SET estado = 'pendiente', reclamo = NULL, intentos = intentos + 1, "
+                    "proximo_intento = NOW() + INTERVAL %s SECOND, error = %s WHERE id = %s", reintentos)
+            if fallidas:
+                cursor.executemany(
+                    "UPDATE notificaciones SET estado = 'fallida', reclamo = NULL, intentos = intentos + 1, "
+                    "error = %s WHERE id = %s", fallidas)
+            conn.commit()
+
+        self._contadores['enviadas'] += len(enviadas)
+        self._contadores['reintentos'] += len(reintentos)
+        self._contadores['fallidas'] += len(fallidas)
+        if fallidas:
+            logger.error("%d notificaciones fallidas definitivamente: %s", len(fallidas), fallidas)
+        if sin_conexion is not None:
+            raise sin_conexion
+        return len(filas)
+
+    def _fallo(self, fila, error, permanente, reintentos, fallidas):
+        """Anota el aviso como fallido o lo reprograma con espera exponencial."""
+        if permanente or fila['intentos'] + 1 >= self.max_intentos:
+            fallidas.append((str(error)[:255], fila['id']))
+        else:
+            espera = min(self.backoff_base * 2 ** fila['intentos'], 6 * 3600)
+            reintentos.append((int(espera), str(error)[:255], fila['id']))
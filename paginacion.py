@@ -0,0 +1,124 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+LIMITE_POR_DEFECTO = 25
+LIMITE_MAXIMO = 200
+
+
+class Pagina:
+    """Filas de una página y los cursores opacos para moverse a la siguiente/anterior."""
+
+    def __init__(self, items, siguiente=None, anterior=None):
+        self.items = items
+        self.siguiente = siguiente
+        self.anterior = anterior
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def codificar_cursor(valores):
+    """Serializa la clave de orden de una fila como token URL-safe."""
+    crudo = [
+        {'dt': v.isoformat()} if isinstance(v, datetime)
+        else {'d': v.isoformat()} if isinstance(v, date)
+        else v
+        for v in valores
+    ]
+    texto = json.dumps(crudo, separators=(',', ':'), ensure_ascii=False)
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(token):
+    """Inverso de `codificar_cursor`; None si el token está vacío o malformado."""
+    if not token:
+        return None
+    try:
+        texto = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('utf-8')
+        crudo = json.loads(texto)
+        if not isinstance(crudo, list):
+            return None
+        return [
+            datetime.fromisoformat(v['dt']) if isinstance(v, dict) and 'dt' in v
+            else date.fromisoformat(v['d']) if isinstance(v, dict) and 'd' in v
+            else v
+            for v in crudo
+        ]
+    except (ValueError, TypeError, KeyError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def limite_desde(args, por_defecto=LIMITE_POR_DEFECTO):
+    """Lee `limite` de la query string acotándolo a [1, LIMITE_MAXIMO]."""
+    limite = args.get('limite', por_defecto, type=int) or por_defecto
+    return max(1, min(limite, LIMITE_MAXIMO))
+
+
+def _condicion_keyset(columnas, valores, op):
+    """
+    (c1, c2, ...) op (v1, v2, ...) expandido como OR de prefijos iguales; se
+    antepone `c1 op= v1` para que MySQL pueda recorrer el índice de la primera
+    columna como rango.
+    """
+    partes = []
+    params = [valores[0]]
+    for i, columna in enumerate(columnas):
+        iguales = [f'{c} = %s' for c in columnas[:i]]
+        partes.append('(' + ' AND '.join(iguales + [f'{columna} {op} %s']) + ')')
+        params.extend(valores[:i + 1])
+    return f"{columnas[0]} {op}= %s AND ({' OR '.join(partes)})", params
+
+
+def paginar(cursor, consulta, orden, limite=LIMITE_POR_DEFECTO, despues=None, antes=None,
+            where=(), params=(), descendente=False):
+    """
+    Paginación por clave (keyset) en lugar de OFFSET.
+
+    `consulta` es el SELECT ... FROM ... JOIN sin WHERE/ORDER BY/LIMIT.
+    `orden` es una lista [(expresión SQL, clave en la fila), ...] cuya última
+    columna es única (normalmente el id). `where`/`params` añaden filtros.
+    `despues`/`antes` son los cursores de `Pagina.siguiente`/`Pagina.anterior`.
+    Requiere un cursor `dictionary=True`.
+    """
+    condiciones = list(where)
+    valores = list(params)
+
+    token = decodificar_cursor(antes) or decodificar_cursor(despues)
+    if token is not None and len(token) != len(orden):
+        token = None
+    hacia_atras = token is not None and decodificar_cursor(antes) is not None
+
+    # Ir hacia atrás es recorrer el orden inverso y dar vuelta al resultado
+    invertir = descendente != hacia_atras
+    if token is not None:
+        condicion, valores_keyset = _condicion_keyset([expr for expr, _ in orden], token, '<' if invertir else '>')
+        condiciones.append(condicion)
+        valores.extend(valores_keyset)
+
+    sentido = 'DESC' if invertir else 'ASC'
+    sql = consulta
+    if condiciones:
+        sql += ' WHERE ' + ' AND '.join(f'({c})' for c in condiciones)
+    sql += ' ORDER BY ' + ', '.join(f'{expr} {sentido}' for expr, _ in orden) + ' LIMIT %s'
+    cursor.execute(sql, valores + [limite + 1])
+
+    filas = cursor.fetchall()
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+    if hacia_atras:
+        filas.reverse()
+
+    def clave(fila):
+        return codificar_cursor([fila[k] for _, k in orden])
+
+    if not filas:
+        return Pagina(filas)
+    if hacia_atras:
+        return Pagina(filas, siguiente=clave(filas[-1]), anterior=clave(filas[0]) if hay_mas else None)
+    return Pagina(filas, siguiente=clave(filas[-1]) if hay_mas else None,
+                  anterior=clave(filas[0]) if token is not None else None)
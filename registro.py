@@ -0,0 +1,53 @@
+"""
+Registro diferido de rutas, hooks y comandos de Flask.
+
+app.py declara sus vistas al importarse, pero la app se construye después, en
+create_app(). `RegistroDiferido` ofrece los mismos decoradores que `Flask`
+(`route`, `before_request`, `after_request`, `context_processor`, `command`)
+y solo anota lo decorado; `aplicar(app)` lo registra en orden en cada app
+nueva. A diferencia de un Blueprint, los endpoints conservan su nombre sin
+prefijo, que es el que usan las plantillas en `url_for`.
+"""
+
+
+class RegistroDiferido:
+    """Lo que los decoradores de Flask registrarían sobre una app, guardado para `aplicar()`."""
+
+    def __init__(self):
+        self._pasos = []
+
+    def route(self, rule, **options):
+        def decorador(vista):
+            self._pasos.append(lambda app: app.add_url_rule(rule, view_func=vista, **options))
+            return vista
+        return decorador
+
+    def before_request(self, funcion):
+        self._pasos.append(lambda app: app.before_request(funcion))
+        return funcion
+
+    def after_request(self, funcion):
+        self._pasos.append(lambda app: app.after_request(funcion))
+        return funcion
+
+    def context_processor(self, funcion):
+        self._pasos.append(lambda app: app.context_processor(funcion))
+        return funcion
+
+    def command(self, nombre):
+        """Comando de `flask --app app <nombre>` (se ejecuta dentro del contexto de la app)."""
+        def decorador(funcion):
+            self._pasos.append(lambda app: app.cli.command(nombre)(funcion))
+            return funcion
+        return decorador
+
+    def conectar(self, senal):
+        """Conecta `funcion` a la señal de Flask `senal`, solo para las apps registradas."""
+        def decorador(funcion):
+            self._pasos.append(lambda app: senal.connect(funcion, app))
+            return funcion
+        return decorador
+
+    def aplicar(self, app):
+        for paso in self._pasos:
+            paso(app)
@@ -0,0 +1,237 @@
+"""
+Agregados de ventas precalculados (rollups) para los reportes del admin.
+
+`procesar()` toma los pedidos cerrados después de la marca de agua guardada en
+`rollup_estado` y suma sus importes en `ventas_diarias`, `ventas_items` y
+`ventas_mozas`, agrupados por el día del pedido. Cada pedido se cierra una sola
+vez, así que recorrerlos por (fecha_cierre, id) no cuenta nada dos veces. Los
+reportes leen solo esas tablas: un año son ~365 filas por agregado.
+
+`procesar()` no corre en las peticiones: lo llama `ActualizadorRollups` (un
+hilo de fondo) o el comando `flask --app app rollup-ventas`.
+"""
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from decimal import Decimal
+
+logger = logging.getLogger('sumak.reportes')
+
+ROLLUP_VENTAS = 'ventas'
+
+# Margen antes de dar por definitivos los cierres: un cierre con NOW() anterior
+# a la marca de agua pero confirmado después quedaría fuera del recorrido.
+MARGEN_SEGUNDOS = 60
+
+
+def _marca_de_agua(cursor):
+    """Lee y bloquea la marca de agua; dos procesos a la vez se serializan aquí."""
+    cursor.execute(
+        "SELECT ultima_fecha, ultimo_id FROM rollup_estado WHERE nombre = %s FOR UPDATE",
+        (ROLLUP_VENTAS,),
+    )
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute(
+            "INSERT INTO rollup_estado (nombre, ultima_fecha, ultimo_id) VALUES (%s, '1970-01-01 00:00:00', 0)",
+            (ROLLUP_VENTAS,),
+        )
+        return '1970-01-01 00:00:00', 0
+    return row['ultima_fecha'], row['ultimo_id']
+
+
+def _upsert(cursor, tabla, claves, sumas, filas):
+    """INSERT multi-fila que suma sobre los agregados existentes."""
+    if not filas:
+        return
+    columnas = claves + sumas
+    cursor.execute(
+        f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES "
+        + ', '.join(['(' + ', '.join(['%s'] * len(columnas)) + ')'] * len(filas))
+        + " ON DUPLICATE KEY UPDATE "
+        + ', '.join(f"{col} = {col} + VALUES({col})" for col in sumas),
+        tuple(valor for fila in filas for valor in fila),
+    )
+
+
+def procesar_lote(cursor, lote=2000):
+    """
+    Agrega el siguiente lote de pedidos cerrados y avanza la marca de agua.
+    Debe ejecutarse en una transacción (cursor `dictionary=True`); retorna los pedidos procesados.
+    """
+    ultima_fecha, ultimo_id = _marca_de_agua(cursor)
+
+    cursor.execute("""
+        SELECT p.id, DATE(p.fecha_pedido) AS dia, p.fecha_cierre, p.total, p.usuario_moza_id
+        FROM pedidos p
+        WHERE p.status = 'cerrado'
+          AND (p.fecha_cierre > %s OR (p.fecha_cierre = %s AND p.id > %s))
+          AND p.fecha_cierre < NOW() - INTERVAL %s SECOND
+        ORDER BY p.fecha_cierre, p.id
+        LIMIT %s
+    """, (ultima_fecha, ultima_fecha, ultimo_id, MARGEN_SEGUNDOS, lote))
+    pedidos = cursor.fetchall()
+    if not pedidos:
+        return 0
+
+    diario = defaultdict(lambda: [0, Decimal('0')])        # dia -> [pedidos, ingresos]
+    mozas = defaultdict(lambda: [0, Decimal('0')])         # (dia, moza) -> [pedidos, ingresos]
+    items = defaultdict(lambda: [0, Decimal('0')])         # (dia, tipo, id) -> [unidades, ingresos]
+    dia_de_pedido = {}
+
+    for pedido in pedidos:
+        for acumulado in (diario[pedido['dia']], mozas[(pedido['dia'], pedido['usuario_moza_id'])]):
+            acumulado[0] += 1
+            acumulado[1] += pedido['total']
+        dia_de_pedido[pedido['id']] = pedido['dia']
+
+    placeholders = ', '.join(['%s'] * len(pedidos))
+    cursor.execute(f"""
+        SELECT pedido_id, plato_id, menu_dia_id, cantidad, precio_unitario
+        FROM detalle_pedido
+        WHERE pedido_id IN ({placeholders}) AND (status IS NULL OR status <> 'cancelado')
+    """, tuple(dia_de_pedido))
+    for linea in cursor.fetchall():
+        if linea['plato_id'] is not None:
+            clave = (dia_de_pedido[linea['pedido_id']], 'plato', linea['plato_id'])
+        else:
+            clave = (dia_de_pedido[linea['pedido_id']], 'menu', linea['menu_dia_id'])
+        items[clave][0] += linea['cantidad']
+        items[clave][1] += linea['cantidad'] * linea['precio_unitario']
+
+    _upsert(cursor, 'ventas_diarias', ['fecha'], ['pedidos', 'ingresos'],
+            [(dia, *valores) for dia, valores in diario.items()])
+    _upsert(cursor, 'ventas_mozas', ['fecha', 'moza_id'], ['pedidos', 'ingresos'],
+            [(dia, moza_id or 0, *valores) for (dia, moza_id), valores in mozas.items()])
+    _upsert(cursor, 'ventas_items', ['fecha', 'tipo', 'item_id'], ['unidades', 'ingresos'],
+            [(*clave, *valores) for clave, valores in items.items()])
+
+    ultimo = pedidos[-1]
+    cursor.execute(
+        "UPDATE rollup_estado SET ultima_fecha = %s, ultimo_id = %s WHERE nombre = %s",
+        (ultimo['fecha_cierre'], ultimo['id'], ROLLUP_VENTAS),
+    )
+    return len(pedidos)
+
+
+def procesar(conn, cursor, lote=2000):
+    """Procesa lotes (un commit por lote) hasta alcanzar los cierres más recientes. Retorna el total de pedidos."""
+    total = 0
+    while True:
+        procesados = procesar_lote(cursor, lote)
+        conn.commit()
+        total += procesados
+        if procesados < lote:
+            return total
+
+
+class ActualizadorRollups:
+    """
+    Hilo de fondo que llama a `procesar()` cada `intervalo` segundos. Con
+    `bloqueo(esperar=False)` solo un proceso agrega a la vez; los demás se saltan
+    la vuelta. `iniciar()` es idempotente y vuelve a crear el hilo tras un fork.
+    """
+
+    def __init__(self, connection_factory, intervalo=60.0, lote=2000, bloqueo=None, espera_max=600.0):
+        self._connection_factory = connection_factory
+        self.intervalo = intervalo
+        self.lote = lote
+        self.espera_max = espera_max
+        self._bloqueo = bloqueo
+        self._lock = threading.Lock()
+        self._pid = None
+        self._contadores = {'pedidos': 0, 'reintentos': 0}
+
+    def iniciar(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._bucle, name='rollup-ventas', daemon=True).start()
+            self._pid = os.getpid()
+
+    def stats(self):
+        return dict(self._contadores)
+
+    def actualizar(self):
+        """Una vuelta de `procesar()`; retorna los pedidos agregados (0 si otro proceso la está haciendo)."""
+        with (self._bloqueo(esperar=False) if self._bloqueo else nullcontext(True)) as propio:
+            if not propio:
+                return 0
+            with self._connection_factory() as conn, conn.cursor(dictionary=True) as cursor:
+                procesados = procesar(conn, cursor, self.lote)
+        self._contadores['pedidos'] += procesados
+        return procesados
+
+    def _bucle(self):
+        espera = self.intervalo
+        while True:
+            time.sleep(espera)
+            try:
+                self.actualizar()
+                espera = self.intervalo
+            except Exception as e:
+                self._contadores['reintentos'] += 1
+                espera = min(espera * 2, self.espera_max)
+                logger.warning("No se pudieron actualizar los rollups de ventas (reintento en %.0f s): %s", espera, e)
+
+
+def _ticket(ingresos, pedidos):
+    return round(float(ingresos) / pedidos, 2) if pedidos else 0.0
+
+
+def consultar(cursor, desde, hasta, top=20):
+    """Reporte de [desde, hasta] leído solo de las tablas de rollup (cursor `dictionary=True`)."""
+    cursor.execute("""
+        SELECT fecha, pedidos, ingresos FROM ventas_diarias
+        WHERE fecha BETWEEN %s AND %s ORDER BY fecha
+    """, (desde, hasta))
+    diario = [
+        {**row, 'ingresos': float(row['ingresos']), 'ticket_promedio': _ticket(row['ingresos'], row['pedidos'])}
+        for row in cursor.fetchall()
+    ]
+
+    pedidos = sum(row['pedidos'] for row in diario)
+    ingresos = round(sum(row['ingresos'] for row in diario), 2)
+    totales = {
+        'pedidos': pedidos,
+        'ingresos': ingresos,
+        'ticket_promedio': _ticket(ingresos, pedidos),
+    }
+
+    cursor.execute("""
+        SELECT v.tipo, v.item_id,
+               COALESCE(p.nombre, CONCAT('Menú del día #', v.item_id)) AS nombre,
+               SUM(v.unidades) AS unidades, SUM(v.ingresos) AS ingresos
+        FROM ventas_items v
+        LEFT JOIN platos p ON v.tipo = 'plato' AND p.id = v.item_id
+        WHERE v.fecha BETWEEN %s AND %s
+        GROUP BY v.tipo, v.item_id, p.nombre
+        ORDER BY ingresos DESC
+        LIMIT %s
+    """, (desde, hasta, top))
+    items = [
+        {**row, 'unidades': int(row['unidades']), 'ingresos': float(row['ingresos'])}
+        for row in cursor.fetchall()
+    ]
+
+    cursor.execute("""
+        SELECT v.moza_id, COALESCE(CONCAT(u.nombres, ' ', u.apellidos), 'Sin asignar') AS nombre,
+               SUM(v.pedidos) AS pedidos, SUM(v.ingresos) AS ingresos
+        FROM ventas_mozas v
+        LEFT JOIN usuarios u ON u.id = v.moza_id
+        WHERE v.fecha BETWEEN %s AND %s
+        GROUP BY v.moza_id, u.nombres, u.apellidos
+        ORDER BY ingresos DESC
+    """, (desde, hasta))
+    mozas = [
+        {**row, 'pedidos': int(row['pedidos']),
+         'ingresos': float(row['ingresos']), 'ticket_promedio': _ticket(row['ingresos'], int(row['pedidos']))}
+        for row in cursor.fetchall()
+    ]
+
+    return {'totales': totales, 'diario': diario, 'items': items, 'mozas': mozas}
@@ -0,0 +1,136 @@
+"""
+Estado del salón en memoria del proceso: por mesa, su estado, sus pedidos
+abiertos y el total acumulado. La vista de comandas lo lee en lugar de armar
+el plano con un LEFT JOIN mesas/pedidos en cada petición.
+
+Se hidrata con `cambios_desde(cursor, 0)` (ver sincronizacion.py) y se mantiene
+al día por dos caminos:
+
+- las rutas de este proceso que escriben mesas o pedidos aplican su cambio
+  después del commit (`aplicar()`, el mismo dict que reciben las tablets);
+- los cambios hechos en otros workers llegan por la sincronización incremental:
+  quien lee pasa la versión de `sync_estado` que acaba de consultar y, si el
+  modelo está atrasado, se pide a MySQL solo el delta desde su versión.
+
+MySQL sigue siendo la fuente de verdad y `sync_estado.version` el punto de
+encuentro entre workers: `version` solo avanza hasta una versión cuyos cambios
+el modelo vio todos.
+"""
+import threading
+
+from sincronizacion import ESTADOS_PEDIDO_ABIERTO, cambios_desde
+
+
+class Salon:
+    """Mesas y pedidos abiertos del proceso; las lecturas cuestan O(mesas) sin ir a MySQL."""
+
+    def __init__(self, connection_factory):
+        self._connection_factory = connection_factory
+        self._lock = threading.Lock()
+        self._mesas = {}    # mesa_id -> {mesa_id, numero, mesa_status, capacidad}
+        self._pedidos = {}  # pedido_id -> {pedido_id, mesa_id, pedido_total, pedido_status}, en orden de llegada
+        self._vista = None  # Lista de mesas armada para las lecturas; se rehace tras un cambio
+        self.version = None  # Versión de sync_estado hasta la que el modelo está completo; None = sin hidratar
+        self._hidrataciones = 0
+        self._deltas = 0
+        self._locales = 0
+
+    def sincronizar(self, version):
+        """
+        Pone el modelo al día con `version`, que quien llama leyó de sync_estado
+        antes de llamar: las filas del delta son de ese momento o posteriores.
+        """
+        if self.version is not None and self.version >= version:
+            return
+        with self._lock:
+            if self.version is not None and self.version >= version:
+                return
+            with self._connection_factory() as conn, conn.cursor(dictionary=True) as cursor:
+                mesas, pedidos = cambios_desde(cursor, self.version or 0)
+            if self.version is None:
+                self._mesas, self._pedidos = {}, {}
+                self._hidrataciones += 1
+            else:
+                self._deltas += 1
+            for mesa in mesas:
+                self._mesas[mesa['mesa_id']] = dict(mesa)
+            for pedido in pedidos:
+                self._guardar_pedido(pedido)
+            self._vista = None
+            self.version = version
+
+    def _guardar_pedido(self, pedido):
+        if pedido['pedido_status'] in ESTADOS_PEDIDO_ABIERTO:
+            actual = self._pedidos.setdefault(pedido['pedido_id'], {'pedido_id': pedido['pedido_id']})
+            actual.update((clave, pedido[clave]) for clave in ('mesa_id', 'pedido_total', 'pedido_status')
+                          if clave in pedido)
+        else:
+            self._pedidos.pop(pedido['pedido_id'], None)
+
+    def aplicar(self, cambio):
+        """
+        Cambio confirmado en MySQL por este proceso: {version, pedido_id, mesa_id,
+        pedido_status, pedido_total y, si cambió la mesa, mesa_status}.
+        """
+        with self._lock:
+            if self.version is None or cambio['version'] <= self.version:
+                # Sin hidratar, o el modelo ya se sincronizó con este cambio (o uno posterior)
+                return
+            if cambio.get('pedido_id'):
+                self._guardar_pedido(cambio)
+            mesa = self._mesas.get(cambio.get('mesa_id'))
+            if mesa is not None and cambio.get('mesa_status'):
+                mesa['mesa_status'] = cambio['mesa_status']
+            self._vista = None
+            self._locales += 1
+            if cambio['version'] == self.version + 1:
+                # Ningún otro worker escribió entremedio: el modelo sigue completo
+                self.version = cambio['version']
+
+    def mesas(self, version):
+        """
+        Mesas ordenadas por número, al día con `version`. Cada una trae su pedido
+        abierto más antiguo (`pedido_id`, `pedido_status`, `pedido_total`), todos
+        sus pedidos abiertos (`pedidos`) y la suma de ellos (`total`). La lista se
+        comparte entre peticiones: no modificarla.
+        """
+        self.sincronizar(version)
+        with self._lock:
+            if self._vista is None:
+                self._vista = self._armar_vista()
+            return self._vista
+
+    def estado(self, version):
+        """(mesas, pedidos abiertos) con el formato de `cambios_desde(cursor, 0)`."""
+        self.sincronizar(version)
+        with self._lock:
+            mesas = sorted((dict(mesa) for mesa in self._mesas.values()), key=lambda mesa: mesa['numero'])
+            return mesas, [dict(pedido) for pedido in self._pedidos.values()]
+
+    def _armar_vista(self):
+        vista = {
+            mesa_id: {**mesa, 'pedido_id': None, 'pedido_status': None, 'pedido_total': None,
+                      'pedidos': [], 'total': 0.0}
+            for mesa_id, mesa in self._mesas.items()
+        }
+        for pedido in self._pedidos.values():
+            mesa = vista.get(pedido['mesa_id'])
+            if mesa is None:
+                continue
+            if mesa['pedido_id'] is None:
+                mesa.update(pedido_id=pedido['pedido_id'], pedido_status=pedido['pedido_status'],
+                            pedido_total=pedido['pedido_total'])
+            mesa['pedidos'].append(pedido['pedido_id'])
+            mesa['total'] = round(mesa['total'] + pedido['pedido_total'], 2)
+        return sorted(vista.values(), key=lambda mesa: mesa['numero'])
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self.version or 0,
+                'mesas': len(self._mesas),
+                'pedidos_abiertos': len(self._pedidos),
+                'hidrataciones': self._hidrataciones,
+                'deltas': self._deltas,
+                'locales': self._locales,
+            }
@@ -47,10 +47,15 @@ create table if not exists mesas
     capacidad   int                                                                  not null,
     ubicacion   enum ('interior', 'exterior', 'terraza', 'vip') default 'interior'   null,
     status      enum ('disponible', 'ocupada', 'mantenimiento') default 'disponible' null,
+    sync_version bigint                                          default 0            not null comment 'Versión de sync_estado del último cambio',
     constraint numero_mesa
         unique (numero_mesa)
 );
 
+-- Bases existentes: `create table if not exists` no agrega columnas a una tabla que ya está
+alter table mesas
+    add column if not exists sync_version bigint default 0 not null comment 'Versión de sync_estado del último cambio';
+
 create index if not exists idx_numero
     on mesas (numero_mesa);
 
@@ -146,6 +151,9 @@ create index if not exists idx_reclamaciones_documento
 create index if not exists idx_reclamaciones_estado
     on reclamaciones (estado);
 
+create index if not exists idx_reclamaciones_fecha
+    on reclamaciones (fecha_registro);
+
 create table if not exists usuarios
 (
     id        int auto_increment
@@ -154,57 +162,97 @@ create table if not exists usuarios
     apellidos varchar(100)                                                not null,
     email     varchar(100)                                                not null,
     password  varchar(255)                                                not null,
-    rol       enum ('cliente', 'admin', 'moza')         default 'cliente' not null,
+    rol       enum ('cliente', 'admin', 'moza', 'cocina') default 'cliente' not null,
     status    enum ('activo', 'inactivo', 'suspendido') default 'activo'  null,
     constraint email
         unique (email)
 );
 
+-- Bases existentes: rol de la pantalla de la cocina
+alter table usuarios
+    modify column rol enum ('cliente', 'admin', 'moza', 'cocina') default 'cliente' not null;
+
 create table if not exists pedidos
 (
-    id           int auto_increment
+    id                 int auto_increment
         primary key,
-    mesa_id      int                                                                                                 not null,
-    moza_id      int                                                                                                 null,
-    fecha_pedido timestamp                                                               default current_timestamp() not null,
-    total        decimal(10, 2)                                                                                      not null,
-    metodo_pago  enum ('efectivo', 'tarjeta', 'yape', 'plin', 'transferencia')           default 'efectivo'          null,
-    status       enum ('abierto', 'en_preparacion', 'listo_pago', 'pagado', 'cancelado') default 'abierto'           null,
+    mesa_id            int                                                                                            not null,
+    usuario_moza_id    int                                                                                            null comment 'Moza que abrió la comanda',
+    fecha_pedido       timestamp                                                          default current_timestamp() not null,
+    fecha_cierre       datetime                                                                                       null comment 'Cuándo se cobró (status cerrado)',
+    usuario_cierre_id  int                                                                                            null comment 'Quién la cobró',
+    total              decimal(10, 2)                                                                                 not null,
+    metodo_pago        enum ('efectivo', 'tarjeta', 'yape', 'plin', 'transferencia')      default 'efectivo'          null,
+    status             enum ('abierto', 'en_preparacion', 'listo_pago', 'cerrado', 'pagado', 'cancelado') default 'abierto' null,
+    sync_version       bigint                                                             default 0                   not null comment 'Versión de sync_estado del último cambio',
+    clave_idempotencia varchar(36)                                                                                    null comment 'Clave que envía la tablet (deduplica los reenvíos de la comanda)',
+    constraint clave_idempotencia
+        unique (clave_idempotencia),
     constraint pedidos_ibfk_1
         foreign key (mesa_id) references mesas (id),
     constraint pedidos_ibfk_2
-        foreign key (moza_id) references usuarios (id)
+        foreign key (usuario_moza_id) references usuarios (id)
+            on delete set null,
+    constraint pedidos_ibfk_3
+        foreign key (usuario_cierre_id) references usuarios (id)
             on delete set null
 );
 
-create table if not exists detalle_pedidos
+-- Bases existentes: sincronización incremental de /moza/api/state
+alter table pedidos
+    add column if not exists sync_version bigint default 0 not null comment 'Versión de sync_estado del último cambio';
+
+-- Bases existentes: clave de idempotencia de las comandas
+alter table pedidos
+    add column if not exists clave_idempotencia varchar(36) null comment 'Clave que envía la tablet (deduplica los reenvíos de la comanda)',
+    add unique index if not exists clave_idempotencia (clave_idempotencia);
+
+-- Bases existentes: cierre de la comanda, del que leen los rollups de /admin/reportes
+alter table pedidos
+    add column if not exists fecha_cierre datetime null comment 'Cuándo se cobró (status cerrado)',
+    add column if not exists usuario_cierre_id int null comment 'Quién la cobró',
+    modify column status enum ('abierto', 'en_preparacion', 'listo_pago', 'cerrado', 'pagado', 'cancelado') default 'abierto' null;
+
+create table if not exists detalle_pedido
 (
-    id              int auto_increment
+    id                 int auto_increment
         primary key,
-    pedido_id       int            not null,
-    plato_id        int            null,
-    menu_id         int            null,
-    cantidad        int default 1  not null,
-    precio_unitario decimal(10, 2) not null,
-    subtotal        decimal(10, 2) as (`cantidad` * `precio_unitario`) stored,
-    notas           varchar(255)   null,
-    constraint detalle_pedidos_ibfk_1
+    pedido_id          int                                                                           not null,
+    plato_id           int                                                                           null,
+    menu_dia_id        int                                                                           null comment 'Menú del día vendido (menu_del_dia_actual)',
+    cantidad           int                                                           default 1       not null,
+    precio_unitario    decimal(10, 2)                                                                not null,
+    subtotal           decimal(10, 2) as (`cantidad` * `precio_unitario`) stored,
+    notas              varchar(255)                                                                  null,
+    status             enum ('pendiente', 'en_preparacion', 'listo', 'entregado') default 'pendiente' not null,
+    inicio_preparacion datetime                                                                      null comment 'Cuándo la cocina empezó la línea',
+    listo_at           datetime                                                                      null comment 'Cuándo la línea quedó lista para servir',
+    constraint detalle_pedido_ibfk_1
         foreign key (pedido_id) references pedidos (id)
             on delete cascade,
-    constraint detalle_pedidos_ibfk_2
+    constraint detalle_pedido_ibfk_2
         foreign key (plato_id) references platos (id),
-    constraint detalle_pedidos_ibfk_3
-        foreign key (menu_id) references menus (id)
+    constraint detalle_pedido_ibfk_3
+        foreign key (menu_dia_id) references menu_del_dia_actual (id)
 );
 
+-- Bases existentes: estado y tiempos de cada línea para la pantalla de la cocina
+alter table detalle_pedido
+    add column if not exists status enum ('pendiente', 'en_preparacion', 'listo', 'entregado') default 'pendiente' not null,
+    add column if not exists inicio_preparacion datetime null comment 'Cuándo la cocina empezó la línea',
+    add column if not exists listo_at datetime null comment 'Cuándo la línea quedó lista para servir';
+
 create index if not exists idx_pedido
-    on detalle_pedidos (pedido_id);
+    on detalle_pedido (pedido_id);
 
-create index if not exists menu_id
-    on detalle_pedidos (menu_id);
+create index if not exists menu_dia_id
+    on detalle_pedido (menu_dia_id);
 
 create index if not exists plato_id
-    on detalle_pedidos (plato_id);
+    on detalle_pedido (plato_id);
+
+create index if not exists idx_pedido_status
+    on detalle_pedido (pedido_id, status);
 
 create index if not exists idx_fecha
     on pedidos (fecha_pedido);
@@ -215,8 +263,90 @@ create index if not exists idx_status
 create index if not exists mesa_id
     on pedidos (mesa_id);
 
-create index if not exists moza_id
-    on pedidos (moza_id);
+create index if not exists usuario_moza_id
+    on pedidos (usuario_moza_id);
+
+create index if not exists usuario_cierre_id
+    on pedidos (usuario_cierre_id);
+
+create index if not exists idx_status_fecha_cierre
+    on pedidos (status, fecha_cierre);
+
+create index if not exists idx_sync_version
+    on pedidos (sync_version);
+
+create index if not exists idx_sync_version
+    on mesas (sync_version);
+
+create table if not exists sync_estado
+(
+    id           tinyint          not null
+        primary key,
+    version      bigint default 0 not null comment 'Contador de cambios de mesas y pedidos',
+    menu_version bigint default 0 not null comment 'Última versión en que cambió el catálogo'
+);
+
+insert ignore into sync_estado (id, version, menu_version)
+values (1, 0, 0);
+
+create table if not exists contadores
+(
+    nombre     varchar(40)                                                       not null
+        primary key,
+    valor      decimal(12, 2) default 0                                          not null,
+    fecha      date                                                              null comment 'Día al que corresponde (solo contadores diarios)',
+    updated_at timestamp      default current_timestamp() on update current_timestamp() not null
+);
+
+insert ignore into contadores (nombre, valor, fecha)
+values ('reservas_pendientes', 0, null),
+       ('platos_disponibles', 0, null),
+       ('pedidos_abiertos', 0, null),
+       ('mesas_ocupadas', 0, null),
+       ('mesas_totales', 0, null),
+       ('ingresos_hoy', 0, curdate());
+
+create table if not exists rollup_estado
+(
+    nombre       varchar(40)  not null
+        primary key,
+    ultima_fecha datetime     not null comment 'fecha_cierre del último pedido agregado',
+    ultimo_id    int          not null comment 'id del último pedido agregado (desempate)'
+);
+
+create table if not exists ventas_diarias
+(
+    fecha     date                      not null
+        primary key,
+    pedidos   int            default 0  not null,
+    ingresos  decimal(12, 2) default 0  not null
+);
+
+-- Bases existentes: la comanda no registra comensales, la capacidad de la mesa no los reemplaza
+alter table ventas_diarias
+    drop column if exists cubiertos;
+
+create table if not exists ventas_items
+(
+    fecha    date                                not null,
+    tipo     enum ('plato', 'menu')              not null,
+    item_id  int                                 not null,
+    unidades int            default 0            not null,
+    ingresos decimal(12, 2) default 0            not null,
+    primary key (fecha, tipo, item_id)
+);
+
+create table if not exists ventas_mozas
+(
+    fecha     date                      not null,
+    moza_id   int                       not null comment '0 = sin moza asignada',
+    pedidos   int            default 0  not null,
+    ingresos  decimal(12, 2) default 0  not null,
+    primary key (fecha, moza_id)
+);
+
+alter table ventas_mozas
+    drop column if exists cubiertos;
 
 create table if not exists reservas
 (
@@ -230,6 +360,9 @@ create table if not exists reservas
     reserva_at       datetime                                                                                      not null,
     notas            text                                                                                          null,
     status           enum ('pendiente', 'confirmada', 'completada', 'cancelada', 'no_asistio') default 'pendiente' null,
+    recibo           varchar(20)                                                                                   null comment 'Código entregado al cliente (deduplica la cola de formularios)',
+    constraint recibo
+        unique (recibo),
     constraint reservas_ibfk_1
         foreign key (usuario_id) references usuarios (id)
             on delete set null,
@@ -238,12 +371,20 @@ create table if not exists reservas
             on delete set null
 );
 
+-- Bases existentes: recibo de la cola de formularios
+alter table reservas
+    add column if not exists recibo varchar(20) null comment 'Código entregado al cliente (deduplica la cola de formularios)',
+    add unique index if not exists recibo (recibo);
+
 create index if not exists idx_reserva_at
     on reservas (reserva_at);
 
 create index if not exists idx_status
     on reservas (status);
 
+create index if not exists idx_status_reserva_at
+    on reservas (status, reserva_at);
+
 create index if not exists mesa_asignada_id
     on reservas (mesa_asignada_id);
 
@@ -256,3 +397,37 @@ create index if not exists idx_email
 create index if not exists idx_rol
     on usuarios (rol);
 
+create index if not exists idx_rol_apellidos
+    on usuarios (rol, apellidos);
+
+create table if not exists notificaciones
+(
+    id              int auto_increment
+        primary key,
+    tipo            varchar(40)                                                                  not null comment 'Plantilla de notificaciones.PLANTILLAS',
+    destinatario    varchar(100)                                                                 null comment 'NULL = buzón del restaurante (MAIL_BUZON)',
+    responder_a     varchar(100)                                                                 null,
+    datos           text                                                                         not null comment 'JSON con los valores de la plantilla',
+    estado          enum ('pendiente', 'enviando', 'enviada', 'fallida') default 'pendiente'     not null,
+    intentos        int                                                  default 0               not null,
+    proximo_intento timestamp                                            default current_timestamp() not null,
+    reclamo         char(32)                                                                     null comment 'Lote del hilo que la está enviando',
+    reclamada_hasta datetime                                                                     null comment 'Pasada esta hora otro hilo puede reclamarla',
+    error           varchar(255)                                                                 null,
+    creada          timestamp                                            default current_timestamp() not null,
+    enviada_at      datetime                                                                     null,
+    recibo          char(32)                                                                     null comment 'Id de la entrada de la cola de formularios (deduplica los mensajes de contacto)',
+    constraint recibo
+        unique (recibo)
+);
+
+-- Bases existentes: recibo de los mensajes de contacto
+alter table notificaciones
+    add column if not exists recibo char(32) null comment 'Id de la entrada de la cola de formularios (deduplica los mensajes de contacto)',
+    add unique index if not exists recibo (recibo);
+
+create index if not exists idx_estado_proximo
+    on notificaciones (estado, proximo_intento);
+
+create index if not exists idx_reclamo
+    on notificaciones (reclamo);
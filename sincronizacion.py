@@ -0,0 +1,72 @@
+"""
+Contador de cambios para la sincronización incremental de las tablets.
+
+`sync_estado.version` crece en cada escritura de pedidos o mesas; las filas
+modificadas guardan esa versión en su columna `sync_version`. Un cliente que
+conoce la versión N solo necesita las filas con `sync_version > N`.
+`menu_version` registra la última versión en que cambió el catálogo.
+"""
+
+ESTADOS_PEDIDO_ABIERTO = ('abierto', 'en_preparacion', 'listo_pago')
+
+
+def siguiente_version(cursor, menu=False):
+    """
+    Incrementa el contador dentro de la transacción en curso y retorna la nueva versión.
+    La fila de `sync_estado` queda bloqueada hasta el commit, lo que ordena las escrituras.
+    """
+    # LAST_INSERT_ID(expr) devuelve el nuevo valor en el paquete OK (cursor.lastrowid)
+    # sin un SELECT adicional. MySQL asigna de izquierda a derecha: menu_version
+    # recibe la versión ya incrementada.
+    cursor.execute(
+        "UPDATE sync_estado SET version = LAST_INSERT_ID(version + 1)"
+        + (", menu_version = version" if menu else "")
+        + " WHERE id = 1"
+    )
+    return cursor.lastrowid
+
+
+def version_actual(cursor):
+    """Retorna (version, menu_version) vigentes."""
+    cursor.execute("SELECT version, menu_version FROM sync_estado WHERE id = 1")
+    row = cursor.fetchone()
+    if row is None:
+        return 0, 0
+    if isinstance(row, dict):
+        return row['version'], row['menu_version']
+    return row[0], row[1]
+
+
+def cambios_desde(cursor, since):
+    """
+    Mesas y pedidos modificados después de `since` (cursor `dictionary=True`).
+    Con `since=0` retorna el estado completo: todas las mesas y los pedidos abiertos.
+    """
+    if since:
+        cursor.execute("""
+            SELECT id AS mesa_id, numero_mesa AS numero, status AS mesa_status, capacidad
+            FROM mesas WHERE sync_version > %s ORDER BY numero_mesa
+        """, (since,))
+        mesas = cursor.fetchall()
+        # Incluye los pedidos cerrados: el cliente los retira de sus mesas
+        cursor.execute("""
+            SELECT id AS pedido_id, mesa_id, total AS pedido_total, status AS pedido_status
+            FROM pedidos WHERE sync_version > %s ORDER BY fecha_pedido
+        """, (since,))
+        pedidos = cursor.fetchall()
+    else:
+        cursor.execute("""
+            SELECT id AS mesa_id, numero_mesa AS numero, status AS mesa_status, capacidad
+            FROM mesas ORDER BY numero_mesa
+        """)
+        mesas = cursor.fetchall()
+        placeholders = ', '.join(['%s'] * len(ESTADOS_PEDIDO_ABIERTO))
+        cursor.execute(f"""
+            SELECT id AS pedido_id, mesa_id, total AS pedido_total, status AS pedido_status
+            FROM pedidos WHERE status IN ({placeholders}) ORDER BY fecha_pedido
+        """, ESTADOS_PEDIDO_ABIERTO)
+        pedidos = cursor.fetchall()
+
+    for pedido in pedidos:
+        pedido['pedido_total'] = float(pedido['pedido_total'])
+    return mesas, pedidos
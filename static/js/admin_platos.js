@@ -25,7 +25,9 @@ function openEditModal(plato) {
     }
 
     function closeEditModal() {
-        document.getElementById('editModal').classList.add('hidden');
+        // El bundle admin.js se carga en todas las páginas del panel
+        const modal = document.getElementById('editModal');
+        if (modal) modal.classList.add('hidden');
     }
 
     // Cerrar modal con tecla ESC
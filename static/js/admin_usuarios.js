@@ -20,7 +20,8 @@ function openUserEditModal(user) {
     }
 
     function closeUserEditModal() {
-        document.getElementById('editUserModal').classList.add('hidden');
+        const modal = document.getElementById('editUserModal');
+        if (modal) modal.classList.add('hidden');
     }
 
     // Cerrar modal con tecla ESC
@@ -0,0 +1,148 @@
+// Pantalla de la cocina: pinta la cola que calcula el servidor (cocina.py) y la
+// recarga cuando llega un evento de /cocina/stream o cada cocinaRefresco segundos.
+
+let colaCocina = window.colaCocina || { lineas: [] };
+// Momento (reloj local) en que se recibió la cola: los tiempos vienen relativos a él
+let recibidaEn = Date.now();
+
+const ACCIONES = {
+    pendiente: [{ status: 'en_preparacion', texto: 'Empezar', clase: 'bg-orange-500 hover:bg-orange-600' }],
+    en_preparacion: [
+        { status: 'listo', texto: 'Listo', clase: 'bg-green-600 hover:bg-green-700' },
+        { status: 'pendiente', texto: 'Devolver', clase: 'bg-gray-400 hover:bg-gray-500' },
+    ],
+    listo: [{ status: 'entregado', texto: 'Entregado', clase: 'bg-blue-600 hover:bg-blue-700' }],
+};
+
+// Segundos -> "12 min" / "-3 min"
+function formatMinutos(segundos) {
+    return `${Math.round(segundos / 60)} min`;
+}
+
+function transcurrido() {
+    return (Date.now() - recibidaEn) / 1000;
+}
+
+function describirTiempo(linea) {
+    const ahora = transcurrido();
+    if (linea.status === 'pendiente') {
+        const falta = linea.iniciar_en - ahora;
+        return falta > 0 ? `Empezar en ${formatMinutos(falta)}` : `Empezar ya (${formatMinutos(-falta)} tarde)`;
+    }
+    if (linea.status === 'en_preparacion') {
+        return `Mesa lista en ${formatMinutos(Math.max(linea.objetivo - ahora, 0))}`;
+    }
+    return `Esperando hace ${formatMinutos(ahora - linea.iniciar_en)}`;
+}
+
+function renderLinea(linea) {
+    const card = document.createElement('div');
+    const atrasada = linea.status === 'pendiente' && linea.iniciar_en - transcurrido() <= 0;
+    card.className = `p-3 rounded-lg border-l-4 shadow-sm ${atrasada ? 'border-red-600 bg-red-50' : 'border-gray-300 bg-gray-50'}`;
+
+    const titulo = document.createElement('p');
+    titulo.className = 'font-semibold text-gray-800';
+    titulo.textContent = `${linea.cantidad} × ${linea.nombre_item}`;
+
+    const detalle = document.createElement('p');
+    detalle.className = 'text-xs text-gray-600';
+    detalle.textContent = `Mesa ${linea.mesa} · Comanda #${linea.pedido_id} · ${linea.duracion_min} min`;
+
+    const tiempo = document.createElement('p');
+    tiempo.className = `text-sm mt-1 ${atrasada ? 'text-red-700 font-semibold' : 'text-gray-700'}`;
+    tiempo.textContent = describirTiempo(linea);
+
+    const botones = document.createElement('div');
+    botones.className = 'flex gap-2 mt-2';
+    (ACCIONES[linea.status] || []).forEach(accion => {
+        const boton = document.createElement('button');
+        boton.type = 'button';
+        boton.className = `px-3 py-1 text-sm font-semibold rounded-lg text-white ${accion.clase}`;
+        boton.textContent = accion.texto;
+        boton.addEventListener('click', () => cambiarEstado(linea.detalle_id, accion.status, boton));
+        botones.appendChild(boton);
+    });
+
+    card.append(titulo, detalle, tiempo, botones);
+    return card;
+}
+
+function renderCola() {
+    ['pendiente', 'en_preparacion', 'listo'].forEach(status => {
+        const columna = document.getElementById(`col-${status}`);
+        const lineas = colaCocina.lineas.filter(linea => linea.status === status);
+        columna.replaceChildren(...lineas.map(renderLinea));
+        if (!lineas.length) {
+            const vacio = document.createElement('p');
+            vacio.className = 'text-sm text-gray-500';
+            vacio.textContent = 'Nada por ahora.';
+            columna.appendChild(vacio);
+        }
+    });
+    document.getElementById('ticketsHoy').textContent = colaCocina.tickets_hoy;
+    document.getElementById('ticketPromedio').textContent =
+        colaCocina.ticket_promedio_segundos === null ? '-' : formatMinutos(colaCocina.ticket_promedio_segundos);
+}
+
+async function recargarCola() {
+    const response = await fetch(window.cocinaColaUrl, { headers: { 'Accept': 'application/json' } });
+    if (!response.ok) return;
+    colaCocina = await response.json();
+    recibidaEn = Date.now();
+    renderCola();
+}
+
+// Varios eventos seguidos (una comanda de diez platos) provocan una sola recarga
+let recargaPendiente = null;
+function programarRecarga() {
+    if (recargaPendiente) return;
+    recargaPendiente = setTimeout(() => {
+        recargaPendiente = null;
+        recargarCola();
+    }, 300);
+}
+
+async function cambiarEstado(detalleId, status, boton) {
+    boton.disabled = true;
+    const response = await fetch(window.cocinaEstadoUrl.replace('/0/', `/${detalleId}/`), {
+        method: 'POST',
+        headers: { 'Accept': 'application/json' },
+        body: new URLSearchParams({ status }),
+    });
+    if (!response.ok) {
+        // 409: otro cocinero ya la movió; la cola recargada muestra su estado real
+        const error = await response.json().catch(() => ({}));
+        if (error.error) alert(error.error);
+    }
+    recargarCola();
+}
+
+function connectCocinaStream() {
+    const estado = document.getElementById('estadoConexion');
+    if (!window.cocinaStreamUrl || typeof EventSource === 'undefined') {
+        estado.textContent = 'Sin tiempo real';
+        return;
+    }
+    const source = new EventSource(window.cocinaStreamUrl);
+    source.addEventListener('comanda', programarRecarga);
+    source.addEventListener('linea', programarRecarga);
+    source.addEventListener('resync', programarRecarga);
+    let conectado = false;
+    source.addEventListener('open', () => {
+        estado.textContent = 'En vivo';
+        // Tras una reconexión pudieron perderse eventos
+        if (conectado) programarRecarga();
+        conectado = true;
+    });
+    source.addEventListener('error', () => {
+        estado.textContent = 'Reconectando…';
+    });
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    renderCola();
+    connectCocinaStream();
+    // Los eventos solo llegan desde este worker y los tiempos avanzan solos
+    setInterval(recargarCola, (window.cocinaRefresco || 30) * 1000);
+    setInterval(renderCola, 15000);
+});
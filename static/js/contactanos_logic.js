@@ -8,6 +8,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const form = document.getElementById('contactanosForm');
     const statusMessage = document.getElementById('statusMessage');
     const enviarBtn = document.getElementById('enviarBtn');
+    if (!form) return; // Va en el bundle público: solo actúa en la página con el formulario
 
     form.addEventListener('submit', function (event) {
         event.preventDefault();
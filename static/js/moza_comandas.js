@@ -115,6 +115,13 @@ function calculateTotal() {
     document.getElementById('itemsInput').value = JSON.stringify(items);
 }
 
+// Clave de idempotencia de la comanda: si el POST se reenvía (Wi-Fi inestable,
+// doble toque) el servidor la reconoce y responde con el pedido ya registrado
+function nuevaClaveComanda() {
+    if (window.crypto && typeof crypto.randomUUID === 'function') return crypto.randomUUID();
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
 // Abre el modal de nueva comanda y resetea los valores
 function openNewComandaModal() {
     document.getElementById('newComandaForm').reset();
@@ -123,6 +130,8 @@ function openNewComandaModal() {
     });
     document.getElementById('comandaTotal').textContent = 'S/ 0.00';
     document.getElementById('modal_mesa_id').value = "";
+    // Una clave por comanda: los reenvíos de este formulario llevan la misma
+    document.getElementById('claveComanda').value = nuevaClaveComanda();
     openModal('newComandaModal');
 }
 
@@ -205,7 +214,7 @@ function viewMesaDetails(mesa) {
             <div class="p-4 bg-red-50 border-l-4 border-${pedidoColor} rounded-lg">
                 <h4 class="font-extrabold text-xl text-${pedidoColor} mb-2">Comanda Activa #${mesa.pedido_id}</h4>
                 <p class="text-sm"><span class="font-semibold">Estado Comanda:</span> <span class="uppercase font-bold">${mesa.pedido_status.replace('_', ' ')}</span></p>
-                <p class="text-sm"><span class="font-semibold">Total:</span> <span class="text-2xl font-extrabold text-red-600">S/ ${mesa.pedido_total.toFixed(2)}</span></p>
+                <p class="text-sm"><span class="font-semibold">Total:</span> <span class="text-2xl font-extrabold text-red-600">S/ ${Number(mesa.pedido_total).toFixed(2)}</span></p>
             </div>
         `;
     }
@@ -258,9 +267,161 @@ function viewMesaDetails(mesa) {
     openModal('detailsModal');
 }
 
-// Inicializar Lucide Icons al cargar la página
+/**
+ * ACTUALIZACIONES EN VIVO (SSE)
+ */
+
+// Clases de color que puede tener una tarjeta de mesa (se reemplazan al actualizarla)
+const MESA_STATUS_CLASSES = [
+    'bg-green-500', 'border-green-700', 'hover:bg-green-600',
+    'bg-red-500', 'border-red-700', 'hover:bg-red-600',
+    'bg-red-600', 'border-red-800', 'hover:bg-red-700',
+    'bg-orange-500', 'border-orange-700', 'hover:bg-orange-600',
+    'bg-yellow-500', 'border-yellow-700', 'hover:bg-yellow-600',
+    'bg-gray-400', 'border-gray-600', 'opacity-80'
+];
+
+// Presentación de una tarjeta de mesa (misma lógica que moza_comandas.html)
+function mesaCardPresentation(mesa) {
+    if (mesa.pedido_id) {
+        if (mesa.pedido_status === 'listo_pago') {
+            return { label: 'Pendiente Pago', classes: 'bg-orange-500 border-orange-700 hover:bg-orange-600', icon: 'credit-card' };
+        }
+        if (mesa.pedido_status === 'en_preparacion') {
+            return { label: 'En Preparación', classes: 'bg-red-500 border-red-700 hover:bg-red-600', icon: 'clipboard-list' };
+        }
+        return { label: 'Ocupada/Abierta', classes: 'bg-red-600 border-red-800 hover:bg-red-700', icon: 'clipboard-list' };
+    }
+    if (mesa.mesa_status === 'reservada') {
+        return { label: 'Reservada', classes: 'bg-yellow-500 border-yellow-700 hover:bg-yellow-600', icon: 'calendar' };
+    }
+    if (mesa.mesa_status === 'inactiva') {
+        return { label: 'Inactiva', classes: 'bg-gray-400 border-gray-600 opacity-80', icon: 'slash' };
+    }
+    return { label: 'Disponible', classes: 'bg-green-500 border-green-700 hover:bg-green-600', icon: 'utensils' };
+}
+
+// Actualiza en el DOM las tarjetas de una mesa sin recargar la página
+function renderMesaCard(mesa) {
+    const view = mesaCardPresentation(mesa);
+    document.querySelectorAll(`.mesa-card[data-mesa-id="${mesa.mesa_id}"]`).forEach(card => {
+        card.classList.remove(...MESA_STATUS_CLASSES);
+        card.classList.add(...view.classes.split(' '));
+        card.querySelector('.mesa-status-label').textContent = view.label;
+        card.querySelector('.mesa-icon').innerHTML = `<i data-lucide="${view.icon}" class="w-7 h-7 sm:w-8 sm:h-8 mb-1"></i>`;
+
+        const totalEl = card.querySelector('.mesa-total');
+        totalEl.textContent = `Total: S/ ${Number(mesa.pedido_total || 0).toFixed(2)}`;
+        totalEl.classList.toggle('hidden', !mesa.pedido_id);
+
+        card.onclick = () => viewMesaDetails(mesa);
+    });
+    if (typeof lucide !== 'undefined') {
+        lucide.createIcons();
+    }
+}
+
+// Reconstruye el <select> de mesas libres del modal de nueva comanda
+function refreshMesaSelect() {
+    const select = document.getElementById('modal_mesa_id');
+    if (!select) return;
+    const selected = select.value;
+    select.innerHTML = '<option value="">Selecciona una Mesa</option>';
+    Object.values(comandasActivas)
+        .filter(mesa => !mesa.pedido_id && mesa.mesa_status === 'disponible')
+        .forEach(mesa => {
+            const option = document.createElement('option');
+            option.value = mesa.mesa_id;
+            option.textContent = `Mesa #${mesa.numero} (Cap: ${mesa.capacidad})`;
+            select.appendChild(option);
+        });
+    select.value = selected;
+}
+
+// Aplica un evento 'mesa' o 'comanda' enviado por el servidor
+function applyMesaChange(change) {
+    if (change.version) {
+        window.estadoVersion = Math.max(window.estadoVersion || 0, change.version);
+    }
+    const mesa = comandasActivas[change.mesa_id];
+    if (!mesa) {
+        // Mesa desconocida para esta tablet: recargar el estado completo
+        window.location.reload();
+        return;
+    }
+    if (change.pedido_status === 'cerrado') {
+        if (mesa.pedido_id === change.pedido_id) {
+            mesa.pedido_id = null;
+            mesa.pedido_status = null;
+            mesa.pedido_total = null;
+        }
+    } else if (change.pedido_id) {
+        mesa.pedido_id = change.pedido_id;
+        mesa.pedido_status = change.pedido_status;
+        mesa.pedido_total = change.pedido_total;
+    }
+    if (change.mesa_status) {
+        mesa.mesa_status = change.mesa_status;
+    }
+    renderMesaCard(mesa);
+    refreshMesaSelect();
+}
+
+// Pide a /moza/api/state solo lo que cambió desde la versión conocida
+async function syncEstado() {
+    if (!window.mozaStateUrl) return;
+    const response = await fetch(`${window.mozaStateUrl}?since=${window.estadoVersion || 0}`, {
+        headers: { 'Accept': 'application/json' }
+    });
+    if (response.status === 304 || !response.ok) return;
+
+    const estado = await response.json();
+    if (estado.menu && !estado.completo) {
+        // La carta se renderiza en el servidor: un cambio de menú requiere recargar
+        window.location.reload();
+        return;
+    }
+    if (estado.mesas.some(mesa => !comandasActivas[mesa.mesa_id])) {
+        // Mesa nueva: no hay tarjeta que actualizar
+        window.location.reload();
+        return;
+    }
+    estado.mesas.forEach(mesa => Object.assign(comandasActivas[mesa.mesa_id], mesa));
+    estado.pedidos.forEach(pedido => applyMesaChange({
+        ...pedido,
+        pedido_status: ['abierto', 'en_preparacion', 'listo_pago'].includes(pedido.pedido_status)
+            ? pedido.pedido_status : 'cerrado'
+    }));
+    estado.mesas.forEach(mesa => renderMesaCard(comandasActivas[mesa.mesa_id]));
+    refreshMesaSelect();
+    window.estadoVersion = estado.version;
+}
+
+// Se suscribe al flujo /moza/stream (EventSource reconecta solo si se corta)
+function connectMozaStream() {
+    if (!window.mozaStreamUrl || typeof EventSource === 'undefined') {
+        // Sin SSE: consulta periódica del delta (barata: 304 si nada cambió)
+        setInterval(syncEstado, 10000);
+        return;
+    }
+    const source = new EventSource(window.mozaStreamUrl);
+    const onChange = (event) => applyMesaChange(JSON.parse(event.data));
+    source.addEventListener('mesa', onChange);
+    source.addEventListener('comanda', onChange);
+    // El servidor descartó eventos de esta tablet (conexión lenta): pedir el delta
+    source.addEventListener('resync', syncEstado);
+    // Tras una reconexión pudieron perderse eventos (o llegaron a otro worker)
+    let conectado = false;
+    source.addEventListener('open', () => {
+        if (conectado) syncEstado();
+        conectado = true;
+    });
+}
+
+// Inicializar Lucide Icons y el flujo en vivo al cargar la página
 document.addEventListener('DOMContentLoaded', () => {
     if (typeof lucide !== 'undefined') {
         lucide.createIcons();
     }
+    connectMozaStream();
 });
\ No newline at end of file
@@ -0,0 +1,61 @@
+"""
+Escrituras concurrentes sobre mesas, pedidos y reservas.
+
+Regla de las rutas que escriben: primero se bloquean las filas de las que
+depende la decisión (`SELECT ... FOR UPDATE`: `consultas.bloquear_pedido`,
+`bloquear_mesa`, `bloquear_reserva`...), después, si cambian mesas o pedidos,
+se toma `sync_estado` con siguiente_version() y al final se ajustan los
+contadores. Así dos mozas que
+cierran la misma comanda, o dos confirmaciones de reserva sobre la misma mesa,
+se ordenan en el primer bloqueo y la segunda ve lo que hizo la primera.
+
+En REPEATABLE READ la fotografía de las lecturas normales se toma en la
+primera lectura normal de la transacción, no en las lecturas con bloqueo: por
+eso los bloqueos van antes de cualquier otra consulta.
+
+Si aun así InnoDB aborta la transacción por un deadlock (1213) o vence la
+espera de un lock (1205, ver MYSQL_LOCK_WAIT_TIMEOUT), `Reintentos` la repite
+entera con una conexión nueva.
+"""
+import random
+import threading
+import time
+
+from mysql.connector import Error, errorcode
+
+REINTENTABLES = (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+
+
+class Reintentos:
+    """
+    `reintentar(funcion)` ejecuta `funcion()` (una transacción completa, que abre
+    su propia conexión y hace commit) y la repite hasta `intentos` veces si MySQL
+    la abortó por un conflicto de bloqueos. Entre intentos espera `espera`
+    segundos, el doble cada vez y con variación aleatoria para que los dos
+    lados de un deadlock no vuelvan a chocar.
+    """
+
+    def __init__(self, intentos=3, espera=0.05):
+        self.intentos = intentos
+        self.espera = espera
+        self._lock = threading.Lock()
+        self._reintentos = 0
+        self._agotados = 0
+
+    def __call__(self, funcion):
+        for intento in range(1, self.intentos + 1):
+            try:
+                return funcion()
+            except Error as e:
+                if e.errno not in REINTENTABLES:
+                    raise
+                with self._lock:
+                    if intento == self.intentos:
+                        self._agotados += 1
+                        raise
+                    self._reintentos += 1
+            time.sleep(self.espera * 2 ** (intento - 1) * random.uniform(0.5, 1.5))
+
+    def stats(self):
+        with self._lock:
+            return {'reintentos': self._reintentos, 'agotados': self._agotados}